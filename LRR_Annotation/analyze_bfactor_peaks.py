@@ -1,7 +1,6 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy import signal
 from tqdm import tqdm
 from pathlib import Path
 import pickle # Added for potential loading errors
@@ -11,7 +10,11 @@ try:
     from geom_lrr.loader import Loader
     # Import Analyzer and compute_winding function
     # Assuming Analyzer might have a method to compute breakpoints
-    from geom_lrr.analyzer import Analyzer, compute_winding
+    from geom_lrr.analyzer import Analyzer, compute_winding, filter_bfactor_bank, period_mismatch, imap_proteins
+    from geom_lrr.cache import ProteinCache
+    from geom_lrr.batch import StructureBatch
+    from geom_lrr.pdbio import read_text, parse_text, pdb_stem
+    from geom_lrr.kernels import backend_info
 except ImportError:
     print("Error: Could not import Loader, Analyzer, or compute_winding from geom_lrr.")
     print("Make sure 'geom_lrr' directory is accessible and contains analyzer.py with compute_winding.")
@@ -20,108 +23,440 @@ except Exception as e:
     print(f"Error during geom_lrr import: {e}") # Catch other potential import errors
     exit()
 
-def analyze_lrr_bfactor_peaks(pdb_dir, period=25, filter_order=10, cache_dir=None):
+PEAK_COLUMNS = ['Protein Key', 'Residue Index', 'Filtered B-Factor', 'Winding Number', 'LRR Repeat Number']
+
+def number_repeats(bff):
     """
-    Analyzes B-factor peaks within LRR regions.
-    Computes winding numbers and LRR repeat breakpoints on the fly from loaded structures.
-    Loads structures via load_batch and B-factors via load_single.
+    Numbers the LRR repeats of a filtered B-factor segment, starting a new
+    repeat at every negative to positive zero crossing.
+
+    Args:
+        bff (numpy.ndarray): Filtered, normalized B-factors of an LRR segment.
+
+    Returns:
+        tuple: The repeat number of each residue, and the indices of the zero
+               crossings, including 0 if the segment starts positive. The first
+               residue is always numbered 0.
+    """
+    rising = (bff[:-1] <= 0) & (bff[1:] > 0)
+    starts_positive = int(len(bff) > 0 and bff[0] > 0)
+    repeat_numbers = np.zeros(len(bff), dtype=int)
+    repeat_numbers[1:] = starts_positive + np.cumsum(rising)
+    zero_crossings = np.flatnonzero(rising) + 1
+    if starts_positive:
+        zero_crossings = np.concatenate(([0], zero_crossings))
+    return repeat_numbers, zero_crossings
+
+def peak_table(segments):
+    """
+    Concatenates per-protein column arrays into one DataFrame, with the
+    protein key stored as a categorical column.
+
+    Args:
+        segments (list): Dicts with a 'key' and equal-length arrays 'residue',
+                         'bfactor', 'winding' and 'repeat', and optionally
+                         the 'period' of the filter used.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the columns of PEAK_COLUMNS, and a
+                          'Period' column if the segments have periods.
+    """
+    if not segments:
+        return pd.DataFrame(columns=PEAK_COLUMNS)
+    keys = [segment['key'] for segment in segments]
+    lengths = [len(segment['residue']) for segment in segments]
+    df = pd.DataFrame({
+        'Protein Key': pd.Categorical.from_codes(np.repeat(np.arange(len(keys)), lengths), categories=pd.Index(keys)),
+        'Residue Index': np.concatenate([segment['residue'] for segment in segments]),
+        'Filtered B-Factor': np.concatenate([segment['bfactor'] for segment in segments]),
+        'Winding Number': np.concatenate([segment['winding'] for segment in segments]),
+        'LRR Repeat Number': np.concatenate([segment['repeat'] for segment in segments]),
+    })
+    if 'period' in segments[0]:
+        df['Period'] = np.repeat([segment['period'] for segment in segments], lengths)
+    return df
+
+def write_peak_table(df, path):
+    """
+    Writes the peak table in the format given by the file extension: .csv,
+    .npz (compressed NumPy columns, no extra dependencies), or .parquet and
+    .feather, which require pyarrow.
+
+    Args:
+        df (pandas.DataFrame): Output of analyze_lrr_bfactor_peaks.
+        path (str): Output file.
+    """
+    path = str(path)
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+    elif path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith('.feather'):
+        df.reset_index(drop=True).to_feather(path)
+    elif path.endswith('.npz'):
+        keys = df['Protein Key'].astype('category')
+        columns = dict(
+            protein_keys=np.asarray(keys.cat.categories, dtype=str),
+            protein_codes=keys.cat.codes.to_numpy(),
+            residue=df['Residue Index'].to_numpy(),
+            bfactor=df['Filtered B-Factor'].to_numpy(),
+            winding=df['Winding Number'].to_numpy(),
+            repeat=df['LRR Repeat Number'].to_numpy()
+        )
+        if 'Period' in df:
+            columns['period'] = df['Period'].to_numpy()
+        np.savez_compressed(path, **columns)
+    else:
+        raise ValueError(f"Unknown peak table format: {path}")
+
+def read_peak_table(path):
+    """
+    Reads a peak table written by write_peak_table.
+
+    Args:
+        path (str): File written by write_peak_table.
+
+    Returns:
+        pandas.DataFrame: The peak table.
+    """
+    path = str(path)
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            df = pd.DataFrame({
+                'Protein Key': pd.Categorical.from_codes(data['protein_codes'], categories=pd.Index(data['protein_keys'])),
+                'Residue Index': data['residue'],
+                'Filtered B-Factor': data['bfactor'],
+                'Winding Number': data['winding'],
+                'LRR Repeat Number': data['repeat'],
+            })
+            if 'period' in data:
+                df['Period'] = data['period']
+            return df
+    raise ValueError(f"Unknown peak table format: {path}")
+
+def report_load_errors(errors, limit=10):
+    """Prints the first `limit` of the errors collected by a Loader"""
+    for key, error in list(errors.items())[:limit]:
+        print(f"  {key}: {error}")
+    if len(errors) > limit:
+        print(f"  ... and {len(errors) - limit} more files failed to load")
+
+def load_cached_breakpoints(cache_dir):
+    """
+    Loads the breakpoints cached by 02_alphafold_to_lrr_annotation.py.
+
+    Args:
+        cache_dir (str): Path to the directory containing cached regression data.
+
+    Returns:
+        Analyzer: An Analyzer holding the cached breakpoints, or None if they
+                  could not be read.
+    """
+    print(f"Loading cached regression data (breakpoints) from: {cache_dir}")
+    analyzer = Analyzer()
+    try:
+        # Prefer the memory-mapped store, which opens without unpickling
+        store_dir = os.path.join(cache_dir, 'store')
+        if os.path.exists(os.path.join(store_dir, 'index.json')):
+            analyzer.retrieve_store(store_dir)
+        else:
+            # This still loads the original breakpoints (likely just start/end)
+            analyzer.retrieve_regressions(cache_dir)
+    except (FileNotFoundError, pickle.UnpicklingError) as e:
+        print(f"Error: Cache directory or essential regression files not found/corrupt in {cache_dir}: {e}")
+        return None
+    except Exception as e:
+        print(f"Error loading cached regression data: {e}")
+        return None
+    return analyzer
+
+def load_peak_inputs(pdb_dir, cache_dir, structure_store=None):
+    """
+    Loads structures, B-factors and cached breakpoints for the B-factor
+    peak analysis.
 
     Args:
         pdb_dir (str): Path to the directory containing PDB files.
-        period (int, optional): Approximate period for Butterworth filter. Defaults to 25.
-        filter_order (int, optional): Order for Butterworth filter. Defaults to 10.
-        cache_dir (str, optional): Path to the directory containing cached regression data.
+        cache_dir (str): Path to the directory containing cached regression data.
+        structure_store (str, optional): Store written by `Loader.cache_store` to read
+            structures and B-factors from instead of `pdb_dir`.
 
     Returns:
-        pandas.DataFrame: A DataFrame containing peak information with columns:
-                          'Protein Key', 'Residue Index', 'Filtered B-Factor',
-                          'Winding Number', 'LRR Repeat Number'.
-                          Returns an empty DataFrame if essential data is missing.
+        Analyzer: An Analyzer holding structures, b-factors and breakpoints, or
+                  None if essential data is missing.
     """
-    print(f"Loading Structures via load_batch from PDBs in: {pdb_dir}")
     loader = Loader()
     keys_loaded = []
     try:
         # Use load_batch to get structures and the list of keys
-        loader.load_batch(pdb_dir, progress=True)
+        if structure_store is not None:
+            print(f"Loading Structures from store: {structure_store}")
+            loader.retrieve_store(str(structure_store))
+        else:
+            print(f"Loading Structures via load_batch from PDBs in: {pdb_dir}")
+            loader.load_batch(pdb_dir, progress=True)
         structures = loader.structures
         if not structures:
             print("Warning: No structures loaded via load_batch. Check PDB directory and files.")
-            return pd.DataFrame()
+            report_load_errors(loader.errors)
+            return None
         keys_loaded = list(structures.keys()) # Get keys from successfully loaded structures
         print(f"Found {len(keys_loaded)} structures via load_batch.")
 
     except FileNotFoundError:
         print(f"Error: PDB directory not found: {pdb_dir}")
-        return pd.DataFrame()
+        return None
     except Exception as e:
         print(f"Error during load_batch for structures: {e}")
-        return pd.DataFrame()
+        return None
 
-    # Now, load B-factors individually using load_single for the keys found
-    print(f"Loading B-factors via load_single for {len(keys_loaded)} keys...")
-    bfactors = {} # Initialize bfactors dictionary
-    for key in tqdm(keys_loaded, desc="Loading B-factors"):
-        try:
-            loader.bfactors = {} # Clear before each call
-            loader.load_single(pdb_dir, f"{key}.pdb") # Assumes key is filename without .pdb
-            if key in loader.bfactors:
-                 bfactors[key] = loader.bfactors[key]
-        except Exception as e:
-            print(f"\nError calling load_single for {key}.pdb: {e}")
-            continue # Skip to next key
+    # load_batch reads the B-factors in the same pass as the structures
+    bfactors = {key: loader.bfactors[key] for key in keys_loaded if key in loader.bfactors}
 
     loader.bfactors = {} # Clear loader's dict
     print(f"Finished loading B-factors. Found B-factors for {len(bfactors)} keys.")
 
     if not bfactors:
-         print("Error: Failed to load any B-factors using load_single.")
-         return pd.DataFrame()
+         source = structure_store if structure_store is not None else pdb_dir
+         print(f"Error: No B-factors were loaded from {source}.")
+         report_load_errors(loader.errors)
+         return None
 
-    # --- Load Cached Breakpoints ---
-    print(f"Loading cached regression data (breakpoints) from: {cache_dir}")
-    analyzer = Analyzer()
-    try:
-        # This still loads the original breakpoints (likely just start/end)
-        analyzer.retrieve_regressions(cache_dir)
-    except (FileNotFoundError, pickle.UnpicklingError) as e:
-        print(f"Error: Cache directory or essential regression files not found/corrupt in {cache_dir}: {e}")
-        return pd.DataFrame()
-    except Exception as e:
-        print(f"Error loading cached regression data: {e}")
-        return pd.DataFrame()
+    analyzer = load_cached_breakpoints(cache_dir)
+    if analyzer is None:
+        return None
 
     analyzer.load_structures(structures)
     analyzer.load_bfactors(bfactors)
 
-    results = []
     # Check we have breakpoints, structures, bfactors
     required_data = {'breakpoints', 'structures', 'bfactors'}
     if not required_data.issubset(analyzer.__dict__.keys()) or \
        not analyzer.breakpoints or not analyzer.structures or not analyzer.bfactors:
          print(f"Error: Analyzer is missing essential data.")
          print(f"Breakpoints: {len(analyzer.breakpoints)}, Structures: {len(analyzer.structures)}, B-factors: {len(analyzer.bfactors)}")
-         return pd.DataFrame()
+         return None
+    return analyzer
+
+def check_periods(candidates):
+    """
+    Checks that every candidate period gives a valid bandpass filter.
+
+    Args:
+        candidates (list): Candidate periods.
 
-    # --- Filter Setup ---
+    Returns:
+        bool: Whether all filters can be built.
+    """
     nyquist = 0.5
-    low_cutoff = 0.5 / period
-    high_cutoff = 2.0 / period
-    if high_cutoff >= nyquist:
-        print(f"Warning: High cutoff frequency ({high_cutoff}) >= Nyquist ({nyquist}). Adjusting.")
-        high_cutoff = nyquist * 0.99 # Ensure it's strictly less
-    if low_cutoff <= 0:
-        print(f"Error: Low cutoff ({low_cutoff}) must be positive.")
-        return pd.DataFrame()
-    if low_cutoff >= high_cutoff:
-        print(f"Error: Low cutoff ({low_cutoff}) >= high cutoff ({high_cutoff}). Cannot create filter.")
+    for candidate in candidates:
+        low_cutoff = 0.5 / candidate
+        high_cutoff = 2.0 / candidate
+        if high_cutoff >= nyquist:
+            # bandpass_bank clips it just below Nyquist
+            print(f"Warning: High cutoff frequency ({high_cutoff}) >= Nyquist ({nyquist}). Adjusting.")
+            high_cutoff = nyquist * 0.99 # Ensure it's strictly less
+        if low_cutoff <= 0:
+            print(f"Error: Low cutoff ({low_cutoff}) must be positive.")
+            return False
+        if low_cutoff >= high_cutoff:
+            print(f"Error: Low cutoff ({low_cutoff}) >= high cutoff ({high_cutoff}). Cannot create filter.")
+            return False
+    return True
+
+def protein_winding(structure, protein_cache=None, smoothing=20):
+    """
+    Winding number of a structure, read from the Analyzer's per-protein
+    cache when it holds the geometry of these coordinates. Otherwise the
+    geometry is computed and, if a cache is given, stored for later runs.
+
+    Args:
+        structure (numpy.ndarray): CA coordinates.
+        protein_cache (ProteinCache, optional): Cache shared with `Analyzer.compute_windings`.
+        smoothing (int, optional): Backbone smoothing, part of the cache key. Defaults to 20.
+
+    Returns:
+        numpy.ndarray: The winding number at each residue.
+    """
+    if protein_cache is None:
+        return compute_winding(structure, smoothing)["winding"]
+    h = ProteinCache.key([structure], smoothing=smoothing)
+    if protein_cache.contains('geometry', h):
+        protein_cache.touch('geometry', h)
+        return protein_cache.load('geometry', h, 'winding')
+    res = compute_winding(structure, smoothing)
+    protein_cache.store('geometry', h, **res)
+    return res["winding"]
+
+def lrr_region(bfactor, winding, breakpoints, filter_order=10):
+    """
+    The overall LRR region of a protein, from its first to its last
+    cached breakpoint.
+
+    Args:
+        bfactor (numpy.ndarray): B-factor of each residue.
+        winding (numpy.ndarray): Winding number of each residue.
+        breakpoints (numpy.ndarray): Cached breakpoints.
+        filter_order (int, optional): Order for Butterworth filter. Defaults to 10.
+
+    Returns:
+        tuple: Start and end of the region, or None if it is too short to filter.
+
+    Raises:
+        ValueError: With the reason the protein cannot be analyzed.
+    """
+    # Basic check: winding array is typically N-1, bfactor N.
+    if len(bfactor) != len(winding) + 1:
+        raise ValueError(f"length mismatch between B-factor ({len(bfactor)}) and computed winding ({len(winding)}).")
+
+    # *** Use ONLY the first and last breakpoint to define the overall LRR region ***
+    if len(breakpoints) < 2:
+        raise ValueError(f"fewer than 2 breakpoints loaded from cache: {breakpoints}")
+
+    a = breakpoints[0]
+    b = breakpoints[-1] # Use the last one, assumes format [start, ..., end] or just [start, end]
+
+    if a < 0 or b > len(bfactor) or a >= b:
+        raise ValueError(f"invalid LRR region [{a}, {b}) from cache (B-factor length: {len(bfactor)}).")
+
+    min_len_for_filter = filter_order * 2 + 1 # Heuristic minimum length
+    if b - a < min_len_for_filter:
+        return None # Skip if the whole LRR region is too short
+    return a, b
+
+def segment_peaks(key, a, b, winding, bank, candidates, sweep=False):
+    """
+    Normalizes a filtered LRR segment and numbers its repeats.
+
+    Args:
+        key (str): Protein key.
+        a, b (int): Start and end of the LRR region.
+        winding (numpy.ndarray): Winding number of each residue.
+        bank (numpy.ndarray): The segment filtered with each candidate period.
+        candidates (list): Candidate periods.
+        sweep (bool, optional): Whether to pick the best-fitting period and record it.
+
+    Returns:
+        tuple: The column arrays of the segment, for peak_table, and the
+               indices of its zero crossings.
+    """
+    best = int(np.argmin(period_mismatch(bank, candidates))) if sweep else 0
+    bff = bank[best]
+
+    # Normalize
+    bff_max = np.max(np.abs(bff))
+    if bff_max > 1e-9:
+        bff /= bff_max
+    else:
+        bff[:] = 0
+
+    repeat_numbers, zero_crossings = number_repeats(bff)
+
+    # Winding number of each residue, NaN where the winding is undefined
+    winding_idx = np.arange(a, b) - 1
+    winding_val = np.full(len(bff), np.nan)
+    defined = (winding_idx >= 0) & (winding_idx < len(winding))
+    winding_val[defined] = winding[winding_idx[defined]]
+
+    result = dict(
+        key=key,
+        residue=np.arange(a, b),
+        bfactor=bff,
+        winding=winding_val,
+        repeat=repeat_numbers
+    )
+    if sweep:
+        result['period'] = candidates[best]
+    return result, zero_crossings
+
+def analyze_protein_group(proteins, candidates, filter_order=10, sweep=False, protein_cache_dir=None, structure_store=None):
+    """
+    Analyzes a group of proteins, filtering their LRR segments together.
+    Runs in the worker processes of stream_lrr_bfactor_peaks, and reads the
+    structures and B-factors of the group itself, so that only one group
+    at a time is in memory.
+
+    Args:
+        proteins (list): (key, path, breakpoints) tuples, where path is the
+            PDB file of the protein, or None to read it from `structure_store`.
+        candidates (list): Candidate periods.
+        filter_order (int, optional): Order for Butterworth filter. Defaults to 10.
+        sweep (bool, optional): Whether to pick the best-fitting period per protein.
+        protein_cache_dir (str, optional): Directory of the Analyzer's ProteinCache.
+        structure_store (str, optional): Store written by `Loader.cache_store`.
+
+    Returns:
+        tuple: A peak table of the group, and a list of warning messages.
+    """
+    protein_cache = ProteinCache(protein_cache_dir) if protein_cache_dir is not None else None
+    batch = StructureBatch.open(structure_store) if structure_store is not None else None
+    messages = []
+    segments = []
+    for key, path, breakpoints in proteins:
+        try:
+            if path is None:
+                structure = np.array(batch[key])
+                bfactor = np.array(batch.field('bfactor', key))
+            else:
+                res = parse_text(read_text(path))
+                structure, bfactor = res["structure"], res["bfactor"]
+            winding = protein_winding(structure, protein_cache)
+            region = lrr_region(bfactor, winding, breakpoints, filter_order)
+        except Exception as e:
+            messages.append(f"Warning: Skipping {key}, {e}")
+            continue
+        if region is not None:
+            a, b = region
+            segments.append((key, a, b, winding, bfactor[a:b]))
+
+    filtered = filter_bfactor_bank([segment for *_, segment in segments], candidates, order=filter_order, fs=1.0)
+    results = []
+    for (key, a, b, winding, bfactor_segment), bank in zip(segments, filtered):
+        if bank is None:
+            messages.append(f"Warning: Could not filter LRR segment [{a}, {b}) for {key} (length {len(bfactor_segment)})")
+            continue
+        result, zero_crossings = segment_peaks(key, a, b, winding, bank, candidates, sweep)
+        results.append(result)
+    return peak_table(results), messages
+
+def analyze_lrr_bfactor_peaks(pdb_dir, period=25, filter_order=10, cache_dir=None, structure_store=None, periods=None, protein_cache=None):
+    """
+    Analyzes B-factor peaks within LRR regions.
+    Computes winding numbers and LRR repeat breakpoints on the fly from loaded structures.
+    Loads structures and B-factors in one pass via load_batch.
+
+    Args:
+        pdb_dir (str): Path to the directory containing PDB files.
+        period (int, optional): Approximate period for Butterworth filter. Defaults to 25.
+        filter_order (int, optional): Order for Butterworth filter. Defaults to 10.
+        cache_dir (str, optional): Path to the directory containing cached regression data.
+        structure_store (str, optional): Store written by `Loader.cache_store` to read
+            structures and B-factors from instead of `pdb_dir`.
+        periods (list, optional): Candidate periods to sweep instead of `period`. All
+            of them are filtered in one pass, each protein keeps the best-fitting
+            one (see `period_mismatch`), and a 'Period' column records it.
+        protein_cache (ProteinCache, optional): Cache of the Analyzer's geometry; windings
+            of unchanged structures are read from it instead of being recomputed.
+
+    Returns:
+        pandas.DataFrame: A DataFrame containing peak information with columns:
+                          'Protein Key', 'Residue Index', 'Filtered B-Factor',
+                          'Winding Number', 'LRR Repeat Number'.
+                          Returns an empty DataFrame if essential data is missing.
+    """
+    analyzer = load_peak_inputs(pdb_dir, cache_dir, structure_store)
+    if analyzer is None:
         return pd.DataFrame()
-    try:
-        sos = signal.butter(filter_order, [low_cutoff, high_cutoff], 'bandpass', output='sos', fs=1.0)
-    except ValueError as e:
-        print(f"Error creating Butterworth filter: {e}")
+
+    candidates = [period] if periods is None else list(periods)
+    if not check_periods(candidates):
         return pd.DataFrame()
-    # --- End Filter Setup ---
 
     # --- Define Approximate Repeat Length ---
     APPROX_REPEAT_LENGTH = 25 # Or your best estimate
@@ -137,7 +472,9 @@ def analyze_lrr_bfactor_peaks(pdb_dir, period=25, filter_order=10, cache_dir=Non
          print("No proteins found with all required data (structure, b-factor, cached breakpoints).")
          return pd.DataFrame()
 
-    for key in tqdm(list(valid_keys), desc="Processing Proteins"):
+    results = []
+    segments = []
+    for key in tqdm(sorted(valid_keys), desc="Processing Proteins"):
         structure = analyzer.structures[key]
         bfactor = analyzer.bfactors[key]
         # Use the breakpoints loaded from the cache
@@ -145,92 +482,37 @@ def analyze_lrr_bfactor_peaks(pdb_dir, period=25, filter_order=10, cache_dir=Non
 
         # Compute winding number (still useful for the 'Winding Number' column)
         try:
-            winding_res = compute_winding(structure)
-            winding = winding_res["winding"]
+            winding = protein_winding(structure, protein_cache)
         except Exception as e:
             print(f"Warning: Skipping {key}, failed to compute winding number: {e}")
             continue
 
-        # Basic check: winding array is typically N-1, bfactor N.
-        if len(bfactor) != len(winding) + 1:
-             print(f"Warning: Skipping {key}, length mismatch between B-factor ({len(bfactor)}) and computed winding ({len(winding)}).")
-             continue
-
-        # *** Use ONLY the first and last breakpoint to define the overall LRR region ***
-        if len(breakpoints) < 2:
-            print(f"Warning: Skipping {key}, fewer than 2 breakpoints loaded from cache: {breakpoints}")
-            continue # Need at least start and end
-
-        lrr_start_index = breakpoints[0]
-        lrr_end_index = breakpoints[-1] # Use the last one, assumes format [start, ..., end] or just [start, end]
-
-        if lrr_start_index < 0 or lrr_end_index > len(bfactor) or lrr_start_index >= lrr_end_index:
-             print(f"Warning: Skipping LRR region [{lrr_start_index}, {lrr_end_index}) for {key} due to invalid indices from cache (B-factor length: {len(bfactor)}).")
-             continue
+        try:
+            region = lrr_region(bfactor, winding, breakpoints, filter_order)
+        except ValueError as e:
+            print(f"Warning: Skipping {key}, {e}")
+            continue
+        if region is None:
+            continue
 
         # Process the single overall LRR segment defined by cache
-        a = lrr_start_index
-        b = lrr_end_index
-
-        bfactor_segment = bfactor[a:b]
-
-        min_len_for_filter = filter_order * 2 + 1 # Heuristic minimum length
-        if len(bfactor_segment) < min_len_for_filter:
-            # print(f"Debug: Skipping LRR region [{a}, {b}) for {key}, too short ({len(bfactor_segment)}) for filter (min: {min_len_for_filter}).")
-            continue # Skip if the whole LRR region is too short
+        a, b = region
+        segments.append((key, a, b, winding, bfactor[a:b]))
 
-        try:
-            bff = signal.sosfiltfilt(sos, bfactor_segment)
-        except ValueError as e:
-             print(f"Warning: Could not filter LRR segment [{a}, {b}) for {key} (length {len(bfactor_segment)}): {e}")
-             continue
+    # Filter every segment with every candidate period, stacking segments of
+    # equal length into one call per filter
+    try:
+        filtered = filter_bfactor_bank([segment for *_, segment in segments], candidates, order=filter_order, fs=1.0)
+    except ValueError as e:
+        print(f"Error creating Butterworth filter: {e}")
+        return pd.DataFrame()
 
-        # Normalize
-        bff_max = np.max(np.abs(bff))
-        if bff_max > 1e-9:
-            bff /= bff_max
-        else:
-            bff[:] = 0
-
-        # Find zero crossings (negative to positive)
-        zero_crossings = []
-        current_repeat = 0
-        repeat_numbers = np.zeros(len(bff), dtype=int)
-        
-        # Initialize first repeat number
-        if bff[0] > 0:
-            current_repeat = 1
-            zero_crossings.append(0)
-            
-        # Find all zero crossings (negative to positive transitions)
-        for i in range(1, len(bff)):
-            if bff[i-1] <= 0 and bff[i] > 0:
-                zero_crossings.append(i)
-                current_repeat += 1
-            repeat_numbers[i] = current_repeat
-
-        # Record information for all residues in the segment
-        for i in range(len(bff)):
-            residue_idx = a + i # Absolute residue index in the full protein
-            filtered_b_val = bff[i] # Filtered B-factor relative to segment start
-
-            # Use the repeat number we calculated based on zero crossings
-            lrr_repeat_number = repeat_numbers[i]
-
-            # Winding number calculation (remains the same)
-            winding_idx = residue_idx - 1
-            if 0 <= winding_idx < len(winding):
-                winding_val = winding[winding_idx]
-            else:
-                winding_val = np.nan
-
-            results.append({
-                'Protein Key': key,
-                'Residue Index': residue_idx,
-                'Filtered B-Factor': filtered_b_val,
-                'Winding Number': winding_val,
-                'LRR Repeat Number': lrr_repeat_number
-            })
+    for (key, a, b, winding, bfactor_segment), bank in zip(segments, filtered):
+        if bank is None:
+            print(f"Warning: Could not filter LRR segment [{a}, {b}) for {key} (length {len(bfactor_segment)})")
+            continue
+        result, zero_crossings = segment_peaks(key, a, b, winding, bank, candidates, sweep=periods is not None)
+        results.append(result)
 
         # Optional: Print debug information about the zero crossings
         print(f"Found {len(zero_crossings)} zero crossings for {key}")
@@ -239,31 +521,153 @@ def analyze_lrr_bfactor_peaks(pdb_dir, period=25, filter_order=10, cache_dir=Non
         print("No LRR segments processed or no data generated.")
         return pd.DataFrame()
 
-    df = pd.DataFrame(results)
-    return df
+    return peak_table(results)
+
+def stream_lrr_bfactor_peaks(pdb_dir, period=25, filter_order=10, cache_dir=None, structure_store=None, periods=None, protein_cache_dir=None, workers=1, group_size=16):
+    """
+    Streaming form of analyze_lrr_bfactor_peaks. Proteins are analyzed in
+    groups by a pool of worker processes, and the rows of each group are
+    yielded as soon as it is done, so memory does not grow with the panel
+    and results can be written while later proteins are still running.
+    Only the keys and breakpoints are read up front; each worker reads the
+    structures and B-factors of its group from the store or the PDB files.
+
+    Args:
+        pdb_dir, period, filter_order, cache_dir, structure_store, periods: As for
+            analyze_lrr_bfactor_peaks.
+        protein_cache_dir (str, optional): Directory of the Analyzer's ProteinCache;
+            windings of unchanged structures are read from it.
+        workers (int, optional): Number of worker processes. None uses every core.
+            Defaults to 1.
+        group_size (int, optional): Proteins per task; their segments are filtered
+            together. Defaults to 16.
+
+    Yields:
+        pandas.DataFrame: Peak rows of one group of proteins, in completion order,
+                          with the columns of analyze_lrr_bfactor_peaks.
+    """
+    candidates = [period] if periods is None else list(periods)
+    if not check_periods(candidates):
+        return
+
+    # PDB file of each protein, or None for proteins read from the store
+    if structure_store is not None:
+        print(f"Reading Structures from store: {structure_store}")
+        batch = StructureBatch.open(str(structure_store))
+        paths = {key: None for key in batch.keys if batch.has('bfactor', key)}
+        structure_store = str(structure_store)
+    else:
+        print(f"Reading Structures from PDBs in: {pdb_dir}")
+        try:
+            filenames = sorted(os.listdir(pdb_dir))
+        except FileNotFoundError:
+            print(f"Error: PDB directory not found: {pdb_dir}")
+            return
+        paths = {pdb_stem(filename): os.path.join(pdb_dir, filename) for filename in filenames if pdb_stem(filename) is not None}
+    analyzer = load_cached_breakpoints(cache_dir)
+    if analyzer is None:
+        return
+
+    keys = sorted(set(paths) & set(analyzer.breakpoints.keys()))
+    print(f"Processing {len(keys)} proteins with structures, b-factors, and cached breakpoints.")
+    groups = (
+        (i, ([(key, paths[key], np.asarray(analyzer.breakpoints[key])) for key in keys[i:i + group_size]],
+             candidates, filter_order, periods is not None, protein_cache_dir, structure_store))
+        for i in range(0, len(keys), group_size)
+    )
+    bar = tqdm(total=len(keys), desc="Processing Proteins")
+    for chunk in imap_proteins(analyze_protein_group, groups, workers=workers, chunksize=1):
+        for i, result, error in chunk:
+            bar.update(len(keys[i:i + group_size]))
+            if error is not None:
+                print(f"Warning: Failed to analyze proteins {keys[i]} to {keys[min(i + group_size, len(keys)) - 1]}: {error}")
+                continue
+            df, messages = result
+            for message in messages:
+                print(message)
+            if not df.empty:
+                yield df
+    bar.close()
+
+def write_peak_stream(frames, path):
+    """
+    Appends peak tables to a CSV file as they arrive.
+
+    Args:
+        frames (iterable): Peak tables, e.g. from stream_lrr_bfactor_peaks.
+        path (str): Output CSV file.
+
+    Returns:
+        int: Number of rows written.
+    """
+    rows = 0
+    with open(path, 'w', newline='') as handle:
+        for df in frames:
+            df.to_csv(handle, index=False, header=rows == 0)
+            handle.flush()
+            rows += len(df)
+    return rows
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="B-factor peak analysis of LRR regions")
+    parser.add_argument('--columnar', choices=['npz', 'parquet', 'feather'], help='Also write the results in this binary columnar format')
+    parser.add_argument('--periods', type=float, nargs='+', help='Candidate repeat periods to sweep; each protein keeps the best fitting one')
+    parser.add_argument('--stream', action='store_true', help='Analyze proteins in a worker pool and write rows as they are done')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --stream; defaults to every core')
+    args = parser.parse_args()
+    if args.stream and args.columnar:
+        parser.error("--columnar is not supported with --stream")
+
     # --- Configuration ---
     project_root = Path(__file__).parent.parent
     PDB_DIRECTORY = project_root / "intermediate_files" / "pdb_for_lrr_annotator"
     SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
     CACHE_DIRECTORY = os.path.join(SCRIPT_DIR, "cache")
+    # Per-protein geometry cached by 02_alphafold_to_lrr_annotation.py
+    PROTEIN_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, "proteins")
+    OUTPUT_CSV = os.path.join("intermediate_files", "bfactor_winding_lrr_segments.csv")
     # --- End Configuration ---
 
-    if not os.path.isdir(PDB_DIRECTORY):
-        print(f"Error: PDB Directory not found: {PDB_DIRECTORY}")
-        exit()
+    # The store is rewritten by every run of 02_alphafold_to_lrr_annotation.py, which
+    # only copies PDB files with --copy-models, so PDB_DIRECTORY may hold stale models
+    # and is only read when there is no store
+    STRUCTURE_STORE = os.path.join(SCRIPT_DIR, "cache", "structures")
+    if not os.path.exists(os.path.join(STRUCTURE_STORE, "index.json")):
+        if not (os.path.isdir(PDB_DIRECTORY) and any(pdb_stem(f) is not None for f in os.listdir(PDB_DIRECTORY))):
+            print(f"Error: Neither a structure store ({STRUCTURE_STORE}) nor a PDB Directory ({PDB_DIRECTORY}) was found")
+            exit()
+        STRUCTURE_STORE = None
     if not os.path.isdir(CACHE_DIRECTORY):
          print(f"Error: Cache Directory not found: {CACHE_DIRECTORY}")
          exit()
 
+    kernels = backend_info()
+    print(f"Kernel backend: {kernels['backend']} ({kernels['precision']}); set LRR_KERNEL_BACKEND and LRR_KERNEL_PRECISION to choose")
+
+    if args.stream:
+        frames = stream_lrr_bfactor_peaks(pdb_dir=PDB_DIRECTORY, cache_dir=CACHE_DIRECTORY, structure_store=STRUCTURE_STORE, periods=args.periods,
+                                          protein_cache_dir=PROTEIN_CACHE_DIRECTORY, workers=args.workers)
+        rows = write_peak_stream(frames, OUTPUT_CSV)
+        if rows:
+            print(f"\nResults saved to {OUTPUT_CSV} ({rows} rows)")
+        else:
+            os.remove(OUTPUT_CSV)
+            print("\nAnalysis finished, but no segment data was generated.")
+        exit()
+
     # Fix: Pass cache_dir as a named argument
-    peak_data = analyze_lrr_bfactor_peaks(pdb_dir=PDB_DIRECTORY, cache_dir=CACHE_DIRECTORY)
+    peak_data = analyze_lrr_bfactor_peaks(pdb_dir=PDB_DIRECTORY, cache_dir=CACHE_DIRECTORY, structure_store=STRUCTURE_STORE, periods=args.periods,
+                                          protein_cache=ProteinCache(PROTEIN_CACHE_DIRECTORY))
 
     if not peak_data.empty:
         print("\n--- B-Factor Peak Analysis Results ---")
-        output_csv = os.path.join("intermediate_files", "bfactor_winding_lrr_segments.csv")
-        peak_data.to_csv(output_csv, index=False)
+        output_csv = OUTPUT_CSV
+        write_peak_table(peak_data, output_csv)
         print(f"\nResults saved to {output_csv}")
+        if args.columnar:
+            output_columnar = os.path.splitext(output_csv)[0] + '.' + args.columnar
+            write_peak_table(peak_data, output_columnar)
+            print(f"Results saved to {output_columnar}")
     else:
         print("\nAnalysis finished, but no segment data was generated.")
@@ -0,0 +1,237 @@
+"""Benchmark and parity suite for the LRR geometry.
+
+Times `compute_winding`, `median_slope`, `compute_regression`,
+`compute_laplacian_circular_coords` and `analyze_lrr_bfactor_peaks` on
+synthetic solenoids of several lengths and on the cached real structures,
+recording the best wall time and the peak traced memory of each. Results
+can be saved as a JSON baseline and compared against one.
+
+Golden outputs (breakpoints, slopes and winding checksums) are stored
+separately, so that faster kernels or backends can be checked against the
+current annotation with `--check-golden`.
+
+Usage:
+    python LRR_Annotation/benchmark_geometry.py [--sizes 300 1000 3000]
+        [--save-baseline] [--check-golden] [--save-golden]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from geom_lrr import backend_info
+from geom_lrr.analyzer import compute_winding, median_slope, compute_regression, compute_lrr_regression, compute_laplacian_circular_coords
+from geom_lrr.synthetic import make_solenoid_of_length, write_pdb
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BENCHMARK_DIR = SCRIPT_DIR / "benchmarks"
+STRUCTURES_PICKLE = SCRIPT_DIR / "cache" / "structures.pickle"
+
+def make_cases(sizes, seed=0, real=True):
+    """Benchmark inputs: a synthetic solenoid of each size, and the real
+    structures of the cache, if present"""
+    cases = {}
+    for size in sizes:
+        res = make_solenoid_of_length(size, seed=seed)
+        cases[f"synthetic_{size}"] = dict(structure=res["structure"], bfactor=res["bfactor"], sequence=res["sequence"])
+    if real and STRUCTURES_PICKLE.exists():
+        with open(STRUCTURES_PICKLE, 'rb') as handle:
+            for key, structure in pickle.load(handle).items():
+                cases[key] = dict(structure=np.asarray(structure), bfactor=None, sequence=None)
+    return cases
+
+def measure(function, repeats=3):
+    """Peak memory traced during a first call, which also warms up caches
+    and JIT compilation, then the best and mean wall time of `repeats` calls"""
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - tic)
+    return dict(best=min(times), mean=float(np.mean(times)), peak_mb=peak / 2**20)
+
+def bfactor_peaks_benchmark(case, breakpoints, directory):
+    """Writes one synthetic protein as a PDB with a regression cache next
+    to it, and returns a function running `analyze_lrr_bfactor_peaks` on it"""
+    from analyze_bfactor_peaks import analyze_lrr_bfactor_peaks
+    pdb_dir = os.path.join(directory, 'pdb')
+    cache_dir = os.path.join(directory, 'cache')
+    os.makedirs(pdb_dir)
+    os.makedirs(cache_dir)
+    write_pdb(os.path.join(pdb_dir, 'protein.pdb'), case["structure"], case["bfactor"], case["sequence"])
+    for name, values in [('breakpoints', dict(protein=breakpoints)), ('slopes', dict(protein=0.0))]:
+        with open(os.path.join(cache_dir, name + '.pickle'), 'wb') as handle:
+            pickle.dump(values, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return analyze_lrr_bfactor_peaks(pdb_dir, cache_dir=cache_dir)
+    return run
+
+def run_benchmarks(cases, repeats=3, laplacian_max=3000):
+    """Times every function on every case
+
+    Returns:
+        dict: Timings keyed by "function/case"
+    """
+    records = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, case in cases.items():
+            structure = case["structure"]
+            winding = compute_winding(structure)["winding"]
+            breakpoints = compute_regression(winding)["breakpoints"]
+            a, b = breakpoints
+            benchmarks = dict(
+                compute_winding=lambda: compute_winding(structure),
+                median_slope=lambda: median_slope(winding),
+                compute_regression=lambda: compute_regression(winding),
+                compute_lrr_regression=lambda: compute_lrr_regression(winding),
+            )
+            if b - a <= laplacian_max:
+                benchmarks["compute_laplacian_circular_coords"] = lambda: compute_laplacian_circular_coords(structure[a:b])
+            benchmarks["compute_laplacian_circular_coords[sparse]"] = lambda: compute_laplacian_circular_coords(structure[a:b], sparse=True)
+            if case["bfactor"] is not None:
+                benchmarks["analyze_lrr_bfactor_peaks"] = bfactor_peaks_benchmark(case, breakpoints, os.path.join(tmp, name))
+            for function, run in benchmarks.items():
+                record = measure(run, repeats=repeats)
+                record["n_residues"] = len(structure)
+                records[f"{function}/{name}"] = record
+                print(f"{function:45s} {name:55s} {record['best']*1e3:10.2f} ms {record['peak_mb']:9.2f} MB")
+    return records
+
+def golden_outputs(cases):
+    """Annotation results to protect against regressions in faster kernels"""
+    golden = {}
+    for name, case in cases.items():
+        winding = compute_winding(case["structure"])["winding"]
+        exact = compute_regression(winding)
+        # gradient descent, the method used before the exact solver
+        descent = compute_regression(winding, method='descent')
+        adaptive = compute_lrr_regression(winding, segmentation='adaptive')
+        golden[name] = dict(
+            winding_last=float(winding[-1]),
+            winding_sum=float(np.sum(winding)),
+            median_slope=float(median_slope(winding)[0]),
+            breakpoints=[int(b) for b in exact["breakpoints"]],
+            descent_breakpoints=[int(b) for b in descent["breakpoints"]],
+            adaptive_breakpoints=[int(b) for b in adaptive["breakpoints"]],
+        )
+    return golden
+
+def check_golden(golden, reference, rtol=1e-6, tolerance=0):
+    """Compares golden outputs against a reference
+
+    Args:
+        golden (dict): Current outputs, from `golden_outputs`
+        reference (dict): Stored outputs
+        rtol (float, optional): Relative tolerance of floating point values. Defaults to 1e-6.
+        tolerance (int, optional): Allowed shift of a breakpoint, in residues. Defaults to 0.
+
+    Returns:
+        list: Description of every mismatch
+    """
+    mismatches = []
+    for name, expected in reference.items():
+        if name not in golden:
+            continue
+        for field, value in expected.items():
+            current = golden[name][field]
+            if isinstance(value, list):
+                ok = len(value) == len(current) and np.all(np.abs(np.array(value) - np.array(current)) <= tolerance)
+            else:
+                ok = np.isclose(current, value, rtol=rtol, atol=rtol)
+            if not ok:
+                mismatches.append(f"{name} {field}: expected {value}, got {current}")
+    return mismatches
+
+def compare_to_baseline(records, baseline, slowdown=1.5):
+    """Reports functions that got slower than `slowdown` times the baseline"""
+    slower = []
+    for key, record in records.items():
+        if key in baseline.get("records", {}):
+            ratio = record["best"] / baseline["records"][key]["best"]
+            if ratio > slowdown:
+                slower.append(f"{key}: {ratio:.2f}x slower than baseline")
+    return slower
+
+def environment():
+    return dict(
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=platform.machine(),
+        processor=platform.processor(),
+        cpus=os.cpu_count(),
+        kernels=backend_info(),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 1000, 3000], help='Lengths of the synthetic solenoids')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed calls per benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic solenoids')
+    parser.add_argument('--no-real', action='store_true', help='Skip the cached real structures')
+    parser.add_argument('--laplacian-max', type=int, default=3000, help='Longest LRR region for the dense Laplacian')
+    parser.add_argument('--baseline', default=str(BENCHMARK_DIR / 'baseline.json'), help='JSON baseline of timings')
+    parser.add_argument('--save-baseline', action='store_true', help='Overwrite the baseline with this run')
+    parser.add_argument('--golden', default=str(BENCHMARK_DIR / 'golden.json'), help='JSON golden outputs')
+    parser.add_argument('--save-golden', action='store_true', help='Overwrite the golden outputs with this run')
+    parser.add_argument('--check-golden', action='store_true', help='Only check the golden outputs')
+    parser.add_argument('--rtol', type=float, default=1e-6, help='Relative tolerance of golden values')
+    parser.add_argument('--tolerance', type=int, default=0, help='Allowed breakpoint shift, in residues')
+    args = parser.parse_args()
+
+    cases = make_cases(args.sizes, seed=args.seed, real=not args.no_real)
+    print(f"Kernels: {backend_info()}")
+
+    golden = golden_outputs(cases)
+    if args.save_golden:
+        os.makedirs(os.path.dirname(args.golden), exist_ok=True)
+        with open(args.golden, 'w') as handle:
+            json.dump(dict(seed=args.seed, outputs=golden), handle, indent=1)
+        print(f"Golden outputs saved to {args.golden}")
+    elif os.path.exists(args.golden):
+        with open(args.golden) as handle:
+            reference = json.load(handle)
+        if reference.get("seed") != args.seed:
+            print(f"Warning: golden outputs were made with seed {reference.get('seed')}, skipping synthetic cases")
+            reference["outputs"] = {key: value for key, value in reference["outputs"].items() if not key.startswith('synthetic_')}
+        mismatches = check_golden(golden, reference["outputs"], rtol=args.rtol, tolerance=args.tolerance)
+        for mismatch in mismatches:
+            print(f"Parity mismatch: {mismatch}")
+        print(f"Golden outputs: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+        if args.check_golden:
+            sys.exit(1 if mismatches else 0)
+    elif args.check_golden:
+        print(f"Error: no golden outputs at {args.golden}")
+        sys.exit(1)
+
+    records = run_benchmarks(cases, repeats=args.repeats, laplacian_max=args.laplacian_max)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as handle:
+            json.dump(dict(environment=environment(), records=records), handle, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        for line in compare_to_baseline(records, baseline):
+            print(f"Warning: {line}")
+
+if __name__ == "__main__":
+    main()
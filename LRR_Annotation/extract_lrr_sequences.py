@@ -1,20 +1,11 @@
 import numpy as np
-from Bio import PDB
-from Bio.PDB import *
-from Bio import SeqIO
+from geom_lrr.pdbio import read_pdb
 
 class LRRSequenceExtractor:
-    def __init__(self):
-        self.parser = PDB.PDBParser(QUIET=True)
-        
     def extract_sequence_from_pdb(self, pdb_file):
-        """Extract the full sequence from a PDB file"""
-        structure = self.parser.get_structure('protein', pdb_file)
-        ppb = PPBuilder()
-        seq = ""
-        for pp in ppb.build_peptides(structure):
-            seq += str(pp.get_sequence())
-        return seq
+        """Extract the sequence of the first chain from a PDB file, one
+        residue per CA atom, so it is indexed like the structures of `Loader`"""
+        return read_pdb(pdb_file)["sequence"]
 
     def extract_lrr_regions(self, sequence, breakpoints):
         """
@@ -77,9 +68,24 @@ class LRRSequenceExtractor:
         -------
         dict: Dictionary containing analysis results
         """
-        # Get full sequence
-        full_sequence = self.extract_sequence_from_pdb(pdb_file)
-        
+        return self.analyze_lrr_sequence(self.extract_sequence_from_pdb(pdb_file), breakpoints)
+
+    def analyze_lrr_sequence(self, full_sequence, breakpoints):
+        """
+        Analyze LRR regions of a sequence already read, e.g. from
+        `Loader.sequences`
+
+        Parameters
+        ----------
+        full_sequence: str
+            Full protein sequence, one residue per CA atom
+        breakpoints: list or numpy.ndarray
+            List/array of breakpoint positions
+
+        Returns
+        -------
+        dict: Dictionary containing analysis results
+        """
         # Extract LRR regions
         lrr_data = self.extract_lrr_regions(full_sequence, breakpoints)
         
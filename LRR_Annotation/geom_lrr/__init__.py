@@ -1,3 +1,8 @@
 from .loader import Loader
-from .analyzer import Analyzer, compute_winding, compute_regression, median_slope, compute_lrr_std, compute_laplacian_circular_coords, compute_lrr_discrepancy, compute_lrr_winding_laplacian
-from .plotter import Plotter, plot_regression, plot_residue_annotations_3d
\ No newline at end of file
+from .pdbio import read_pdb
+from .batch import StructureBatch
+from .cache import ProteinCache
+from .foldstore import FoldStore, sequence_key
+from .kernels import set_backend, get_backend, set_precision, backend_info
+from .analyzer import Analyzer, compute_winding, compute_winding_batch, compute_regression, compute_adaptive_regression, median_slope, compute_bfactor_periods, compute_bfactor_periods_batch, filter_bfactor_bank, compute_lrr_std, compute_laplacian_circular_coords, compute_lrr_discrepancy, compute_lrr_winding_laplacian
+from .plotter import Plotter, plot_regression, render_sheet, plot_residue_annotations_3d
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""Content-addressed, per-protein cache of derived geometry. Each entry
+is one .npz file named by a hash of its inputs (coordinates, windings, ...)
+and of the parameters of the computation, so adding or changing one
+receptor only computes and writes that receptor.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import numpy as np
+from collections.abc import MutableMapping
+from .kernels import get_dtype
+
+# Bump to invalidate every entry when a cached computation changes
+# (2: Laplacian windings read from the eigenvectors of 1 - B again)
+CACHE_VERSION = 2
+
+
+class Deferred:
+    def __init__(self, load):
+        """Placeholder for a value that is read from disk on first access
+
+        Args:
+            load (callable): Function of no arguments returning the value
+        """
+        self.load = load
+
+
+class LazyDict(MutableMapping):
+    def __init__(self, *args, **kwargs):
+        """Dictionary whose values may be `Deferred`, in which case they are
+        loaded (once) when first looked up. Used by `Analyzer` so that cache
+        hits cost nothing until the data is needed.
+        """
+        self.data = {}
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = self.data[key]
+        if isinstance(value, Deferred):
+            value = self.data[key] = value.load()
+        return value
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"LazyDict({list(self.data)})"
+
+    def defer(self, key, load):
+        """Stores a value to be loaded by `load()` on first access"""
+        self.data[key] = Deferred(load)
+
+    def __reduce__(self):
+        # pickle the loaded values, not the loaders
+        return (LazyDict, (dict(self.items()),))
+
+
+class ProteinCache:
+    def __init__(self, directory):
+        """Per-protein cache stored under `directory`, one subdirectory per
+        kind of computation (e.g. 'geometry', 'regression')
+
+        Args:
+            directory (str): Root directory of the cache; created if needed
+        """
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.used = set()
+
+    @staticmethod
+    def key(arrays, **params):
+        """Hash of the input arrays and the computation parameters.
+        Coordinates are hashed at float32 precision, so float32 batches and
+        float64 dictionaries of the same structures share entries.  The
+        kernel precision (LRR_KERNEL_PRECISION) is always hashed, so results
+        computed in float32 are never served to float64 runs or the reverse.
+
+        Args:
+            arrays (list): Input arrays
+            **params: JSON-serializable parameters of the computation
+
+        Returns:
+            str: Hexadecimal digest
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps(dict(params, version=CACHE_VERSION, precision=get_dtype().name), sort_keys=True, default=str).encode())
+        for a in arrays:
+            a = np.asarray(a)
+            if a.dtype.kind == 'f':
+                a = a.astype(np.float32)
+            h.update(str(a.shape).encode())
+            h.update(np.ascontiguousarray(a).tobytes())
+        return h.hexdigest()
+
+    def path(self, kind, key):
+        """Location of an entry; entries are spread over 256 subdirectories"""
+        return os.path.join(self.directory, kind, key[:2], key + '.npz')
+
+    def contains(self, kind, key):
+        return os.path.exists(self.path(kind, key))
+
+    def load(self, kind, key, name):
+        """Reads one array of an entry
+
+        Args:
+            kind (str): Kind of computation
+            key (str): Hash returned by `key`
+            name (str): Array to read from the entry
+        """
+        with np.load(self.path(kind, key)) as entry:
+            value = entry[name]
+        return value[()] if value.ndim == 0 else value
+
+    def touch(self, kind, key):
+        """Marks an entry as used, for `collect_garbage`"""
+        self.used.add((kind, key))
+        os.utime(self.path(kind, key))
+
+    def store(self, kind, key, **arrays):
+        """Writes an entry atomically, so concurrent runs never see a partial file
+
+        Args:
+            kind (str): Kind of computation
+            key (str): Hash returned by `key`
+            **arrays: Arrays (or scalars) to store
+        """
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        self.used.add((kind, key))
+
+    def entries(self):
+        """Iterates over the (kind, key) pairs of every entry on disk"""
+        for kind in sorted(os.listdir(self.directory)):
+            root = os.path.join(self.directory, kind)
+            if not os.path.isdir(root):
+                continue
+            for shard in sorted(os.listdir(root)):
+                for filename in sorted(os.listdir(os.path.join(root, shard))):
+                    if filename.endswith('.npz'):
+                        yield kind, filename[:-4]
+
+    def collect_garbage(self, max_age=None, dry_run=True):
+        """Removes stale entries: those not used by this session, or, if
+        `max_age` is given, those not used in the last `max_age` seconds.
+        Without `max_age`, every entry this instance did not touch is stale,
+        so by default the entries are only listed; pass `dry_run=False` to
+        delete them.
+
+        Args:
+            max_age (float, optional): Age in seconds beyond which unused entries are removed
+            dry_run (bool, optional): Only list what would be removed. Defaults to True.
+
+        Returns:
+            list: The (kind, key) pairs removed, or that would be removed
+        """
+        now = time.time()
+        removed = []
+        for kind, key in list(self.entries()):
+            path = self.path(kind, key)
+            if max_age is None:
+                stale = (kind, key) not in self.used
+            else:
+                stale = now - os.path.getmtime(path) > max_age
+            if stale:
+                removed.append((kind, key))
+                if not dry_run:
+                    os.remove(path)
+        return removed
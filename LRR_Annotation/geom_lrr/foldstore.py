@@ -0,0 +1,105 @@
+"""Persistent store of folded structures keyed by a hash of the folded
+sequence, so a receptor folded for one input sheet is never folded again
+for another. Each entry holds the CA coordinates and per-residue pLDDT of
+the chosen model and its ColabFold scores, in one .npz file written by
+`ProteinCache`.
+"""
+
+import hashlib
+import numpy as np
+from .cache import ProteinCache
+
+KIND = 'fold'
+
+
+def sequence_key(sequence):
+    """Hash of a protein sequence, ignoring whitespace. The same hash is
+    written to receptor_sheet_mapping.tsv by scripts/01_convert_sheet_to_fasta.py
+
+    Args:
+        sequence (str): One-letter sequence
+
+    Returns:
+        str: Hexadecimal digest
+    """
+    return hashlib.sha256(''.join(sequence.split()).encode()).hexdigest()
+
+
+class FoldStore:
+    def __init__(self, directory):
+        """Store of folded structures under `directory`
+
+        Args:
+            directory (str): Root directory of the store; created if needed
+        """
+        self.cache = ProteinCache(directory)
+        self.directory = self.cache.directory
+
+    def __contains__(self, sequence):
+        return self.cache.contains(KIND, sequence_key(sequence))
+
+    def missing(self, sequences):
+        """Entries of `sequences` that are not in the store
+
+        Args:
+            sequences (dict): Sequences keyed by receptor name
+
+        Returns:
+            dict: The sequences to fold, in the order of `sequences`
+        """
+        return {name: sequence for name, sequence in sequences.items() if sequence not in self}
+
+    def get(self, sequence):
+        """The stored model of a sequence, or None if it was never folded
+
+        Returns
+        -------
+        {
+            structure: ndarray(n, 3)
+                CA coordinates
+            bfactor: ndarray(n)
+                pLDDT of each residue
+            sequence: str
+                One-letter code of each CA, as read by `parse_pdb`
+            name: str
+                Receptor name the sequence was folded under
+            model: str
+                ColabFold model number
+            plddt: float
+                Mean pLDDT reported by ColabFold
+            ptm: float
+                pTM reported by ColabFold
+        }
+        """
+        key = sequence_key(sequence)
+        if not self.cache.contains(KIND, key):
+            return None
+        with np.load(self.cache.path(KIND, key)) as entry:
+            res = {name: entry[name] for name in entry.files}
+        for name in ('sequence', 'name', 'model'):
+            res[name] = str(res[name])
+        for name in ('plddt', 'ptm'):
+            res[name] = float(res[name])
+        return res
+
+    def put(self, sequence, structure, bfactor, residues, name, model, plddt, ptm):
+        """Stores the chosen model of a folded sequence, replacing any
+        earlier entry
+
+        Args:
+            sequence (str): Sequence that was folded
+            structure (ndarray): CA coordinates of the model
+            bfactor (ndarray): pLDDT of each residue
+            residues (str): One-letter code of each CA of the model
+            name (str): Receptor name the sequence was folded under
+            model (str): ColabFold model number
+            plddt (float): Mean pLDDT reported by ColabFold
+            ptm (float): pTM reported by ColabFold
+        """
+        self.cache.store(
+            KIND, sequence_key(sequence),
+            structure=np.asarray(structure, dtype=float),
+            bfactor=np.asarray(bfactor, dtype=float),
+            sequence=np.array(residues), name=np.array(name), model=np.array(str(model)),
+            plddt=np.array(float(plddt)), ptm=np.array(float(ptm))
+        )
@@ -0,0 +1,180 @@
+"""Numba implementations of the kernels registered in `kernels`. Each
+wrapper has the signature of its NumPy reference in `analyzer`; the
+compiled loops avoid the large temporaries of the vectorized versions.
+Imported by `kernels.get_backend` when the numba backend is active.
+"""
+
+import numpy as np
+from numba import njit
+
+from .kernels import KERNELS, register, get_dtype
+
+@njit(cache=True)
+def csm_loop(X, Y):
+    M, N, d = X.shape[0], Y.shape[0], X.shape[1]
+    C = np.empty((M, N), dtype=X.dtype)
+    for i in range(M):
+        for j in range(N):
+            total = 0.0
+            for k in range(d):
+                diff = X[i, k] - Y[j, k]
+                total += diff * diff
+            C[i, j] = np.sqrt(total)
+    return C
+
+@register('get_csm', 'numba')
+def get_csm(X, Y):
+    X = np.asarray(X, dtype=get_dtype())
+    Y = np.asarray(Y, dtype=get_dtype())
+    if len(X.shape) == 1:
+        X = X[:, None]
+    if len(Y.shape) == 1:
+        Y = Y[:, None]
+    return csm_loop(np.ascontiguousarray(X), np.ascontiguousarray(Y))
+
+@njit(cache=True)
+def window_loop(D, win):
+    N = D.shape[0]
+    M = N - win + 1
+    out = np.zeros((M, M), dtype=D.dtype)
+    # running window sum down each diagonal j - i = offset
+    for offset in range(-(M - 1), M):
+        i0 = max(0, -offset)
+        total = 0.0
+        for k in range(win):
+            total += D[i0 + k, i0 + offset + k]
+        i = i0
+        while True:
+            if offset != 0:
+                out[i, i + offset] = total
+            if i + 1 >= M or i + 1 + offset >= M:
+                break
+            total += D[i + win, i + offset + win] - D[i, i + offset]
+            i += 1
+    return out
+
+@register('sliding_window', 'numba')
+def sliding_window(D, win, Q=None):
+    if Q is not None:
+        # the cumulative table is already paid for, and the NumPy
+        # reference only reads the windows out of it
+        return KERNELS['sliding_window']['numpy'](D, win, Q)
+    D = np.ascontiguousarray(D)
+    out = [window_loop(D, int(w)) for w in np.atleast_1d(win)]
+    return out if np.ndim(win) else out[0]
+
+@njit(cache=True)
+def secant_histogram(data, small, big):
+    n = data.shape[0]
+    mean = 0.0
+    for t in range(n):
+        mean += data[t]
+    mean /= n
+    sy = np.zeros(n + 1)
+    syy = np.zeros(n + 1)
+    sty = np.zeros(n + 1)
+    for t in range(n):
+        y = data[t] - mean
+        sy[t + 1] = sy[t] + y
+        syy[t + 1] = syy[t] + y * y
+        sty[t + 1] = sty[t] + t * y
+
+    # first pass: range and number of the slopes
+    count = 0
+    a = np.inf
+    b = -np.inf
+    for i in range(max(n - small, 0)):
+        for run in range(small, min(big, n - i)):
+            slope = (data[i + run] - data[i]) / run
+            a = min(a, slope)
+            b = max(b, slope)
+            count += 1
+    if count == 0:
+        raise ValueError("Curve is too short for secant lines of the requested run")
+    b += 0.01
+    n_bins = int(np.sqrt(count))
+
+    # second pass: weighted histogram, weights as in `secant_slopes`
+    scores = np.zeros(n_bins)
+    for i in range(max(n - small, 0)):
+        for run in range(small, min(big, n - i)):
+            j = i + run
+            slope = (data[j] - data[i]) / run
+            Sy = sy[j] - sy[i]
+            Syy = syy[j] - syy[i]
+            Sty = sty[j] - sty[i] - i * Sy
+            St = run * (run - 1) / 2
+            Stt = (run - 1) * run * (2 * run - 1) / 6
+            residual = Syy - 2 * slope * Sty + slope ** 2 * Stt - (Sy - slope * St) ** 2 / run
+            scores[int(n_bins * (slope - a) / (b - a))] += run / (1 + max(residual, 0.0))
+    return a, b, scores
+
+@register('median_slope', 'numba')
+def median_slope(data, small = 100, big = 250):
+    data = np.asarray(data, dtype=get_dtype())
+    a, b, scores = secant_histogram(data, small, big)
+    return a + (np.argmax(scores) / len(scores)) * (b - a), scores.tolist()
+
+@njit(cache=True)
+def loss_loop(winding, boundaries, slope, penalties):
+    cost = 0.0
+    for i in range(len(boundaries) - 1):
+        a = boundaries[i]
+        b = min(boundaries[i + 1], winding.shape[0])
+        if b > a:
+            kind = i % 2
+            center = (a + b - 1) / 2
+            mean = 0.0
+            for t in range(a, b):
+                mean += winding[t]
+            mean /= b - a
+            total = 0.0
+            for t in range(a, b):
+                r = winding[t] - kind * slope * (t - center) - mean
+                total += r * r
+            cost += penalties[kind] * total
+    return cost
+
+@register('multi_loss', 'numba')
+def multi_loss(winding, breakpoints, slope, penalties):
+    boundaries = np.concatenate(([0], np.asarray(breakpoints).astype('int'), [len(winding)])).astype(np.int64)
+    return loss_loop(np.asarray(winding, dtype=float), boundaries, float(slope), np.asarray(penalties, dtype=float))
+
+@njit(cache=True)
+def transport_loop(dZ, seed):
+    B, n = dZ.shape[0], dZ.shape[1]
+    V = np.empty((B, n, 2, 3), dtype=dZ.dtype)
+    M = np.empty((3, 3), dtype=dZ.dtype)
+    for s in range(B):
+        V[s, 0] = seed[s]
+        for i in range(1, n):
+            ax, ay, az = dZ[s, i - 1, 0], dZ[s, i - 1, 1], dZ[s, i - 1, 2]
+            bx, by, bz = dZ[s, i, 0], dZ[s, i, 1], dZ[s, i, 2]
+            kx, ky, kz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
+            f = 1 / (1 + ax * bx + ay * by + az * bz)
+            # transpose of the Rodrigues rotation, I - K + K^2 / (1 + c)
+            M[0, 0] = 1 - (ky * ky + kz * kz) * f
+            M[1, 1] = 1 - (kx * kx + kz * kz) * f
+            M[2, 2] = 1 - (kx * kx + ky * ky) * f
+            M[0, 1] = kz + kx * ky * f
+            M[1, 0] = -kz + kx * ky * f
+            M[0, 2] = -ky + kx * kz * f
+            M[2, 0] = ky + kx * kz * f
+            M[1, 2] = kx + ky * kz * f
+            M[2, 1] = -kx + ky * kz * f
+            for r in range(2):
+                for c in range(3):
+                    V[s, i, r, c] = V[s, i - 1, r, 0] * M[0, c] + V[s, i - 1, r, 1] * M[1, c] + V[s, i - 1, r, 2] * M[2, c]
+    return V
+
+@register('parallel_transport', 'numba')
+def parallel_transport(dZ, seed=None):
+    from .analyzer import seed_frame
+    if seed is None:
+        seed = seed_frame(dZ[..., 0, :])
+    shape = dZ.shape
+    V = transport_loop(
+        np.ascontiguousarray(dZ.reshape((-1,) + shape[-2:])),
+        np.ascontiguousarray(np.broadcast_to(seed, shape[:-2] + (2, 3)).reshape(-1, 2, 3)).astype(dZ.dtype)
+    )
+    return V.reshape(shape[:-1] + (2, 3))
@@ -0,0 +1,122 @@
+"""Registry of the numerical kernels behind the LRR geometry. Each kernel
+has a NumPy reference implementation, registered by decorating it with
+`dispatch`, and may have a JIT-compiled Numba implementation (see
+`jit_kernels`), which is only imported when Numba is installed. Calls go
+through the backend that is active at call time, so benchmarks can report
+`backend_info()` alongside their timings.
+
+The backend and precision default to the environment variables
+LRR_KERNEL_BACKEND ('auto', 'numpy' or 'numba') and LRR_KERNEL_PRECISION
+('float64' or 'float32'), which worker processes inherit.
+"""
+
+import functools
+import os
+import numpy as np
+
+BACKENDS = ('numpy', 'numba')
+PRECISIONS = ('float64', 'float32')
+
+KERNELS = {}
+CONFIG = dict(
+    backend=os.environ.get('LRR_KERNEL_BACKEND', 'auto'),
+    precision=os.environ.get('LRR_KERNEL_PRECISION', 'float64')
+)
+
+def numba_version():
+    """Version of the installed Numba, or None"""
+    try:
+        import numba
+    except ImportError:
+        return None
+    return numba.__version__
+
+def register(name, backend='numpy'):
+    """Decorator registering a function as the `backend` implementation
+    of kernel `name`
+
+    Args:
+        name (str): Name of the kernel
+        backend (str, optional): One of `BACKENDS`. Defaults to 'numpy'.
+    """
+    def decorator(function):
+        KERNELS.setdefault(name, {})[backend] = function
+        return function
+    return decorator
+
+def dispatch(name):
+    """Decorator registering a function as the NumPy reference of kernel
+    `name`, and replacing it by a function with the same signature and
+    docstring that calls the implementation of the active backend
+
+    Args:
+        name (str): Name of the kernel
+    """
+    def decorator(function):
+        register(name)(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return get_kernel(name)(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def set_backend(backend='auto'):
+    """Selects the implementation used by every kernel
+
+    Args:
+        backend (str, optional): 'numpy', 'numba', or 'auto', which uses
+            Numba when it is installed. Defaults to 'auto'.
+    """
+    if backend not in BACKENDS + ('auto',):
+        raise ValueError(f"Unknown kernel backend '{backend}'")
+    if backend == 'numba' and numba_version() is None:
+        raise ImportError("The numba kernel backend requires Numba to be installed")
+    CONFIG['backend'] = backend
+
+def get_backend():
+    """Name of the active backend, with 'auto' resolved. Scripts report
+    the backend 'auto' picked through `backend_info`"""
+    backend = CONFIG['backend']
+    if backend == 'auto':
+        backend = 'numba' if numba_version() is not None else 'numpy'
+        CONFIG['backend'] = backend
+    if backend == 'numba':
+        # registers the Numba implementations on first use
+        from . import jit_kernels
+    return backend
+
+def set_precision(precision='float64'):
+    """Selects the floating point type the kernels compute in
+
+    Args:
+        precision (str, optional): 'float64' or 'float32'. Defaults to 'float64'.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown kernel precision '{precision}'")
+    CONFIG['precision'] = precision
+
+def get_dtype():
+    """Numpy dtype of the active precision"""
+    return np.dtype(CONFIG['precision'])
+
+def get_kernel(name):
+    """Implementation of kernel `name` for the active backend, falling
+    back to the NumPy reference if the backend does not provide one"""
+    implementations = KERNELS[name]
+    return implementations.get(get_backend(), implementations['numpy'])
+
+def backend_info():
+    """Description of the active configuration, for benchmark reports
+
+    Returns:
+        dict: The active backend and precision, the installed Numba version,
+        and the backend actually serving each kernel
+    """
+    backend = get_backend()
+    return dict(
+        backend=backend,
+        precision=CONFIG['precision'],
+        numba=numba_version(),
+        kernels={name: backend if backend in implementations else 'numpy' for name, implementations in KERNELS.items()}
+    )
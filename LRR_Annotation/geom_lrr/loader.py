@@ -2,6 +2,8 @@ import os
 import pickle
 import numpy as np
 
+from .pdbio import read_pdb, read_pdbs, read_archive, pdb_stem
+
 """Loads batches of PBD files from disk, extracts backbones, stores them
 in a dictionary, labeled by filename. 
 """
@@ -9,27 +11,56 @@ class Loader:
     def __init__(self):
         self.structures = {}
         self.bfactors = {}
+        self.sequences = {}
+        self.errors = {}
 
-    def load_batch(self, directory, prefix = '', progress=True):
+    def load_batch(self, directory, prefix = '', progress=True, workers = 1, prefetch = None, select = None):
         """Loads batch of PDB files from specified directory and stores
         them in the self.structures dictionary, where they can be looked up
-        by filename. Optionally a 
+        by filename. The b-factors and sequences read in the same pass are
+        stored in self.bfactors and self.sequences. Files are added in
+        sorted order whatever the number of workers, and files that fail
+        to parse are recorded in self.errors instead of stopping the load.
 
         Args:
             directory (str): Path to folder containing .pdb files
             prefix (str, optional): Prepended to keys when storing structures in
             dictionary (deals with conflicting filenames over multiple imports).
             Defaults to ''.
+            progress (bool, optional): Whether to show a progress bar. Defaults to True.
+            workers (int, optional): Number of parsing processes. 1 parses in this
+            process, None uses every core. Defaults to 1.
+            prefetch (int, optional): Maximum number of files read ahead of the
+            parsing. Defaults to four per worker.
+            select (callable, optional): Maps each filename to its key, or to None
+            to skip the file. Defaults to the name without .pdb or .pdb.gz.
         """
-        from Bio.PDB import PDBParser
-        from tqdm import tqdm
-        parser = PDBParser()
-        for filename in (tqdm(os.listdir(directory), desc = 'Loading PDBs') if progress else os.listdir(directory)):
-            if filename.endswith('.pdb'):
-                path = os.path.join(directory, filename)
-                key = os.path.splitext(filename)[0]
-                chain = next(parser.get_structure(key, path).get_chains())
-                self.structures[prefix + key] = np.array([np.array(list(residue["CA"].get_vector())) for residue in chain.get_residues()])    
+        select = pdb_stem if select is None else select
+        keys = {}
+        for filename in sorted(os.listdir(directory)):
+            key = select(filename)
+            if key is not None:
+                keys[os.path.join(directory, filename)] = prefix + key
+        results, errors = read_pdbs(keys, workers = workers, prefetch = prefetch, progress = progress)
+        self.store_results({keys[path]: res for path, res in results.items()}, {keys[path]: error for path, error in errors.items()})
+
+    def load_archive(self, path, prefix = '', progress=True, workers = 1, prefetch = None, select = None):
+        """Loads the PDB files of a .tar, .tar.gz, .tgz or .zip archive, or
+        a single .pdb.gz file, without extracting it to disk. Like
+        `load_batch`, failures are recorded in self.errors.
+
+        Args:
+            path (str): Path to the archive
+            prefix (str, optional): Prepended to keys. Defaults to ''.
+            progress (bool, optional): Whether to show a progress bar. Defaults to True.
+            workers (int, optional): Number of parsing processes. Defaults to 1.
+            prefetch (int, optional): Maximum number of members read ahead of the
+            parsing. Defaults to four per worker.
+            select (callable, optional): Maps the name of each member to its key,
+            or to None to skip it. Defaults to the basename without .pdb or .pdb.gz.
+        """
+        results, errors = read_archive(path, select = select, workers = workers, prefetch = prefetch, progress = progress)
+        self.store_results({prefix + key: res for key, res in results.items()}, {prefix + key: error for key, error in errors.items()})
 
 
     def load_single(self, directory, filename, prefix = ''):
@@ -43,19 +74,55 @@ class Loader:
             dictionary (deals with conflicting filenames over multiple imports).
             Defaults to ''.
         """
-        from Bio.PDB import PDBParser
-        parser = PDBParser()
-        assert filename in os.listdir(directory)
-
-        if filename.endswith('.pdb'):
-            path = os.path.join(directory, filename)
-            key = os.path.splitext(filename)[0]
-            chain = next(parser.get_structure(key, path).get_chains())
-            self.structures[prefix + key] = np.array([np.array(list(residue["CA"].get_vector())) for residue in chain.get_residues()])    
-            try:
-                self.bfactors[prefix + key] = np.array([residue["CA"].get_bfactor() for residue in chain.get_residues()])
-            except:
-                print("Unable to compute bfactor for", filename)
+        path = os.path.join(directory, filename)
+        assert os.path.isfile(path)
+
+        if pdb_stem(filename) is not None:
+            self.load_file(path, prefix = prefix)
+
+    def load_file(self, path, prefix = ''):
+        """Reads the CA coordinates, b-factors and sequence of the first
+        chain of a PDB file in one pass (see `pdbio.read_pdb`), and stores
+        them under the filename without extension
+
+        Args:
+            path (str): Path to .pdb or .pdb.gz file
+            prefix (str, optional): Prepended to the key. Defaults to ''.
+        """
+        self.store(self.key(path, prefix), read_pdb(path))
+
+    def key(self, path, prefix = ''):
+        """Dictionary key of a PDB file: its filename without extension"""
+        return prefix + pdb_stem(path)
+
+    def store(self, key, res):
+        """Stores the output of `pdbio.parse_pdb` under `key`"""
+        self.structures[key] = res["structure"]
+        self.bfactors[key] = res["bfactor"]
+        self.sequences[key] = res["sequence"]
+
+    def store_results(self, results, errors):
+        """Stores parsed files and records failures, both keyed by the
+        dictionary key of the file"""
+        for key, res in results.items():
+            self.store(key, res)
+        for key, error in errors.items():
+            self.errors[key] = error
+            print(f"Warning: failed to load {key}: {error}")
+
+    def to_structure_batch(self, dtype = np.float32):
+        """Packs the loaded structures, and the b-factors of those that
+        have them, into a StructureBatch
+
+        Args:
+            dtype (Numpy dtype, optional): Type of the coordinate buffer. Defaults to float32.
+        """
+        from .batch import StructureBatch
+        batch = StructureBatch.from_dict(self.structures, dtype = dtype)
+        bfactors = {key: self.bfactors[key] for key in self.structures if key in self.bfactors}
+        if bfactors:
+            batch.add_field('bfactor', bfactors)
+        return batch
 
     def cache(self, directory, prefix = ''):
         """Caches imported structure to directory
@@ -77,3 +144,26 @@ class Loader:
         with open(os.path.join(directory, prefix + 'structures.pickle'), 'rb') as handle:
             self.structures.update(pickle.load(handle))
             
+
+    def cache_store(self, directory, dtype = np.float64):
+        """Writes the structures, and the b-factors of those that have them,
+        to a memory-mappable store (see `StructureBatch.save`)
+
+        Args:
+            directory (str): Directory of the store
+            dtype (Numpy dtype, optional): Type of the coordinate buffer. Defaults to float64.
+        """
+        self.to_structure_batch(dtype = dtype).save(directory)
+
+    def retrieve_store(self, directory):
+        """Loads structures and b-factors from a store, as zero-copy views of
+        its memory-mapped buffers
+
+        Args:
+            directory (str): Directory of the store
+        """
+        from .batch import StructureBatch
+        batch = StructureBatch.open(directory)
+        self.structures.update(batch.to_dict())
+        if 'bfactor' in batch.fields:
+            self.bfactors.update(batch.to_dict('bfactor'))
@@ -1,7 +1,12 @@
 import numpy as np
+import functools
 import os
 import pickle
 
+from .batch import StructureBatch
+from .cache import LazyDict, ProteinCache
+from .kernels import dispatch, get_dtype
+
 
 ######################################################
 ##      WINDING NUMBER BY PARALLEL TRANSPORT        ##
@@ -24,6 +29,102 @@ def compromise(a, b):
     Y = u @ vh
     return [*Y]
 
+def seed_frame(z):
+    """
+    Deterministic orthonormal basis for the orthogonal complement of
+    a unit vector, obtained by Gram-Schmidt on the coordinate axis least
+    aligned with it. The basis (v, w, z) is right-handed.
+
+    Parameters
+    ----------
+    z: ndarray(..., 3)
+        Unit vector(s)
+
+    Returns
+    -------
+    ndarray(..., 2, 3)
+        The basis vectors v, w for each z
+    """
+    e = np.eye(3)[np.argmin(np.abs(z), axis=-1)]
+    v = e - np.sum(e * z, axis=-1)[..., np.newaxis] * z
+    v /= np.linalg.norm(v, axis=-1)[..., np.newaxis]
+    w = np.cross(z, v)
+    return np.stack([v, w], axis=-2)
+
+@dispatch('parallel_transport')
+def parallel_transport(dZ, seed=None):
+    """
+    Transports a frame of the normal plane along a sequence of unit
+    tangent vectors. Projecting the previous frame onto the next normal
+    plane and taking the closest orthonormal frame (as `compromise` does)
+    is the same as applying the minimal rotation taking one tangent to
+    the next, so the frames are prefix products of these rotations, which
+    are computed with log(n) batched matrix products.
+
+    Parameters
+    ----------
+    dZ: ndarray(..., n, 3)
+        Unit tangent vectors, with optional leading batch dimensions
+    seed: ndarray(..., 2, 3) (optional)
+        Orthonormal frame orthogonal to dZ[..., 0, :].  If not specified,
+        `seed_frame` is used.
+
+    Returns
+    -------
+    V: ndarray(..., n, 2, 3)
+        V[..., i, :, :] is an orthonormal basis for the orthogonal complement of dZ[..., i, :]
+    """
+    if seed is None:
+        seed = seed_frame(dZ[..., 0, :])
+
+    # Rodrigues rotation R_i taking dZ[i-1] to dZ[i], stored transposed
+    # (R_i^T = I - K + K^2 / (1 + c)) since frames are row vectors
+    a, b = dZ[..., :-1, :], dZ[..., 1:, :]
+    k = np.cross(a, b)
+    c = np.sum(a * b, axis=-1)
+    K = np.zeros(k.shape + (3,), dtype=dZ.dtype)
+    K[..., 0, 1], K[..., 0, 2], K[..., 1, 2] = -k[..., 2], k[..., 1], -k[..., 0]
+    K[..., 1, 0], K[..., 2, 0], K[..., 2, 1] = k[..., 2], -k[..., 1], k[..., 0]
+    M = np.eye(3, dtype=dZ.dtype) - K + (K @ K) / (1 + c)[..., np.newaxis, np.newaxis]
+
+    # inclusive prefix products M_1 M_2 ... M_i by recursive doubling
+    n = M.shape[-3]
+    shift = 1
+    while shift < n:
+        M[..., shift:, :, :] = M[..., :-shift, :, :] @ M[..., shift:, :, :]
+        shift *= 2
+
+    V = np.empty(dZ.shape[:-1] + (2, 3), dtype=dZ.dtype)
+    V[..., 0, :, :] = seed
+    V[..., 1:, :, :] = seed[..., np.newaxis, :, :] @ M
+    return V
+
+def winding_from_frames(X, Y, V):
+    """
+    Projects the residues onto the normal bundle of the backbone and
+    accumulates the angle swept out between consecutive residues
+
+    Parameters
+    ----------
+    X: ndarray(..., n, 3)
+        Smoothed residue coordinates
+    Y: ndarray(..., n, 3)
+        Backbone curve
+    V: ndarray(..., n, 2, 3)
+        Normal bundle at each residue
+
+    Returns
+    -------
+    winding: ndarray(..., n-1)
+        Unsigned cumulative winding number
+    flattened: ndarray(..., n, 2)
+        Residues projected onto the normal bundle
+    """
+    flattened = np.einsum('...ij,...j->...i', V, X - Y)
+    s, c = flattened[..., 0], flattened[..., 1]
+    summand = np.arctan((c[..., :-1] * s[..., 1:] - s[..., :-1] * c[..., 1:]) / (s[..., :-1] * s[..., 1:] + c[..., :-1] * c[..., 1:]))
+    return np.cumsum(summand, axis=-1) / (2 * np.pi), flattened
+
 def compute_winding(structure, smoothing=20):
     """
     Computes the normal bundle framing and cumulative winding number
@@ -56,6 +157,7 @@ def compute_winding(structure, smoothing=20):
     }
     """
     from scipy.ndimage import gaussian_filter1d as gf1d
+    structure = np.asarray(structure, dtype=get_dtype()) # packed batches may store float32
     X = gf1d(structure,  sigma=1, axis=0) # smoothed out structure
     Y = gf1d(X, sigma=smoothing, axis=0) # backbone
     dY = gf1d(X, sigma=smoothing, axis=0, order=1) # tangent of backbone
@@ -63,35 +165,222 @@ def compute_winding(structure, smoothing=20):
 
     # parallel transport along backbone
     # V[i] is an orthonormal basis for the orthogonal complement of dZ[i]
-    V = np.zeros((len(dZ), 2, 3)) 
-    V[0] = np.random.rand(2, 3)
-    for i, z in enumerate(dZ):
-        if i: V[i] = V[i-1]
+    V = parallel_transport(dZ)
 
-        # remove projection onto z, the current tangent vector,
-        # then enforce orthonormality
-        V[i] -= np.outer(V[i] @ z, z)
-        V[i] = compromise(*V[i])
+    winding, flattened = winding_from_frames(X, Y, V)
+    winding *= np.sign(winding[-1] - winding[0])
 
-    s = np.array([x @ v for x, v in zip(X - Y, V[:,0,:])])
-    c = np.array([x @ w for x, w in zip(X - Y, V[:,1,:])])
+    return dict(
+        winding = winding,
+        backbone=Y,
+        normal_bundle=V,
+        flattened = flattened
+    )
 
-    summand = np.arctan((c[:-1] * s[1:] - s[:-1] * c[1:]) / (s[:-1] * s[1:] + c[:-1] * c[1:]))
+def compute_winding_batch(structures, lengths=None, smoothing=20):
+    """
+    Computes the normal bundle framing and cumulative winding number
+    for many protein structures at once. Each structure is padded by
+    reflection, which is how `compute_winding` extends the curve when
+    smoothing, so the results agree with `compute_winding` on every
+    structure.
 
-    winding = np.cumsum(summand) / (2 * np.pi)
-    winding *= np.sign(winding[-1] - winding[0])
+    Parameters
+    ----------
+    structures: list of ndarray(n_i, 3), or ndarray(b, n, 3)
+        Coordinates of the residue sequences in 3D, either as a list
+        or already padded to a common length
+    lengths: ndarray(b) (optional)
+        Number of residues in each padded structure.  Only used if
+        `structures` is an array; defaults to the full padded length.
+    smoothing: int (optional): 
+        Amount of smoothing to apply when computing the backbone curve. Defaults to 20.
+
+    Returns
+    -------
+    {
+        winding: ndarray(b, n-1)
+            The winding number at each residue, zero-padded
+        backbone: ndarray(b, n, 3)
+            The smoothed backbone structure
+        normal_bundle: ndarray(b, n, 2, 3)
+            The normal bundle at each residue
+        flattened: ndarray(b, n, 2)
+            Residues projected onto the normal bundle
+        lengths: ndarray(b)
+            Number of residues in each structure
+    }
+    Entries past the length of a structure are not meaningful.
+    """
+    from scipy.ndimage import gaussian_filter1d as gf1d
+    if lengths is None:
+        lengths = [len(structure) for structure in structures]
+    lengths = np.asarray(lengths, dtype=int)
+    n = int(np.max(lengths))
+
+    # pad past the end by more than the radius of both filters so that
+    # the boundary of the padded array never reaches a real residue
+    margin = int(4 * smoothing + 0.5) + 5
+    padded = np.stack([
+        np.pad(np.asarray(structure, dtype=get_dtype())[:length], ((0, n + margin - length), (0, 0)), mode='symmetric')
+        for structure, length in zip(structures, lengths)
+    ])
+
+    X = gf1d(padded, sigma=1, axis=1)
+    Y = gf1d(X, sigma=smoothing, axis=1)
+    dY = gf1d(X, sigma=smoothing, axis=1, order=1)
+    X, Y, dY = X[:, :n], Y[:, :n], dY[:, :n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dZ = dY / np.sqrt(np.sum(dY ** 2, axis=-1))[..., np.newaxis]
+        V = parallel_transport(dZ)
+        winding, flattened = winding_from_frames(X, Y, V)
+
+    valid = np.arange(n - 1)[np.newaxis, :] < (lengths - 1)[:, np.newaxis]
+    winding[~valid] = 0
+    last = winding[np.arange(len(lengths)), np.maximum(lengths - 2, 0)]
+    winding *= np.sign(last - winding[:, 0])[:, np.newaxis]
 
     return dict(
         winding = winding,
         backbone=Y,
         normal_bundle=V,
-        flattened = np.array([s, c]).T
+        flattened = flattened,
+        lengths = lengths
     )
 
 
+def compute_winding_group(structures, smoothing=20):
+    """
+    Runs `compute_winding_batch` on a list of structures and splits the
+    padded results back into one `compute_winding`-style dict per structure
+
+    Parameters
+    ----------
+    structures: list of ndarray(n_i, 3)
+        Coordinates of the residue sequences in 3D
+    smoothing: int (optional): 
+        Amount of smoothing to apply when computing the backbone curve. Defaults to 20.
+
+    Returns
+    -------
+    list of dict
+        The winding, backbone, normal_bundle and flattened curve of each structure
+    """
+    res = compute_winding_batch(structures, smoothing=smoothing)
+    return [
+        dict(
+            winding = res["winding"][i, :n-1],
+            backbone = res["backbone"][i, :n],
+            normal_bundle = res["normal_bundle"][i, :n],
+            flattened = res["flattened"][i, :n]
+        )
+        for i, n in enumerate(res["lengths"])
+    ]
+
+
 ######################################################
 ##             B FACTOR PERIOD LOCATIONS            ##
 ######################################################
+def bandpass_bank(periods, order=10, fs=2.0):
+    """
+    Butterworth bandpass filters passing frequencies between 0.5/period
+    and 2/period, one for each candidate period
+    
+    Parameters
+    ----------
+    periods: list of float
+        Candidate periods, in residues
+    order: int
+        Order of the filters
+    fs: float
+        Sampling frequency the cutoffs are relative to. The default of 2
+        gives the cutoffs in units of the Nyquist frequency, as
+        `signal.butter` does without fs. Upper cutoffs at or above the
+        Nyquist frequency are clipped just below it.
+    
+    Returns
+    -------
+    list of ndarray
+        Second-order sections of each filter
+    """
+    from scipy import signal
+    bank = []
+    for period in periods:
+        low, high = 0.5/period, min(2/period, 0.99*fs/2)
+        if low >= high:
+            raise ValueError(f"Period {period} is too short for a bandpass filter")
+        bank.append(signal.butter(order, [low, high], 'bandpass', output='sos', fs=fs))
+    return bank
+
+def filter_bfactor_bank(segments, periods=(25,), order=10, fs=2.0):
+    """
+    Zero-phase bandpass filters many b-factor segments with a bank of
+    filters. Segments of equal length are stacked and filtered with one
+    call per filter, which gives the same result as filtering them one
+    at a time.
+    
+    Parameters
+    ----------
+    segments: list of ndarray(N)
+        B-factor segments, of any lengths
+    periods: list of float
+        Candidate periods, see `bandpass_bank`
+    order: int
+        Order of the filters
+    fs: float
+        Sampling frequency, see `bandpass_bank`
+    
+    Returns
+    -------
+    filtered: list of ndarray(len(periods), N)
+        Filtered segments, or None for segments too short to filter
+    """
+    from scipy import signal
+    bank = bandpass_bank(periods, order=order, fs=fs)
+    groups = {}
+    for i, segment in enumerate(segments):
+        groups.setdefault(len(segment), []).append(i)
+    filtered = [None]*len(segments)
+    for n, members in groups.items():
+        X = np.array([segments[i] for i in members], dtype=float).reshape(len(members), n)
+        try:
+            Y = np.stack([signal.sosfiltfilt(sos, X, axis=-1) for sos in bank], axis=1)
+        except ValueError:
+            continue
+        for i, y in zip(members, Y):
+            filtered[i] = y
+    return filtered
+
+def period_mismatch(filtered, periods):
+    """
+    How far the oscillation of each filtered signal is from the period
+    of its filter. Every band passes the dominant periodicity of the
+    b-factor, so each filtered signal oscillates at roughly the true
+    period, and the filter whose period matches it fits best.
+    
+    Parameters
+    ----------
+    filtered: ndarray(len(periods), N)
+        A segment filtered with `filter_bfactor_bank`
+    periods: list of float
+        Periods of the filters
+    
+    Returns
+    -------
+    ndarray(len(periods))
+        Absolute log ratio of the mean spacing of rising zero crossings to
+        the period; the smallest marks the best-fitting period
+    """
+    filtered = np.asarray(filtered)
+    crossings = np.sum((filtered[:, :-1] <= 0)*(filtered[:, 1:] > 0), axis=1)
+    spacing = filtered.shape[1]/np.maximum(crossings, 1)
+    return np.abs(np.log(spacing/np.asarray(periods, dtype=float)))
+
+def local_maxima(x):
+    """Indices of the strict local maxima of a signal"""
+    idx = np.arange(1, x.size-1)
+    return idx[(x[idx] > x[idx-1])*(x[idx] > x[idx+1])]
+
 def compute_bfactor_periods(bfactor, period=25):
     """
     Given the b-factor, or the displacement of the atoms
@@ -114,18 +403,51 @@ def compute_bfactor_periods(bfactor, period=25):
     """
     ## Step 1: Bandpass filter the b factor to hone in on periodicities
     from scipy import signal
-    sos = signal.butter(10, [0.5/period, 2/period], 'bandpass', output='sos')
+    sos = bandpass_bank([period])[0]
     bff = signal.sosfiltfilt(sos, bfactor)
     ## Step 2: Find and return all local maxes
-    idx = np.arange(1, bff.size-1)
-    idx = idx[(bff[idx] > bff[idx-1])*(bff[idx] > bff[idx+1])]
-    return idx
+    return local_maxima(bff)
+
+def compute_bfactor_periods_batch(bfactors, periods=25):
+    """
+    `compute_bfactor_periods` for many proteins, filtering proteins of
+    equal length together. With several candidate periods, each protein
+    uses the best-fitting one (see `period_mismatch`).
+    
+    Parameters
+    ----------
+    bfactors: list of ndarray(N)
+        The b-factor of each protein
+    periods: float or list of float
+        Approximate period, or candidate periods
+    
+    Returns
+    -------
+    {
+        locations: list of ndarray(int)
+            Locations of periods of each protein, None if it could not be filtered
+        period: list of float
+            Period used for each protein
+    }
+    """
+    periods = list(np.atleast_1d(periods))
+    locations, chosen = [], []
+    for bff in filter_bfactor_bank(bfactors, periods):
+        if bff is None:
+            locations.append(None)
+            chosen.append(None)
+            continue
+        best = int(np.argmin(period_mismatch(bff, periods))) if len(periods) > 1 else 0
+        locations.append(local_maxima(bff[best]))
+        chosen.append(periods[best])
+    return dict(locations=locations, period=chosen)
 
 
 ######################################################
 ##          LAPLACIAN CIRCULAR COORDINATES          ##
 ######################################################
 
+@dispatch('get_csm')
 def get_csm(X, Y):
     """
     Return the Euclidean cross-similarity matrix between the M points
@@ -141,6 +463,8 @@ def get_csm(X, Y):
     D: ndarray(M, N)
         An MxN Euclidean cross-similarity matrix
     """
+    X = np.asarray(X, dtype=get_dtype())
+    Y = np.asarray(Y, dtype=get_dtype())
     if len(X.shape) == 1:
         X = X[:, None]
     if len(Y.shape) == 1:
@@ -202,7 +526,35 @@ def csm_to_binary_mutual(D, kappa):
     """
     return csm_to_binary(D, kappa)*(csm_to_binary(D.T, kappa).T)
 
-def sliding_window(D, win):
+def diagonal_cumsum(D):
+    """
+    Cumulative sums of a square matrix down each of its diagonals,
+    computed once in O(N^2) by viewing the diagonals as columns of a
+    sheared copy of the matrix
+
+    Parameters
+    ----------
+    D: ndarray(N, N)
+        Distance matrix
+
+    Returns
+    -------
+    Q: ndarray(N+1, 2N-1)
+        Q[r, j-i+N-1] is the sum of D[i+k, j+k] over all k with i+k < r,
+        so any run of a diagonal is the difference of two entries
+    """
+    N = D.shape[0]
+    Q = np.zeros((N+1, 2*N-1), dtype=get_dtype())
+    # write D[r, j] to Q[r+1, j-r+N-1] through a view whose row stride is
+    # one element shorter, which lines up diagonal j-i of D as a column
+    sheared = np.lib.stride_tricks.as_strided(
+        Q[1:, N-1:], shape=(N, N), strides=(Q.strides[0] - Q.strides[1], Q.strides[1]))
+    sheared[:] = D
+    np.add.accumulate(Q, axis=0, out=Q)
+    return Q
+
+@dispatch('sliding_window')
+def sliding_window(D, win, Q=None):
     """
     Average down diagonals to simulate the effect of a sliding window
     
@@ -210,21 +562,31 @@ def sliding_window(D, win):
     ----------
     D: ndarray(N, N)
         Distance matrix
-    win: int
-        Sliding window length
+    win: int or list of int
+        Sliding window length, or several lengths to read from the same
+        cumulative table
+    Q: ndarray(N+1, 2N-1) (optional)
+        `diagonal_cumsum(D)`, if already computed
 
     Returns
     -------
     ndarray(N-win+1, N-win+1)
-        Sliding window distance matrix
+        Sliding window distance matrix, or a list of them if `win` is a list
     """
     N = D.shape[0]
-    D_stack = np.zeros((N-win+1, N-win+1))
-    for i in range(0, win):
-        D_stack += D[i:i+N-win+1, i:i+N-win+1]
-    for i in range(N-win+1):
-        D_stack[i, i] = 0
-    return D_stack
+    if Q is None:
+        Q = diagonal_cumsum(D)
+    out = []
+    for w in np.atleast_1d(win):
+        M = N-w+1
+        # window sums in the sheared layout, then read entry (i, j) back
+        # from column j-i+N-1 of row i
+        S = Q[w:w+M] - Q[0:M]
+        D_stack = np.lib.stride_tricks.as_strided(
+            S.ravel()[N-1:], shape=(M, M), strides=(S.strides[0] - S.strides[1], S.strides[1])).copy()
+        D_stack[np.arange(M), np.arange(M)] = 0
+        out.append(D_stack)
+    return out if np.ndim(win) else out[0]
 
 def get_unweighted_laplacian_eigs_dense(W):
     """
@@ -241,6 +603,8 @@ def get_unweighted_laplacian_eigs_dense(W):
     """
     from scipy import sparse
     import numpy.linalg as linalg
+    # binary matrices are unsigned, in which D - W would wrap around
+    W = np.asarray(W, dtype=float)
     D = sparse.dia_matrix((W.sum(1).flatten(), 0), W.shape).toarray()
     L = D - W
     try:
@@ -249,11 +613,265 @@ def get_unweighted_laplacian_eigs_dense(W):
         return np.zeros_like(W)
     return v
 
-def get_most_circular_pair(v, period, hop=10):
+def get_complement_eigs_dense(B):
+    """
+    Get the eigenvectors of 1 - B, the spectral embedding of the mutual
+    nearest neighbor graph that circular coordinates are read from.
+    Earlier versions computed them as `get_unweighted_laplacian_eigs_dense(1-B)`
+    on an unsigned B, where D - W wraps every off-diagonal 1 of W = 1-B around
+    to 2^64 - 1 and the degrees are negligible next to it, so eigh diagonalized
+    1 - B up to scale.  The Laplacian of B itself is not a substitute: the
+    mutual graph has many connected components on long solenoids, each adding
+    a zero mode, and its lowest modes are not the circular ones.
+
+    Parameters
+    ----------
+    B: ndarray(N, N)
+        A symmetric binary similarity matrix, with ones on the diagonal
+
+    Returns
+    -------
+    v: ndarray(N, N)
+        Eigenvectors in order of increasing eigenvalue
+    """
+    import numpy.linalg as linalg
+    try:
+        _, v = linalg.eigh(1 - np.asarray(B, dtype=float))
+    except:
+        return np.zeros(B.shape)
+    return v
+
+def sliding_window_knn(X, win, kappa, block=256):
+    """
+    Nearest neighbor graph of the sliding window distance matrix
+    `sliding_window(get_csm(X, X), win)`, computed a block of rows at a
+    time so that the full matrix is never held in memory.  Memory is linear
+    in N, but time is still quadratic: every block is compared against all
+    N points, in O(N^2 * win) over the whole matrix.  A KD-tree on the
+    sliding window embedding does not help here, as window distances are
+    sums of per-residue distances rather than Euclidean distances of the
+    embedding, and the repeats of a solenoid put hundreds of windows inside
+    the radius needed to find the exact neighbors.
+
+    Parameters
+    ----------
+    X: ndarray(N, d)
+        A point cloud with N points in d dimensions
+    win: int
+        Sliding window length
+    kappa: float
+        If kappa < 1 it is the fraction of neighbors to consider
+        Otherwise kappa is the number of neighbors to consider
+    block: int (optional)
+        Number of rows of the distance matrix computed at once. Default 256
+    
+    Returns
+    -------
+    A: scipy.sparse.csr_matrix(N-win+1, N-win+1)
+        Binary matrix whose row i marks the nearest neighbors of window i,
+        the same as `csm_to_binary` on the dense matrix
+    """
+    from scipy import sparse
+    N = X.shape[0]
+    M = N-win+1
+    if kappa == 0:
+        raise ValueError("Sparse nearest neighbor graphs need kappa > 0")
+    elif kappa < 1:
+        NNeighbs = int(np.round(kappa*M))
+    else:
+        NNeighbs = int(kappa)
+    I, J = [], []
+    for start in range(0, M, block):
+        stop = min(start+block, M)
+        C = get_csm(X[start:stop+win-1], X)
+        D = np.zeros((stop-start, M))
+        for i in range(0, win):
+            D += C[i:i+stop-start, i:i+M]
+        D[np.arange(stop-start), np.arange(start, stop)] = 0
+        J.append(np.argpartition(D, NNeighbs, 1)[:, 0:NNeighbs].flatten())
+        I.append(np.repeat(np.arange(start, stop), NNeighbs))
+    I, J = np.concatenate(I), np.concatenate(J)
+    return sparse.coo_matrix((np.ones(I.size, dtype=np.uint8), (I, J)), shape=(M, M)).tocsr()
+
+def get_unweighted_laplacian_eigs_sparse(W, k=4, seed=0):
+    """
+    Get the eigenvectors of the k smallest eigenvalues of the unweighted
+    Laplacian of a sparse graph, `scipy.sparse.csgraph.laplacian(W)`.
+    These are the first k columns of `get_unweighted_laplacian_eigs_dense(W)`,
+    up to sign.
+
+    Parameters
+    ----------
+    W: scipy.sparse matrix(N, N)
+        A symmetric similarity matrix that has nonnegative entries everywhere.
+        The diagonal is ignored, as it does not change the Laplacian.
+    k: int (optional)
+        Number of eigenvectors. Default 4
+    seed: int (optional)
+        Seed for the starting vector of the eigensolver, for reproducibility
+
+    Returns
+    -------
+    v: ndarray(N, k)
+        Eigenvectors in order of increasing eigenvalue
+    """
+    from scipy import sparse
+    from scipy.sparse.csgraph import laplacian
+    from scipy.sparse.linalg import eigsh
+    L = laplacian(sparse.csr_matrix(W, dtype=float))
+    v0 = np.random.default_rng(seed).random(L.shape[0])
+    w, v = eigsh(L, k=k, which='SA', v0=v0)
+    return v[:, np.argsort(w)]
+
+def get_complement_eigs_sparse(B, k=3, seed=0):
+    """
+    Get the eigenvectors of the k smallest eigenvalues of 1 - B, the first
+    k columns of `get_complement_eigs_dense(B)` up to sign, without forming
+    a dense matrix: 1 - B is applied as J - B, where J is all ones and B is
+    sparse.
+
+    Parameters
+    ----------
+    B: scipy.sparse matrix(N, N)
+        A symmetric binary similarity matrix, with ones on the diagonal
+    k: int (optional)
+        Number of eigenvectors. Default 3
+    seed: int (optional)
+        Seed for the starting vector of the eigensolver, for reproducibility
+
+    Returns
+    -------
+    v: ndarray(N, k)
+        Eigenvectors in order of increasing eigenvalue
+    """
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator, eigsh
+    N = B.shape[0]
+    B = sparse.csr_matrix(B, dtype=float)
+    W = LinearOperator((N, N), matvec=lambda x: np.sum(x, axis=0) - B @ x, dtype=float)
+    v0 = np.random.default_rng(seed).random(N)
+    w, v = eigsh(W, k=k, which='SA', v0=v0)
+    return v[:, np.argsort(w)]
+
+def block_persistence(points):
+    """
+    Largest 1-dimensional persistence of the alpha complex of a block of points
+
+    Parameters
+    ----------
+    points: ndarray(block, 2)
+        Points in the plane
+    
+    Returns
+    -------
+    float
+        Longest lifetime of a 1-cycle, or 0 if there is none
+    """
+    from gudhi import AlphaComplex
+    ac = AlphaComplex(points=points)
+    stree = ac.create_simplex_tree()
+    stree.compute_persistence()
+    I = stree.persistence_intervals_in_dimension(1)
+    if I.size > 0:
+        return np.max(I[:, 1]-I[:, 0])
+    return 0
+
+# number of blocks whose persistence is remembered by `cached_block_persistence`
+PERSISTENCE_CACHE_SIZE = 20000
+
+@functools.lru_cache(maxsize=PERSISTENCE_CACHE_SIZE)
+def cached_block_persistence(data, n_points):
+    """`block_persistence` of a block of points given by its bytes, which
+    are hashable, so blocks scored before are looked up rather than
+    recomputed. The least recently used blocks are evicted first."""
+    return block_persistence(np.frombuffer(data).reshape(n_points, 2))
+
+def circularity_persistence(v, period, hop=10, workers=1):
+    """
+    Score each pair of adjacent eigenvectors by the total persistent
+    homology of alpha complexes in small blocks. In this process, blocks
+    already seen are read from the cache of `cached_block_persistence`;
+    with several workers, each distinct block is computed once in a
+    process pool.
+    
+    v: ndarray(n-period+1, k)
+        Eigenvectors of graph Laplacian
+    period: int
+        Approximate period
+    hop: int
+        Hop length between blocks in which circularity is tested
+    workers: int
+        Number of worker processes for the alpha complexes (default 1)
+    
+    Returns
+    -------
+    scores: ndarray(k-1)
+        Scores of each pair of eigenvectors
+    """
+    block = period*2
+    starts = range(0, v.shape[0]-block+1, hop)
+    blocks = [np.ascontiguousarray(v[idx:idx+block, i:i+2], dtype=float) for i in range(v.shape[1]-1) for idx in starts]
+    keys = [points.tobytes() for points in blocks]
+    if workers > 1 and len(blocks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        distinct = dict(zip(keys, blocks))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            values = list(pool.map(block_persistence, distinct.values(), chunksize=max(1, len(distinct) // (4 * workers))))
+        computed = dict(zip(distinct, values))
+        scores = np.array([computed[key] for key in keys], dtype=float)
+    else:
+        scores = np.array([cached_block_persistence(key, block) for key in keys], dtype=float)
+    return scores.reshape(v.shape[1]-1, len(starts)).sum(1)
+
+def circularity_coverage(v, period, hop=10, n_bins=16):
+    """
+    Score each pair of adjacent eigenvectors by how well they trace out a
+    circle in small blocks, computed for all blocks at once. Each block is
+    centered; it scores the fraction of `n_bins` angular sectors its points
+    visit, times one minus the coefficient of variation of their radii,
+    times the squared mean radius (the scale of alpha complex persistence).
+    
+    v: ndarray(n-period+1, k)
+        Eigenvectors of graph Laplacian
+    period: int
+        Approximate period
+    hop: int
+        Hop length between blocks in which circularity is tested
+    n_bins: int
+        Number of angular sectors used to measure coverage (default 16)
+    
+    Returns
+    -------
+    scores: ndarray(k-1)
+        Scores of each pair of eigenvectors
+    """
+    block = period*2
+    # (pair, block, coordinate, point)
+    W = np.lib.stride_tricks.sliding_window_view(v, block, axis=0)[::hop]
+    P = np.stack([W[:, i:i+2, :] for i in range(v.shape[1]-1)])
+    P = P - np.mean(P, axis=-1, keepdims=True)
+    r = np.sqrt(np.sum(P**2, axis=-2))
+    sector = ((np.arctan2(P[..., 1, :], P[..., 0, :]) + np.pi) / (2*np.pi) * n_bins).astype(int) % n_bins
+    visited = np.zeros(sector.shape[:-1] + (n_bins,), dtype=bool)
+    np.put_along_axis(visited, sector, True, axis=-1)
+    coverage = np.mean(visited, axis=-1)
+    mean_r = np.mean(r, axis=-1)
+    roundness = np.clip(1 - np.std(r, axis=-1) / np.maximum(mean_r, np.finfo(float).tiny), 0, None)
+    return np.sum(coverage * roundness * mean_r**2, axis=-1)
+
+# Circularity scorers by name, for `get_most_circular_pair`.  Persistence is
+# the default.  The coverage scorer is much faster, but does not always pick
+# the same pair: on some synthetic solenoids it picks a pair that winds less
+# than one turn, so it is only an opt-in approximation.
+CIRCULARITY_SCORERS = dict(
+    coverage=circularity_coverage,
+    persistence=circularity_persistence
+)
+
+def get_most_circular_pair(v, period, hop=10, scorer='persistence'):
     """
     Compute the most circular pair of adjacent eigenvectors
-    by computing persistent homology of alpha complexes in
-    small blocks
+    by scoring their circularity in small blocks
     
     v: ndarray(n-period+1, n-period+1)
         Eigenvectors of graph Laplacian
@@ -261,29 +879,59 @@ def get_most_circular_pair(v, period, hop=10):
         Approximate period
     hop: int
         Hop length between blocks in which circularity is tested
+    scorer: str or callable
+        Name of a scorer in `CIRCULARITY_SCORERS` ('coverage' or 'persistence'),
+        or a function with the same signature, e.g.
+        `functools.partial(circularity_persistence, workers=8)`
     
     Returns
     -------
     scores: ndarray(n-period)
         Scores of each pair of eigenvalues
     """
-    from gudhi import AlphaComplex
-    block = period*2
-    all_scores = []
-    for i in range(v.shape[1]-1):
-        scores = 0
-        vi = v[:, i:i+2]
-        for idx in range(0, v.shape[0]-block+1, hop):
-            ac = AlphaComplex(points=vi[idx:idx+block, :])
-            stree = ac.create_simplex_tree()
-            stree.compute_persistence()
-            I = stree.persistence_intervals_in_dimension(1)
-            if I.size > 0:
-                scores += np.max(I[:, 1]-I[:, 0])
-        all_scores.append(scores)
-    return np.array(all_scores)
+    if isinstance(scorer, str):
+        scorer = CIRCULARITY_SCORERS[scorer]
+    return scorer(v, period, hop=hop)
+
+def circular_coords_from_eigs(v, period, scorer='persistence'):
+    """
+    Circular coordinates from the most circular pair of adjacent
+    eigenvectors of a graph Laplacian
+
+    Parameters
+    ----------
+    v: ndarray(n, k)
+        Eigenvectors of `get_complement_eigs_dense` in order of increasing eigenvalue, k >= 3
+    period: int
+        Approximate period
+    scorer: str or callable
+        Circularity scorer (see `get_most_circular_pair`)
+
+    Returns
+    -------
+    v: ndarray(n, k)
+        The eigenvectors, with signs normalized
+    theta: ndarray(n)
+        Estimated circular coordinates
+    idx: int
+        Index in v of the first pair of eigenvector to use
+    """
+    # eigenvector signs are arbitrary; make the largest entry of each positive
+    # so that the dense and sparse paths give the same circular coordinates
+    v = v * np.sign(v[np.argmax(np.abs(v), axis=0), np.arange(v.shape[1])])
+    idx = 0
+    try:
+        scores = get_most_circular_pair(v[:, 0:3], period, scorer=scorer)
+        idx = np.argmax(scores)
+    except Exception as e:
+        print(f"Warning: circularity scoring failed, using the first eigenvector pair: {e}")
+    theta = np.arctan2(v[:, idx+1], v[:, idx])
+    theta = np.unwrap(theta)/(2*np.pi)
+    if theta[-1] < 0:
+        theta *= -1
+    return v, theta, idx
 
-def compute_laplacian_circular_coords(structure, sigma=1, period=25, kappa=50):
+def compute_laplacian_circular_coords(structure, sigma=1, period=25, kappa=50, sparse=False, scorer='persistence'):
     """
     Parameters
     ----------
@@ -302,16 +950,26 @@ def compute_laplacian_circular_coords(structure, sigma=1, period=25, kappa=50):
         If kappa < 1 it is the fraction of mutual neighbors to consider
         Otherwise kappa is the number of mutual neighbors to consider
         Default 50
+    sparse: bool (optional)
+        If True, build the mutual nearest neighbor graph blockwise as a sparse
+        matrix and compute only the three eigenvectors that are used, so memory
+        grows linearly in the number of residues (time is still quadratic,
+        see `sliding_window_knn`).  D is then not returned,
+        B is sparse and v has 3 columns.
+        Default False
+    scorer: str or callable (optional)
+        Circularity scorer used to pick the eigenvector pair (see `get_most_circular_pair`)
+        Default 'persistence'
     
     Returns
     -------    
     {
         D: ndarray(n-period+1, n-period+1)
-            Sliding window distance matrix
+            Sliding window distance matrix (None if sparse)
         B: ndarray(n-period+1, n-period+1)
             Binarized sliding window distance matrix
         v: ndarray(n-period+1, n-period+1)
-            Eigenvectors of graph Laplacian
+            Eigenvectors of 1 - B (see `get_complement_eigs_dense`)
         theta: ndarray(n-period+1)
             Estimated circular coordinates
         idx: int
@@ -319,21 +977,62 @@ def compute_laplacian_circular_coords(structure, sigma=1, period=25, kappa=50):
     }
     """
     from scipy.ndimage import gaussian_filter1d as gf1d
-    X = gf1d(structure, sigma=sigma, order=1, axis=0) # smoothed out structure
-    D = get_csm(X, X)
-    D = sliding_window(D, period)
-    B = csm_to_binary_mutual(D, kappa)
-    v = get_unweighted_laplacian_eigs_dense(1-B)
-    scores = get_most_circular_pair(v[:, 0:3], period)
-    idx = np.argmax(scores)
-    theta = np.arctan2(v[:, idx+1], v[:, idx])
-    theta = np.unwrap(theta)/(2*np.pi)
-    if theta[-1] < 0:
-        theta *= -1
+    X = gf1d(np.asarray(structure, dtype=float), sigma=sigma, order=1, axis=0) # smoothed out structure
+    if sparse:
+        D = None
+        A = sliding_window_knn(X, period, kappa)
+        B = A.multiply(A.T).tocsr()
+        v = get_complement_eigs_sparse(B)
+    else:
+        D = get_csm(X, X)
+        D = sliding_window(D, period)
+        B = csm_to_binary_mutual(D, kappa)
+        v = get_complement_eigs_dense(B)
+    v, theta, idx = circular_coords_from_eigs(v, period, scorer=scorer)
     return dict(D=D, B=B, v=v, theta=theta, idx=idx)
 
 
-def compute_lrr_winding_laplacian(structure, breakpoints, period=25):
+def compute_laplacian_circular_coords_sweep(structure, periods, sigma=1, kappa=50, scorer='persistence'):
+    """
+    Runs `compute_laplacian_circular_coords` (dense) for several periods,
+    computing the distance matrix and its diagonal cumulative sums once
+    and reading each sliding window matrix from them
+
+    Parameters
+    ----------
+    structure: ndarray(n, 3)
+        Coordinates of the residue sequence in 3D
+    periods: list of int
+        Sliding window lengths to try
+    sigma: float (optional)
+        Amount by which to smooth curve when computing velocity.
+        Default 1
+    kappa: float (optional)
+        Nearest neighbor proportion or count, as in `compute_laplacian_circular_coords`
+        Default 50
+    scorer: str or callable (optional)
+        Circularity scorer used to pick the eigenvector pair (see `get_most_circular_pair`)
+        Default 'persistence'
+    
+    Returns
+    -------
+    dict
+        The result of `compute_laplacian_circular_coords` for each period
+    """
+    from scipy.ndimage import gaussian_filter1d as gf1d
+    X = gf1d(np.asarray(structure, dtype=float), sigma=sigma, order=1, axis=0) # smoothed out structure
+    D_full = get_csm(X, X)
+    Q = diagonal_cumsum(D_full)
+    results = {}
+    for period, D in zip(periods, sliding_window(D_full, list(periods), Q=Q)):
+        B = csm_to_binary_mutual(D, kappa)
+        v = get_complement_eigs_dense(B)
+        v, theta, idx = circular_coords_from_eigs(v, period, scorer=scorer)
+        results[period] = dict(D=D, B=B, v=v, theta=theta, idx=idx)
+    return results
+
+
+def compute_lrr_winding_laplacian(structure, breakpoints, period=25, sparse=False, scorer='persistence'):
     """
     Compute LRR windings of a structure within each LRR region, 
     as determined by breakpoints
@@ -347,6 +1046,12 @@ def compute_lrr_winding_laplacian(structure, breakpoints, period=25):
     period: int (optional)
         Approximate period of each winding
         Default 25
+    sparse: bool (optional)
+        Use the sparse nearest neighbor graph (see `compute_laplacian_circular_coords`)
+        Default False
+    scorer: str or callable (optional)
+        Circularity scorer (see `get_most_circular_pair`)
+        Default 'persistence'
     
     Returns
     -------
@@ -358,7 +1063,7 @@ def compute_lrr_winding_laplacian(structure, breakpoints, period=25):
     last_theta = 0
     a = breakpoints[0]
     b = breakpoints[-1]
-    res = compute_laplacian_circular_coords(structure[a:b+period-1, :], period=period)
+    res = compute_laplacian_circular_coords(structure[a:b+period-1, :], period=period, sparse=sparse, scorer=scorer)
     theta = res["theta"] + last_theta
     last_theta = theta[-1]
     if theta.size < b-a: # Pad if too close to the end
@@ -372,6 +1077,59 @@ def compute_lrr_winding_laplacian(structure, breakpoints, period=25):
 ##                REGION ANNOTATION                ##
 ######################################################
 
+def secant_slopes(data, small = 100, big = 250):
+    """Computes the slope of every secant line over a data curve with
+    run between `small` and `big`, together with a weight that rewards
+    secants along which the curve is close to linear.
+
+    All sums needed to detrend a window are read off prefix sums of
+    the curve, so the work is O(n * (big - small)) array operations
+    rather than one slice per secant.
+
+    Args:
+        data (Numpy array): Curve on which to compute slopes of secant lines
+        small (int): Lower bound for run. Defaults to 100.
+        big (int): Upper bound for run. Defaults to 250.
+
+    Returns:
+        list: A two-element list consisting of the secant slopes and their
+        weights, ordered by left endpoint and then by right endpoint
+    """
+    data = np.asarray(data, dtype=get_dtype())
+    n = len(data)
+    i = np.arange(max(n - small, 0))[:, np.newaxis]
+    j = i + np.arange(small, big)[np.newaxis, :]
+    valid = j < n
+    i, j = np.broadcast_to(i, j.shape)[valid], j[valid]
+    run = j - i
+
+    slopes = (data[j] - data[i]) / run
+
+    # detrending is unaffected by a constant offset; centering keeps the
+    # prefix sums small
+    data = data - np.mean(data)
+
+    # prefix sums of y, y^2 and t*y with a leading zero, so that the sum
+    # over [i, j) is P[j] - P[i]
+    t = np.arange(n)
+    sy = np.concatenate(([0], np.cumsum(data)))
+    syy = np.concatenate(([0], np.cumsum(data ** 2)))
+    sty = np.concatenate(([0], np.cumsum(t * data)))
+
+    # window sums, with t measured from the left endpoint of the window
+    Sy = sy[j] - sy[i]
+    Syy = syy[j] - syy[i]
+    Sty = sty[j] - sty[i] - i * Sy
+    St = run * (run - 1) / 2
+    Stt = (run - 1) * run * (2 * run - 1) / 6
+
+    # sum of squares of (data - slope * t) about its mean on each window
+    residual = Syy - 2 * slopes * Sty + slopes ** 2 * Stt - (Sy - slopes * St) ** 2 / run
+    weights = run / (1 + np.maximum(residual, 0))
+
+    return slopes, weights
+
+@dispatch('median_slope')
 def median_slope(data, small = 100, big = 250):
     """Computes the distribution of slopes of secant lines
     over a data curve (e.g. cumulative winding number)
@@ -385,28 +1143,18 @@ def median_slope(data, small = 100, big = 250):
         list: A two-element list consisting of the median slope, and `scores`, 
         the histogram of secant line slopes
     """
-    slopes = []
-    weights = []
-    for i in range(len(data) - small):
-        for j in range(i + small, min(i + big, len(data))):
-            s = (data[j]-data[i])/(j-i)
-            slopes.append(s)
-            reg = data[i:j] - s * np.arange(i,j)
-            reg -= np.mean(reg)
-            # weights.append(np.sqrt(j - i))
-            weights.append((j - i) / (1 + np.sum(reg ** 2)))
-    
+    slopes, weights = secant_slopes(data, small=small, big=big)
+
     n_bins = int(np.sqrt(len(slopes)))
-    scores = [0 for i in range(n_bins)]
-    a = min(slopes)
-    b = max(slopes) + 0.01
+    a = np.min(slopes)
+    b = np.max(slopes) + 0.01
 
-    for s, weight in zip(slopes, weights):
-        bin_index = int(n_bins * (s - a) / (b - a))
-        scores[bin_index] += weight
+    bin_index = (n_bins * (slopes - a) / (b - a)).astype(int)
+    scores = np.bincount(bin_index, weights=weights, minlength=n_bins)
 
-    return a + (np.argmax(scores) / n_bins) * (b - a), scores
+    return a + (np.argmax(scores) / n_bins) * (b - a), scores.tolist()
 
+@dispatch('multi_loss')
 def multi_loss(winding, breakpoints, slope, penalties):
     """Computes loss associated with a particular piecewise-linear
     regression of `winding`.
@@ -429,7 +1177,272 @@ def multi_loss(winding, breakpoints, slope, penalties):
 
     return cost
 
-def compute_regression(winding, n_breakpoints=2, penalties=[1, 1.5], learning_rate=0.01, iterations=10000, initial_guess=[]):
+def segment_prefix_sums(winding, slope):
+    """Precomputes the cumulative sums needed to evaluate the cost of
+    any segment of the piecewise-linear model used by `multi_loss` in O(1)
+
+    Args:
+        winding (Numpy array): Cumulative winding number (signal to be regressed)
+        slope (float): Slope of the coiling segments
+
+    Returns:
+        list: A two-element list of (sum, sum of squares) prefix pairs, the first
+        for the non-coiling (constant) segments and the second for the coiling
+        (sloped) segments
+    """
+    winding = np.asarray(winding, dtype=float)
+    prefix = []
+    for y in [winding, winding - slope * np.arange(len(winding))]:
+        # costs are invariant to a constant offset; centering keeps the sums small
+        y = y - np.mean(y)
+        prefix.append((np.concatenate(([0], np.cumsum(y))), np.concatenate(([0], np.cumsum(y ** 2)))))
+    return prefix
+
+def segment_cost(prefix, a, b):
+    """Sum of squared deviations of a segment about its mean, read off
+    prefix sums computed by `segment_prefix_sums`. `a` and `b` may be
+    broadcastable integer arrays; empty segments (b <= a) cost nothing.
+
+    Args:
+        prefix (tuple): Pair of prefix sums (sum, sum of squares)
+        a (int or Numpy array): Left endpoint of the segment, inclusive
+        b (int or Numpy array): Right endpoint of the segment, exclusive
+
+    Returns:
+        float or Numpy array: Segment cost
+    """
+    s1, s2 = prefix
+    run = np.maximum(b - a, 1)
+    total = s1[b] - s1[a]
+    cost = s2[b] - s2[a] - total ** 2 / run
+    return np.where(b > a, np.maximum(cost, 0), 0)
+
+def segmented_regression_path(winding, slope, n_breakpoints=2, penalties=[1, 1.5], block=256, min_coil_length=0, min_gap_length=0):
+    """Dynamic program behind `solve_segmented_regression`. Since the
+    optimum with k breakpoints extends the table for k - 1, one pass
+    yields the optimal loss for every number of breakpoints up to
+    `n_breakpoints`.
+
+    Args:
+        winding (Numpy array): Cumulative winding number (signal to be regressed)
+        slope (float): Slope of the coiling segments
+        n_breakpoints (int): Largest number of breakpoints. Defaults to 2.
+        penalties (list): Relative penalties of the non-coiling and coiling segments.
+            Defaults to [1, 1.5].
+        block (int): Number of right endpoints handled per vectorized step, which
+            bounds memory to O(n * block). Defaults to 256.
+        min_coil_length (int): Shortest allowed coiling segment. Defaults to 0.
+        min_gap_length (int): Shortest allowed non-coiling segment between two
+            coils. Defaults to 0.
+
+    Returns:
+        list: A two-element list consisting of the optimal loss of the whole
+        curve with k = 0, ..., n_breakpoints breakpoints (ndarray), and the
+        back-pointers to pass to `trace_breakpoints`
+    """
+    n = len(winding)
+    prefix = segment_prefix_sums(winding, slope)
+    ends = np.arange(n + 1)
+
+    # best[b] is the smallest loss of the first k segments covering [0, b)
+    best = penalties[0] * segment_cost(prefix[0], 0, ends)
+    losses = [best[n]]
+    argbest = []
+    for k in range(1, n_breakpoints + 1):
+        kind = k % 2
+        new_best = np.empty(n + 1)
+        new_arg = np.empty(n + 1, dtype=int)
+        for start in range(0, n + 1, block):
+            b = ends[start:start + block]
+            a = ends[:b[-1] + 1, np.newaxis]
+            total = best[:b[-1] + 1, np.newaxis] + penalties[kind] * segment_cost(prefix[kind], a, b[np.newaxis, :])
+            if kind:
+                total[a > b[np.newaxis, :] - min_coil_length] = np.inf
+            else:
+                # the final segment, ending at n, may be short
+                total[(a > b[np.newaxis, :] - min_gap_length) & (b[np.newaxis, :] < n)] = np.inf
+                total[a > b[np.newaxis, :]] = np.inf
+            idx = np.argmin(total, axis=0)
+            new_arg[b] = idx
+            new_best[b] = total[idx, np.arange(len(b))]
+        best = new_best
+        losses.append(best[n])
+        argbest.append(new_arg)
+    return np.array(losses), argbest
+
+def trace_breakpoints(argbest, n_breakpoints, n):
+    """Walks the back-pointers of `segmented_regression_path` back from the
+    end of the curve to recover the optimal breakpoints
+
+    Args:
+        argbest (list): Back-pointers from `segmented_regression_path`
+        n_breakpoints (int): Number of breakpoints, at most len(argbest)
+        n (int): Length of the curve
+
+    Returns:
+        ndarray(int): Breakpoints
+    """
+    breakpoints = []
+    b = n
+    for arg in reversed(argbest[:n_breakpoints]):
+        b = arg[b]
+        breakpoints.append(b)
+    return np.array(breakpoints[::-1], dtype=int)
+
+def solve_segmented_regression(winding, slope, n_breakpoints=2, penalties=[1, 1.5], block=256):
+    """Finds the breakpoints that globally minimize `multi_loss` for a fixed
+    slope, by dynamic programming over segment costs. Segments alternate
+    between constant (even index) and sloped (odd index), as in `multi_loss`.
+
+    Args:
+        winding (Numpy array): Cumulative winding number (signal to be regressed)
+        slope (float): Slope of the coiling segments
+        n_breakpoints (int): How many breakpoints to use. Defaults to 2.
+        penalties (list): Relative penalties of the non-coiling and coiling segments.
+            Defaults to [1, 1.5].
+        block (int): Number of right endpoints handled per vectorized step, which
+            bounds memory to O(n * block). Defaults to 256.
+
+    Returns:
+        list: A two-element list consisting of the breakpoints (ndarray(int)) and
+        the optimal loss
+    """
+    losses, argbest = segmented_regression_path(winding, slope, n_breakpoints=n_breakpoints, penalties=penalties, block=block)
+    return trace_breakpoints(argbest, n_breakpoints, len(winding)), losses[n_breakpoints]
+
+# Defaults of the adaptive segmentation, calibrated on the two cached CORE
+# windings (one LRR domain each) and on copies of them with a second coil
+# spliced in. A coil penalty of log(10) keeps one coil on both proteins, where
+# log(2) adds spurious ones, and finds a second coil of 200 residues lying 150
+# residues from the first, or of 400 residues lying 60 residues from it;
+# log(30) misses most of those.
+# The shortest coil and gap are about one repeat.
+COIL_PENALTY = np.log(10)
+MIN_COIL_LENGTH = 25
+MIN_GAP_LENGTH = 25
+
+def segmentation_bic(losses, coil_penalty=COIL_PENALTY):
+    """BIC-style score of segmentations with k = 0, 2, 4, ... breakpoints,
+    i.e. with k / 2 coils: log(loss) + coil_penalty * (k / 2). This is the
+    BIC of a Gaussian model up to scale, with the residual count replaced
+    by a small effective number of independent residuals, since residuals
+    of the smoothed winding are strongly autocorrelated and the textbook
+    BIC keeps adding coils to fit noise.
+
+    Args:
+        losses (Numpy array): Optimal loss for k = 0, 1, ... breakpoints, as
+            returned by `segmented_regression_path`
+        coil_penalty (float): Decrease in log-loss an extra coil has to buy;
+            the default asks for a tenfold drop in loss.
+
+    Returns:
+        ndarray: Score of each number of coils, 0, 1, ... (lower is better)
+    """
+    k = np.arange(0, len(losses), 2)
+    return np.log(np.maximum(losses[k], 1e-12)) + coil_penalty * k / 2
+
+def coil_slopes(winding, breakpoints):
+    """Least-squares slope of the winding over each coiling segment
+    [breakpoints[2i], breakpoints[2i + 1])
+
+    Args:
+        winding (Numpy array): Cumulative winding number
+        breakpoints (Numpy array): Breakpoints, as returned by `compute_regression`
+
+    Returns:
+        ndarray: One slope per coil (nan for coils shorter than two residues)
+    """
+    slopes = []
+    for a, b in zip(breakpoints[0::2], breakpoints[1::2]):
+        a, b = int(a), int(b)
+        if b - a < 2:
+            slopes.append(np.nan)
+            continue
+        t = np.arange(a, b) - (a + b - 1) / 2
+        slopes.append(np.dot(t, winding[a:b]) / np.dot(t, t))
+    return np.array(slopes)
+
+def segment_losses(winding, breakpoints, slope, penalties=[1, 1.5]):
+    """Contribution of each segment to `multi_loss`
+
+    Args:
+        winding (Numpy array): Cumulative winding number
+        breakpoints (Numpy array): Breakpoints
+        slope (float): Slope of the coiling segments
+        penalties (list): Relative penalties of the non-coiling and coiling segments.
+            Defaults to [1, 1.5].
+
+    Returns:
+        ndarray: Loss of each of the len(breakpoints) + 1 segments
+    """
+    prefix = segment_prefix_sums(winding, slope)
+    boundaries = np.concatenate(([0], np.asarray(breakpoints, dtype=int), [len(winding)]))
+    return np.array([
+        penalties[i % 2] * segment_cost(prefix[i % 2], a, b)
+        for i, (a, b) in enumerate(zip(boundaries[:-1], boundaries[1:]))
+    ])
+
+def compute_adaptive_regression(winding, max_coils=4, penalties=[1, 1.5], coil_penalty=COIL_PENALTY, min_coil_length=MIN_COIL_LENGTH, min_gap_length=MIN_GAP_LENGTH, block=256):
+    """
+    Piecewise-linear regression that chooses how many coils (LRR islands)
+    the winding curve has, rather than fixing the number of breakpoints.
+    A single dynamic program gives the optimal segmentation with 1, ...,
+    `max_coils` coils, and the number of coils minimizing
+    `segmentation_bic` is kept.
+
+    Parameters
+    ----------
+    winding: ndarray(n)
+        The winding number at each residue
+    max_coils: int (optional)
+        Largest number of coils considered. Defaults to 4.
+    penalties: list[float, float] (optional)
+        Relative penalties of the non-coiling and coiling segments. Defaults to [1, 1.5].
+    coil_penalty: float (optional)
+        Passed on to `segmentation_bic`
+    min_coil_length, min_gap_length: int (optional)
+        Shortest coil, and shortest non-coiling stretch between two coils.
+        Default to `MIN_COIL_LENGTH` and `MIN_GAP_LENGTH`, 25, about one repeat.
+    block: int (optional)
+        Passed on to `segmented_regression_path`
+
+    Returns
+    -------
+    {
+        slope: float
+            Median secant slope, shared by the coils in the fit
+        breakpoints: ndarray(int)
+            Residue locations of the breakpoints, two per coil
+        loss: float
+            Loss of the chosen segmentation
+        coil_slopes: ndarray
+            Least-squares slope of each coil
+        segment_losses: ndarray
+            Loss of each segment
+        bic: ndarray
+            Score of 0, 1, ..., `max_coils` coils
+    }
+    """
+    n = len(winding)
+    m, _ = median_slope(winding)
+    losses, argbest = segmented_regression_path(
+        winding, m, n_breakpoints=2 * max_coils, penalties=penalties, block=block,
+        min_coil_length=min_coil_length, min_gap_length=min_gap_length
+    )
+    bic = segmentation_bic(losses, coil_penalty=coil_penalty)
+    # at least one coil, as with a fixed number of breakpoints
+    n_coils = 1 + int(np.argmin(bic[1:]))
+    breakpoints = trace_breakpoints(argbest, 2 * n_coils, n)
+    return dict(
+        slope=m,
+        breakpoints=breakpoints,
+        loss=losses[2 * n_coils],
+        coil_slopes=coil_slopes(winding, breakpoints),
+        segment_losses=segment_losses(winding, breakpoints, m, penalties),
+        bic=bic
+    )
+
+def compute_regression(winding, n_breakpoints=2, penalties=[1, 1.5], learning_rate=None, iterations=None, initial_guess=None, method='exact'):
     """
     Computes piecewise-linear regressions (constant - slope = m - constant) over
     all cumulative winding curves stored in the `winding` dictionary. Writes the parameters
@@ -446,13 +1459,20 @@ def compute_regression(winding, n_breakpoints=2, penalties=[1, 1.5], learning_ra
         The first component refers to the non-coiling regions; the second to the coiling region.
         Defaults to [1, 1.5].
     learning_rate: float (optional)
-        Scalar for gradient descent in parameter optimization. Defaults to 0.01.
-        iterations (int, optional): Iterations of gradient descent. Defaults to 10000.
+        Scalar for gradient descent in parameter optimization, with method 'descent'.
+        Defaults to 0.01.
     iterations: int (optional)
-        Number of iterations in gradient descent.  Defaults to 10000
+        Number of iterations in gradient descent, with method 'descent'.  Defaults to 10000
     initial_guess: list of float (optional)
-        An initial guess of the breakpoint locations.  If not specified, initial conditions
-        will be taken as equally spaced.
+        An initial guess of the breakpoint locations, with method 'descent'.  If not
+        specified, initial conditions will be taken as equally spaced.
+    method: str (optional)
+        'exact' finds the globally optimal breakpoints with `solve_segmented_regression`;
+        'descent' runs finite-difference gradient descent from `initial_guess`, as
+        earlier versions did. The exact optimum can differ from where descent stops,
+        e.g. breakpoints [79, 632] instead of [112, 636] on the cached CORE structures.
+        `learning_rate`, `iterations` and `initial_guess` only apply to 'descent', and
+        passing them with 'exact' raises a ValueError. Defaults to 'exact'.
     
     Returns
     -------
@@ -466,8 +1486,24 @@ def compute_regression(winding, n_breakpoints=2, penalties=[1, 1.5], learning_ra
     }
     """
     n = len(winding)
+    m, _ = median_slope(winding)
 
-    if len(initial_guess) > 0:
+    if method == 'exact':
+        unused = [name for name, value in [('learning_rate', learning_rate), ('iterations', iterations), ('initial_guess', initial_guess)] if value is not None]
+        if unused:
+            raise ValueError(f"Arguments {', '.join(unused)} are only used by method='descent'")
+        breakpoints, loss = solve_segmented_regression(winding, m, n_breakpoints=n_breakpoints, penalties=penalties)
+        return dict(
+            slope=m,
+            breakpoints=breakpoints,
+            loss=loss
+        )
+    elif method != 'descent':
+        raise ValueError(f"Unknown regression method '{method}'")
+
+    learning_rate = 0.01 if learning_rate is None else learning_rate
+    iterations = 10000 if iterations is None else iterations
+    if initial_guess is not None and len(initial_guess) > 0:
         breakpoints = np.array(initial_guess)
     else:
         # best-guess initialization
@@ -475,8 +1511,6 @@ def compute_regression(winding, n_breakpoints=2, penalties=[1, 1.5], learning_ra
     gradient = np.zeros(n_breakpoints)
     delta = [*np.identity(n_breakpoints)]
 
-    m, _ = median_slope(winding)
-
     for _ in range(iterations):
         present = multi_loss(winding, breakpoints, m, penalties)
         # Compute a finite difference approximation of the gradient
@@ -495,7 +1529,99 @@ def compute_regression(winding, n_breakpoints=2, penalties=[1, 1.5], learning_ra
         loss=present
     )
 
-def compute_split_coil(winding, learning_rate=0.001, epochs=1000, batch_size=32):
+def compute_split_coil_batch(windings, lengths=None):
+    """
+    Exact least-squares fit of the two-slope model of `compute_split_coil`,
+    w(t) = m0 * t for t <= t0 and m0 * t0 + m1 * (t - t0) for t > t0,
+    for many winding curves at once. For a fixed transition t0 the slopes
+    solve a 2x2 linear system whose entries are read off cumulative sums,
+    so every t0 in [1, n-2] of every curve is evaluated in one vectorized
+    pass and the best one is kept.
+
+    Parameters
+    ----------
+    windings: list of ndarray(n_i), or ndarray(b, n)
+        Winding curves, either as a list or already padded to a common length
+    lengths: ndarray(b) (optional)
+        Length of each padded curve.  Only used if `windings` is an array;
+        defaults to the full padded length.
+
+    Returns
+    -------
+    {
+        m0: ndarray(b)
+            Slope before the transition
+        m1: ndarray(b)
+            Slope after the transition
+        t0: ndarray(b)
+            Transition point (int)
+        loss: ndarray(b)
+            Sum of squared residuals of the fit
+    }
+    """
+    if lengths is None:
+        lengths = [len(winding) for winding in windings]
+    lengths = np.asarray(lengths, dtype=int)
+    n = int(np.max(lengths))
+    w = np.zeros((len(lengths), n))
+    for i, (winding, length) in enumerate(zip(windings, lengths)):
+        w[i, :length] = winding[:length]
+
+    t = np.arange(n, dtype=float)
+    N = lengths[:, np.newaxis].astype(float)
+    # inclusive prefix sums of w and t * w; the zero padding adds nothing
+    cw = np.cumsum(w, axis=1)
+    ctw = np.cumsum(t * w, axis=1)
+    sw, stw = cw[:, -1:], ctw[:, -1:]
+    r = N - 1 - t  # number of residues after the transition
+    s00 = t * (t + 1) * (2 * t + 1) / 6 + t ** 2 * r
+    s01 = t * r * (r + 1) / 2
+    s11 = r * (r + 1) * (2 * r + 1) / 6
+    b0 = ctw + t * (sw - cw)
+    b1 = (stw - ctw) - t * (sw - cw)
+
+    det = s00 * s11 - s01 ** 2
+    valid = (t >= 1) & (t <= N - 2) & (det > 0)
+    det = np.where(valid, det, 1)
+    m0 = (s11 * b0 - s01 * b1) / det
+    m1 = (s00 * b1 - s01 * b0) / det
+    # residual sum of squares, up to the constant sum of w^2
+    gain = np.where(valid, m0 * b0 + m1 * b1, -np.inf)
+    best = np.argmax(gain, axis=1)
+    rows = np.arange(len(lengths))
+    return dict(
+        m0=m0[rows, best],
+        m1=m1[rows, best],
+        t0=best,
+        loss=np.sum(w ** 2, axis=1) - gain[rows, best]
+    )
+
+def compute_split_coil(winding, learning_rate=0.001, epochs=1000, batch_size=32, method='exact'):
+    """
+    Fits a winding curve with two slopes, m0 up to a transition point t0
+    and m1 after it
+
+    Parameters
+    ----------
+    winding: ndarray(n)
+        The winding number at each residue
+    learning_rate, epochs, batch_size: (optional)
+        Parameters of the 'descent' method
+    method: str (optional)
+        'exact' finds the least-squares optimum with `compute_split_coil_batch`;
+        'descent' runs gradient descent on t0, with median secant slopes.
+        Defaults to 'exact'.
+
+    Returns
+    -------
+    m0, m1, t0
+    """
+    if method == 'exact':
+        res = compute_split_coil_batch([winding])
+        return res["m0"][0], res["m1"][0], int(res["t0"][0])
+    elif method != 'descent':
+        raise ValueError(f"Unknown split coil method '{method}'")
+
     # Initialize parameters
     t0 = len(winding) // 2  # Initial guess for the transition point
     n = len(winding)
@@ -641,32 +1767,299 @@ def compute_lrr_std(winding, breakpoints, slope):
 
 
 
+def compute_lrr_regression(winding, penalties=[1, 1.5], learning_rate=None, iterations=None, std_cutoff=1, segmentation='cutoff', max_coils=4, coil_penalty=COIL_PENALTY, method='exact', min_coil_length=MIN_COIL_LENGTH, min_gap_length=MIN_GAP_LENGTH):
+    """
+    Computes the regression used by `Analyzer.compute_regressions` for a
+    single winding curve
+
+    Parameters
+    ----------
+    winding: ndarray(n)
+        The winding number at each residue
+    penalties, learning_rate, iterations, method: (optional)
+        Passed on to `compute_regression`. `learning_rate` and `iterations`
+        only apply to method 'descent', and a ValueError is raised if they
+        are passed otherwise.
+    std_cutoff: float (optional)
+        The standard deviation amount beyond which to subdivide LRR region,
+        with 'cutoff' segmentation
+    segmentation: str (optional)
+        'cutoff' starts with 2 breakpoints, and if the standard deviation of
+        the LRR segment exceeds `std_cutoff`, reruns with 4; with method
+        'descent' the rerun starts from the first coil split in two, as
+        earlier versions did. 'adaptive' chooses the number of coils in one
+        pass with `compute_adaptive_regression`, which is always exact.
+        Defaults to 'cutoff'.
+    max_coils, coil_penalty, min_coil_length, min_gap_length: (optional)
+        Passed on to `compute_adaptive_regression`
+
+    Returns
+    -------
+    {
+        slope: float
+            Estimated slope in each winding segment
+        breakpoints: ndarray(int)
+            Residue locations of the breakpoints
+        loss: float
+            Final loss from the regression
+        std: float
+            Standard deviation of the LRR segments about the fit
+        coil_slopes: ndarray
+            Least-squares slope of each coil
+    }
+    """
+    if segmentation == 'adaptive':
+        if method != 'exact':
+            raise ValueError("segmentation='adaptive' only supports method='exact'")
+        unused = [name for name, value in [('learning_rate', learning_rate), ('iterations', iterations)] if value is not None]
+        if unused:
+            raise ValueError(f"Arguments {', '.join(unused)} are not used by segmentation='adaptive'")
+        res = compute_adaptive_regression(
+            winding, max_coils=max_coils, penalties=penalties, coil_penalty=coil_penalty,
+            min_coil_length=min_coil_length, min_gap_length=min_gap_length
+        )
+        std = compute_lrr_std(winding, res["breakpoints"], res["slope"])
+        return dict(
+            slope=res["slope"],
+            breakpoints=res["breakpoints"],
+            loss=res["loss"],
+            std=std,
+            coil_slopes=res["coil_slopes"]
+        )
+    elif segmentation != 'cutoff':
+        raise ValueError(f"Unknown segmentation '{segmentation}'")
+
+    res = compute_regression(winding, n_breakpoints=2, penalties=penalties, learning_rate=learning_rate, iterations=iterations, method=method)
+    std = compute_lrr_std(winding, res["breakpoints"], res["slope"])
+    if std > std_cutoff:
+        initial_guess = None
+        if method == 'descent':
+            [a, b] = res["breakpoints"]
+            initial_guess = [a, a + (b-a)/2, a + (b-a)/2 + 1, b]
+        res = compute_regression(winding, n_breakpoints=4, penalties=penalties, learning_rate=learning_rate, iterations=iterations, initial_guess=initial_guess, method=method)
+    return dict(res, std=std, coil_slopes=coil_slopes(winding, res["breakpoints"]))
+
+
 ######################################################
 ##                 BATCH PROCESSOR                  ##
 ######################################################
 
+def apply_to_chunk(function, chunk):
+    """Applies `function` to the arguments of each protein in a chunk,
+    catching failures so that one protein cannot take down the others
+
+    Args:
+        function (callable): Per-protein computation
+        chunk (list): List of (key, args) pairs
+
+    Returns:
+        list: List of (key, result, error) triples, where exactly one of
+        `result` and `error` is None
+    """
+    out = []
+    for key, args in chunk:
+        try:
+            out.append((key, function(*args), None))
+        except Exception as e:
+            out.append((key, None, f"{type(e).__name__}: {e}"))
+    return out
+
+def imap_proteins(function, items, workers=1, chunksize=None, prefetch=None):
+    """Applies a per-protein computation to many proteins like
+    `map_proteins`, but yields each chunk of results as soon as it is
+    done, so results can be consumed while later proteins are computed.
+    At most `prefetch` chunks are submitted ahead of the consumer.
+
+    Args:
+        function (callable): Module-level (picklable) function to apply
+        items (iterable): (key, args) pairs; `function(*args)` is computed for each
+        workers (int, optional): Number of worker processes. 1 runs everything in
+            this process, None uses every core. Defaults to 1.
+        chunksize (int, optional): Proteins per submitted task. Defaults to about
+            four tasks per worker if `items` has a length, otherwise 1.
+        prefetch (int, optional): Chunks in flight at once. Defaults to two per worker.
+
+    Yields:
+        list: (key, result, error) triples of one chunk, where exactly one of
+        `result` and `error` is None. Chunks come in completion order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(items) // (4 * workers)) if hasattr(items, '__len__') else 1
+    if prefetch is None:
+        prefetch = 2 * workers
+
+    def chunks():
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if workers <= 1:
+        for chunk in chunks():
+            yield apply_to_chunk(function, chunk)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                chunk = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # the worker itself died, so every protein in the chunk is lost
+                    yield [(key, None, f"{type(e).__name__}: {e}") for key, _ in chunk]
+
+        for chunk in chunks():
+            pending[pool.submit(apply_to_chunk, function, chunk)] = chunk
+            if len(pending) >= prefetch:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(finished)
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(finished)
+
+def map_proteins(function, items, workers=1, chunksize=None, desc=None, progress=True):
+    """Applies a per-protein computation to many proteins, optionally
+    spread over a process pool. Work is submitted in chunks to amortize
+    the cost of sending arrays to the workers.
+
+    Args:
+        function (callable): Module-level (picklable) function to apply
+        items (list): List of (key, args) pairs; `function(*args)` is computed for each
+        workers (int, optional): Number of worker processes. 1 runs everything in
+            this process, None uses every core. Defaults to 1.
+        chunksize (int, optional): Proteins per submitted task. Defaults to about
+            four tasks per worker.
+        desc (str, optional): Progress bar description
+        progress (bool, optional): Whether to show a progress bar. Defaults to True.
+
+    Returns:
+        list: A two-element list consisting of a dictionary of results and a
+        dictionary of error messages, both in the order of `items`
+    """
+    from tqdm import tqdm
+    items = list(items)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    done = {}
+    bar = tqdm(total=len(items), desc=desc, disable=not progress)
+    # every chunk is submitted up front, as the results are only used at the end
+    for chunk in imap_proteins(function, items, workers=workers, chunksize=chunksize, prefetch=len(items) + 1):
+        for key, result, error in chunk:
+            done[key] = (result, error)
+        bar.update(len(chunk))
+    bar.close()
+
+    results = {key: done[key][0] for key, _ in items if done[key][1] is None}
+    errors = {key: done[key][1] for key, _ in items if done[key][1] is not None}
+    return results, errors
+
 class Analyzer:
+    # per-residue member dictionaries, by the field name used in a StructureBatch
+    FIELDS = dict(
+        bfactor='bfactors',
+        winding='windings',
+        backbone='backbones',
+        normal_bundle='normal_bundles',
+        flattened='flattened',
+        lwinding='lwindings'
+    )
+    # per-protein results, packed as short rows; scalars are rows of one
+    PROTEIN_FIELDS = dict(
+        breakpoints='breakpoints',
+        slope='slopes',
+        loss='losses',
+        std='stds',
+        coil_slopes='coil_slopes'
+    )
+    SCALAR_FIELDS = ('slope', 'loss', 'std')
+
     def __init__(self):
         self.structures = {}
         self.bfactors = {}
-        self.backbones = {}
-        self.normal_bundles = {}
-        self.flattened = {}
-        self.windings = {}
-        self.slopes = {}
-        self.breakpoints = {}
-        self.lwindings = {}
-        self.losses = {}
-        self.stds = {}
+        # results may be loaded lazily from a ProteinCache
+        self.backbones = LazyDict()
+        self.normal_bundles = LazyDict()
+        self.flattened = LazyDict()
+        self.windings = LazyDict()
+        self.slopes = LazyDict()
+        self.breakpoints = LazyDict()
+        self.lwindings = LazyDict()
+        self.losses = LazyDict()
+        self.stds = LazyDict()
+        self.coil_slopes = LazyDict()
+        self.errors = {}
+        # hash of the inputs of each protein's geometry, see `compute_windings`
+        self.geometry_keys = {}
 
     def load_structures(self, structures):
         """Updates internal dictionary of three-dimensional protein structures,
         loaded, e.g., by a Loader object.
 
         Args:
-            structures (dict): Dictionary of protein structures
+            structures (dict or StructureBatch): Dictionary of protein structures,
+            or a packed batch, whose coordinates are loaded as views
         """
+        if isinstance(structures, StructureBatch):
+            structures = structures.to_dict()
         self.structures.update(structures)
+
+    def load_structure_batch(self, batch):
+        """Loads the coordinates and any derived fields (see `FIELDS`
+        and `PROTEIN_FIELDS`) of a StructureBatch into the member dictionaries,
+        as zero-copy views into the batch
+
+        Args:
+            batch (StructureBatch): Packed structures
+        """
+        self.structures.update(batch.to_dict())
+        for name, member in self.FIELDS.items():
+            if name in batch.fields:
+                getattr(self, member).update(batch.to_dict(name))
+        for name, member in self.PROTEIN_FIELDS.items():
+            if name in batch.fields:
+                values = batch.to_dict(name)
+                if name in self.SCALAR_FIELDS:
+                    values = {key: value[0] for key, value in values.items()}
+                getattr(self, member).update(values)
+
+    def to_structure_batch(self, keys=None, dtype=np.float32):
+        """Packs the structures, and every derived per-residue quantity
+        available for any of them, into a StructureBatch. Proteins missing
+        a quantity, e.g. because its computation failed, are left out of
+        that field only.
+
+        Args:
+            keys (list, optional): Proteins to include. Defaults to all structures.
+            dtype (Numpy dtype, optional): Type of the coordinate buffer. Defaults to float32.
+
+        Returns:
+            StructureBatch: Packed structures, with fields named as in `FIELDS`
+            and `PROTEIN_FIELDS`
+        """
+        keys = list(self.structures) if keys is None else list(keys)
+        batch = StructureBatch.from_dict({key: self.structures[key] for key in keys}, dtype=dtype)
+        for name, member in self.FIELDS.items():
+            values = getattr(self, member)
+            present = {key: values[key] for key in keys if key in values}
+            if present:
+                batch.add_field(name, present)
+        for name, member in self.PROTEIN_FIELDS.items():
+            values = getattr(self, member)
+            present = {key: np.atleast_1d(values[key]) for key in keys if key in values}
+            if present:
+                batch.add_field(name, present)
+        return batch
     
     def load_bfactors(self, bfactors):
         """Updates internal dictionary of b-factors,
@@ -677,7 +2070,7 @@ class Analyzer:
         """
         self.bfactors.update(bfactors)
 
-    def compute_windings(self, smoothing=20, progress=True):
+    def compute_windings(self, smoothing=20, progress=True, workers=1, chunksize=None, batch_size=None, cache=None):
         """Computes the normal bundle framing and cumulative winding number
         for each protein structure stored in the `structures` dictionary.
         The backbone, normal bundle, "flattened" curve (projection to the
@@ -691,22 +2084,42 @@ class Analyzer:
             Amount of smoothing to apply when computing the backbone curve. Defaults to 20.
         progress: bool (optional):
             Whether to show a progress bar (default True)
+        workers: int (optional):
+            Number of worker processes; None uses every core (default 1)
+        chunksize: int (optional):
+            Proteins per task submitted to the workers (default about four tasks per worker)
+        batch_size: int (optional):
+            If given, proteins of similar length are grouped this many at a time and
+            run through `compute_winding_batch` (default None, one protein at a time)
+        cache: ProteinCache (optional):
+            If given, proteins whose coordinates and smoothing match a cache entry are
+            loaded lazily from it, and the rest are computed and added to it (default None)
         """
-        from tqdm import tqdm
-        for key, structure in (tqdm(self.structures.items(), desc = 'Computing windings') if progress else self.structures.items()):
-            res = compute_winding(structure, smoothing=smoothing)
-            self.windings[key] = res["winding"]
-            self.backbones[key] = res["backbone"]
-            self.normal_bundles[key] = res["normal_bundle"]
-            self.flattened[key] = res["flattened"]
-            
-
-    def compute_regressions(self, penalties=[1, 1.5], learning_rate=0.01, iterations=10000, std_cutoff=1, progress=True):
+        members = dict(winding='windings', backbone='backbones', normal_bundle='normal_bundles', flattened='flattened')
+        hashes = {key: ProteinCache.key([structure], smoothing=smoothing) for key, structure in self.structures.items()}
+        todo = self.uncached(cache, 'geometry', hashes)
+        if batch_size:
+            keys = sorted(todo, key=lambda key: len(self.structures[key]))
+            groups = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
+            items = [(i, ([self.structures[key] for key in group], smoothing)) for i, group in enumerate(groups)]
+            grouped, group_errors = map_proteins(compute_winding_group, items, workers=workers, chunksize=chunksize, desc='Computing windings', progress=progress)
+            results = {key: res for i, group in enumerate(groups) if i in grouped for key, res in zip(group, grouped[i])}
+            errors = {key: group_errors[i] for i, group in enumerate(groups) if i in group_errors for key in group}
+        else:
+            items = [(key, (self.structures[key], smoothing)) for key in todo]
+            results, errors = map_proteins(compute_winding, items, workers=workers, chunksize=chunksize, desc='Computing windings', progress=progress)
+        self.merge_results(results, members, cache, 'geometry', hashes)
+        self.geometry_keys.update({key: hashes[key] for key in hashes if key not in errors})
+        self.report_errors(errors, 'winding')
+
+
+    def compute_regressions(self, penalties=[1, 1.5], learning_rate=None, iterations=None, std_cutoff=1, progress=True, workers=1, chunksize=None, cache=None, segmentation='cutoff', max_coils=4, coil_penalty=COIL_PENALTY, method='exact'):
         """Computes piecewise-linear regressions (constant - slope = m - constant) over
         all cumulative winding curves stored in the `winding` dictionary. 
-        Start by assuming 2 breakpoints, and then if the standard deviation exceeds
-        Writes the breakpoints
-        of these regressions to the `breakpoints` and `slopes` dictionaries.
+        With 'adaptive' segmentation the number of coils is chosen per protein
+        by a BIC penalty (see `compute_lrr_regression`). Writes the breakpoints
+        of these regressions to the `breakpoints` and `slopes` dictionaries,
+        and the slope of each coil to `coil_slopes`.
 
         Parameters
         ----------
@@ -715,54 +2128,143 @@ class Analyzer:
             The first component refers to the non-coiling regions; the second to the coiling region.
             Defaults to [1, 1.5].
         learning_rate: float (optional)
-            Scalar for gradient descent in parameter optimization. Defaults to 0.01.
-            iterations (int, optional): Iterations of gradient descent. Defaults to 10000.
+            Scalar for gradient descent in parameter optimization, with method
+            'descent'. Defaults to 0.01.
         iterations: int (optional)
-            Number of iterations in gradient descent.  Defaults to 10000
+            Number of iterations in gradient descent, with method 'descent'.  Defaults to 10000
         std_cutoff: float (optional)
-            The standard deviation amount beyond which to subdivide LRR region    
+            The standard deviation amount beyond which to subdivide LRR region,
+            with 'cutoff' segmentation
+        segmentation: str (optional):
+            'cutoff' or 'adaptive', see `compute_lrr_regression` (default 'cutoff')
+        max_coils: int (optional):
+            Largest number of coils with 'adaptive' segmentation (default 4)
+        coil_penalty: float (optional):
+            Decrease in log-loss each extra coil has to buy with 'adaptive'
+            segmentation, see `segmentation_bic` (default `COIL_PENALTY`, log(10))
+        method: str (optional):
+            'exact' or 'descent', see `compute_regression` (default 'exact').
+            `learning_rate` and `iterations` raise a ValueError unless it is 'descent'.
         progress: bool (optional):
             Whether to show a progress bar (default True)
+        workers: int (optional):
+            Number of worker processes; None uses every core (default 1)
+        chunksize: int (optional):
+            Proteins per task submitted to the workers (default about four tasks per worker)
+        cache: ProteinCache (optional):
+            If given, regressions whose inputs and parameters match a cache entry are
+            loaded lazily from it, and the rest are computed and added to it.  The
+            input of a winding computed with a cache is identified by its geometry
+            hash, so cached windings need not be read (default None)
         """
-        from tqdm import tqdm
-        for key, winding in (tqdm(self.windings.items(), desc = 'Computing regressions') if progress else self.windings.items()):
-            ## Step 1: Compute breakpoints
-            res = compute_regression(winding, n_breakpoints=2, penalties=penalties, learning_rate=learning_rate, iterations=iterations)
-            std = compute_lrr_std(winding, res["breakpoints"], res["slope"])
-            self.stds[key] = std
-            [a, b] = res["breakpoints"]
-            if std > std_cutoff:
-                breakpoints = [a, a + (b-a)/2, a + (b-a)/2 + 1, b]
-                res = compute_regression(winding, n_breakpoints=4, initial_guess=breakpoints, penalties=penalties, learning_rate=learning_rate, iterations=iterations)
-            self.slopes[key] = res["slope"]
-            self.breakpoints[key] = res["breakpoints"]
-            self.losses[key] = res["loss"]
-            
-    def compute_lrr_windings_laplacian(self, period=25, progress=True):
+        members = dict(std='stds', slope='slopes', breakpoints='breakpoints', loss='losses', coil_slopes='coil_slopes')
+        params = dict(penalties=list(penalties), learning_rate=learning_rate, iterations=iterations, std_cutoff=std_cutoff, segmentation=segmentation, max_coils=max_coils, coil_penalty=coil_penalty, method=method)
+        hashes = {
+            key: ProteinCache.key([], geometry=self.geometry_keys[key], **params) if key in self.geometry_keys
+            else ProteinCache.key([self.windings[key]], **params)
+            for key in self.windings
+        } if cache is not None else {key: None for key in self.windings}
+        todo = self.uncached(cache, 'regression', hashes)
+        items = [(key, (self.windings[key], penalties, learning_rate, iterations, std_cutoff, segmentation, max_coils, coil_penalty, method)) for key in todo]
+        results, errors = map_proteins(compute_lrr_regression, items, workers=workers, chunksize=chunksize, desc='Computing regressions', progress=progress)
+        self.merge_results(results, members, cache, 'regression', hashes)
+        self.report_errors(errors, 'regression')
+
+    def compute_lrr_windings_laplacian(self, period=25, progress=True, workers=1, chunksize=None, sparse=False, scorer='persistence', cache=None):
         """
         Parameters
         ---------- 
         period: int
             Approximate period of each winding
+        sparse: bool (optional):
+            Use the sparse nearest neighbor graph, for long structures (default False)
+        scorer: str or callable (optional):
+            Circularity scorer, 'coverage' or 'persistence' (default 'persistence')
         progress: bool (optional):
             Whether to show a progress bar (default True)
+        workers: int (optional):
+            Number of worker processes; None uses every core (default 1)
+        chunksize: int (optional):
+            Proteins per task submitted to the workers (default about four tasks per worker)
+        cache: ProteinCache (optional):
+            If given, Laplacian windings whose inputs and parameters match a cache entry
+            are loaded lazily from it, and the rest are computed and added to it (default None)
+        """
+        keys = [key for key in self.structures if key in self.breakpoints]
+        scorer_name = scorer if isinstance(scorer, str) else getattr(scorer, '__name__', repr(scorer))
+        hashes = {
+            key: ProteinCache.key([self.structures[key], self.breakpoints[key]], period=period, sparse=sparse, scorer=scorer_name)
+            for key in keys
+        } if cache is not None else {key: None for key in keys}
+        todo = self.uncached(cache, 'laplacian', hashes)
+        items = [(key, (self.structures[key], self.breakpoints[key], period, sparse, scorer)) for key in todo]
+        results, errors = map_proteins(compute_lrr_winding_laplacian, items, workers=workers, chunksize=chunksize, desc='Computing Laplacian windings', progress=progress)
+        results = {key: dict(lwinding=lwinding) for key, lwinding in results.items()}
+        self.merge_results(results, dict(lwinding='lwindings'), cache, 'laplacian', hashes)
+        self.report_errors(errors, 'Laplacian winding')
+
+    def uncached(self, cache, kind, hashes):
+        """Proteins that are not in the cache
+
+        Args:
+            cache (ProteinCache): Cache to look in, or None
+            kind (str): Kind of computation
+            hashes (dict): Hash of the inputs of each protein
+
+        Returns:
+            list: Keys of `hashes` with no cache entry, in order
+        """
+        if cache is None:
+            return list(hashes)
+        return [key for key, h in hashes.items() if not cache.contains(kind, h)]
+
+    def merge_results(self, results, members, cache, kind, hashes):
+        """Stores freshly computed results in the member dictionaries and
+        the cache, and defers loading of cache hits, keeping the order of
+        `hashes`
+
+        Args:
+            results (dict): Per-protein dicts of computed values
+            members (dict): Member dictionary for each value name
+            cache (ProteinCache): Cache to read and write, or None
+            kind (str): Kind of computation
+            hashes (dict): Hash of the inputs of each protein
+        """
+        from functools import partial
+        for key, h in hashes.items():
+            if key in results:
+                for name, member in members.items():
+                    getattr(self, member)[key] = results[key][name]
+                if cache is not None:
+                    cache.store(kind, h, **{name: results[key][name] for name in members})
+            elif cache is not None and cache.contains(kind, h):
+                cache.touch(kind, h)
+                for name, member in members.items():
+                    getattr(self, member).defer(key, partial(cache.load, kind, h, name))
+
+    def report_errors(self, errors, stage):
+        """Records and prints per-protein failures from a batch computation
+
+        Args:
+            errors (dict): Error messages keyed by protein
+            stage (str): Name of the computation, for the printed message
         """
-        from tqdm import tqdm
-        for key in (tqdm(self.structures, desc = 'Computing Laplacian windings') if progress else self.windings.items()):
-            self.lwindings[key] = compute_lrr_winding_laplacian(self.structures[key], self.breakpoints[key], period=period)
+        self.errors.update(errors)
+        for key, error in errors.items():
+            print(f"Warning: failed to compute {stage} for {key}: {error}")
 
     def cache_geometry(self, directory, prefix = ''):
         with open(os.path.join(directory, prefix + 'backbones.pickle'), 'wb') as handle:
-            pickle.dump(self.windings, handle, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(dict(self.backbones), handle, protocol = pickle.HIGHEST_PROTOCOL)
         
         with open(os.path.join(directory, prefix + 'normal_bundles.pickle'), 'wb') as handle:
-            pickle.dump(self.normal_bundles, handle, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(dict(self.normal_bundles), handle, protocol = pickle.HIGHEST_PROTOCOL)
         
         with open(os.path.join(directory, prefix + 'flattened.pickle'), 'wb') as handle:
-            pickle.dump(self.flattened, handle, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(dict(self.flattened), handle, protocol = pickle.HIGHEST_PROTOCOL)
 
         with open(os.path.join(directory, prefix + 'windings.pickle'), 'wb') as handle:
-            pickle.dump(self.windings, handle, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(dict(self.windings), handle, protocol = pickle.HIGHEST_PROTOCOL)
 
     def retrieve_geometry(self, directory, prefix = ''):
         with open(os.path.join(directory, prefix + 'backbones.pickle'), 'rb') as handle:
@@ -779,14 +2281,59 @@ class Analyzer:
 
     def cache_regressions(self, directory, prefix = ''):
         with open(os.path.join(directory, prefix + 'slopes.pickle'), 'wb') as handle:
-            pickle.dump(self.slopes, handle, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(dict(self.slopes), handle, protocol = pickle.HIGHEST_PROTOCOL)
 
-        with open(os.path.join(directory, prefix + 'regressions.pickle'), 'wb') as handle:
-            pickle.dump(self.regressions, handle, protocol = pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(directory, prefix + 'breakpoints.pickle'), 'wb') as handle:
+            pickle.dump(dict(self.breakpoints), handle, protocol = pickle.HIGHEST_PROTOCOL)
 
     def retrieve_regressions(self, directory, prefix = ''):
         with open(os.path.join(directory, prefix + 'slopes.pickle'), 'rb') as handle:
             self.slopes.update(pickle.load(handle))
 
-        with open(os.path.join(directory, prefix + 'regressions.pickle'), 'rb') as handle:
-            self.regressions.update(pickle.load(handle))
+        with open(os.path.join(directory, prefix + 'breakpoints.pickle'), 'rb') as handle:
+            self.breakpoints.update(pickle.load(handle))
+
+    def cache_store(self, directory, keys=None, dtype=np.float64):
+        """Writes the structures and every result available for all of
+        them to a memory-mappable store (see `StructureBatch.save`), which
+        `retrieve_store` opens without unpickling
+
+        Args:
+            directory (str): Directory of the store
+            keys (list, optional): Proteins to include. Defaults to all structures.
+            dtype (Numpy dtype, optional): Type of the coordinate buffer. Defaults to float64.
+        """
+        self.to_structure_batch(keys=keys, dtype=dtype).save(directory)
+
+    def retrieve_store(self, directory):
+        """Loads a store written by `cache_store`; the member dictionaries
+        hold zero-copy views of its memory-mapped buffers
+
+        Args:
+            directory (str): Directory of the store
+        """
+        self.load_structure_batch(StructureBatch.open(directory))
+
+    def migrate_cache(self, directory, store=None, prefix=''):
+        """Converts the pickles written by `Loader.cache`, `cache_geometry`
+        and `cache_regressions` into a store. Missing pickles are skipped.
+
+        Args:
+            directory (str): Directory holding the pickles
+            store (str, optional): Directory of the store. Defaults to `store`
+                inside `directory`.
+            prefix (str): Name of cached export. Defaults to ''.
+        """
+        members = ['structures'] + list(self.FIELDS.values()) + list(self.PROTEIN_FIELDS.values())
+        for member in members:
+            path = os.path.join(directory, prefix + member + '.pickle')
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as handle:
+                values = pickle.load(handle)
+            if member == 'backbones' and any(np.ndim(value) == 1 for value in values.values()):
+                # older versions of `cache_geometry` wrote the windings here
+                print(f"Warning: {path} does not hold backbones, skipping")
+                continue
+            getattr(self, member).update(values)
+        self.cache_store(store or os.path.join(directory, 'store'))
@@ -0,0 +1,231 @@
+"""Packed, ragged storage for per-residue arrays of many proteins.
+Every protein's rows live in one contiguous buffer, delimited by an
+offsets array, so a panel of structures is a handful of allocations
+instead of one array per protein, and per-protein access is a view.
+A batch saved to a directory is reopened with memory-mapped buffers, so
+opening a panel only reads its key index, and each protein is paged in
+from disk when it is first touched.
+"""
+
+import json
+import os
+import numpy as np
+from collections.abc import Mapping
+
+STORE_VERSION = 2
+# versions `StructureBatch.open` can read; version 1 stores have no partial fields
+READABLE_VERSIONS = (1, 2)
+
+def load_buffer(path, mmap_mode='r'):
+    """Opens a .npy file as a memory map, or reads it if it is empty
+    (empty files cannot be mapped). The map is returned as a plain array
+    view, whose slices are much cheaper to take than those of a memmap."""
+    try:
+        buffer = np.load(path, mmap_mode=mmap_mode)
+    except ValueError:
+        return np.load(path)
+    return buffer.view(np.ndarray) if isinstance(buffer, np.memmap) else buffer
+
+def pack(arrays, dtype=None):
+    """Concatenates a list of arrays along their first axis
+
+    Args:
+        arrays (list): Arrays whose trailing dimensions agree
+        dtype (Numpy dtype, optional): Type of the packed buffer. Defaults to
+            the type of the arrays.
+
+    Returns:
+        list: A two-element list consisting of the packed buffer and the
+        int64 offsets array, where array i is buffer[offsets[i]:offsets[i+1]]
+    """
+    lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if len(arrays) == 0:
+        return np.zeros(0, dtype=dtype or float), offsets
+    buffer = np.concatenate([np.asarray(a) for a in arrays], axis=0)
+    if dtype is not None:
+        buffer = buffer.astype(dtype, copy=False)
+    return buffer, offsets
+
+
+class StructureBatch:
+    def __init__(self, keys, coords, offsets):
+        """Structure-of-arrays container for a panel of proteins
+
+        Args:
+            keys (list): Protein names, in storage order
+            coords (Numpy array): (total residues, 3) packed CA coordinates
+            offsets (Numpy array): int64 array of length len(keys) + 1
+        """
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.coords = coords
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.fields = {}
+        self.present = {}
+
+    @classmethod
+    def from_dict(cls, structures, dtype=np.float32):
+        """Packs a dictionary of (n, 3) structures, e.g. `Loader.structures`
+
+        Args:
+            structures (dict): Dictionary of protein structures
+            dtype (Numpy dtype, optional): Type of the coordinate buffer.
+                Defaults to float32.
+        """
+        keys = list(structures)
+        coords, offsets = pack([structures[key] for key in keys], dtype=dtype)
+        return cls(keys, coords.reshape(-1, 3), offsets)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __getitem__(self, key):
+        """Zero-copy view of the coordinates of one protein"""
+        i = self.index[key]
+        return self.coords[self.offsets[i]:self.offsets[i+1]]
+
+    @property
+    def lengths(self):
+        """Number of residues in each protein"""
+        return np.diff(self.offsets)
+
+    def add_field(self, name, values, dtype=None):
+        """Packs a derived per-residue quantity (e.g. winding, b-factor).
+        Fields have their own offsets, so they need not have one row per
+        residue (windings have one fewer). A dictionary may leave out some
+        proteins, e.g. those whose computation failed; the field is then
+        partial, and `present` records which proteins have it.
+
+        Args:
+            name (str): Name of the field
+            values (dict or list): Arrays keyed by protein, or listed in
+                the order of `keys`
+            dtype (Numpy dtype, optional): Type of the packed buffer
+        """
+        self.present.pop(name, None)
+        if isinstance(values, Mapping):
+            present = np.array([key in values for key in self.keys], dtype=bool)
+            if not present.all():
+                # absent proteins get an empty row of the same trailing shape
+                example = next((np.asarray(values[key]) for key in self.keys if key in values), np.zeros(0))
+                empty = np.zeros((0,) + example.shape[1:], dtype=example.dtype)
+                self.present[name] = present
+            values = [values[key] if key in values else empty for key in self.keys]
+        self.fields[name] = pack(values, dtype=dtype)
+
+    def has(self, name, key):
+        """Whether field `name` is stored for protein `key`"""
+        if name not in self.fields or key not in self.index:
+            return False
+        return name not in self.present or bool(self.present[name][self.index[key]])
+
+    def field(self, name, key):
+        """Zero-copy view of field `name` for one protein"""
+        if not self.has(name, key):
+            raise KeyError(f"Field {name} is not stored for {key}")
+        buffer, offsets = self.fields[name]
+        i = self.index[key]
+        return buffer[offsets[i]:offsets[i+1]]
+
+    def items(self, name=None):
+        """Iterates over (key, view) pairs of the coordinates, or of
+        field `name`, in storage order; proteins without the field are
+        skipped"""
+        buffer, offsets = (self.coords, self.offsets) if name is None else self.fields[name]
+        present = self.present.get(name)
+        for i, key in enumerate(self.keys):
+            if present is None or present[i]:
+                yield key, buffer[offsets[i]:offsets[i+1]]
+
+    def to_dict(self, name=None):
+        """Dictionary of zero-copy views of the coordinates, or of field `name`"""
+        return dict(self.items(name))
+
+    def subset(self, keys):
+        """New batch holding copies of the coordinates and fields of `keys`"""
+        batch = StructureBatch.from_dict({key: self[key] for key in keys}, dtype=self.coords.dtype)
+        for name, (buffer, _) in self.fields.items():
+            batch.add_field(name, {key: self.field(name, key) for key in keys if self.has(name, key)}, dtype=buffer.dtype)
+        return batch
+
+    def save(self, directory):
+        """Writes the batch to a directory holding one .npy file per buffer
+        and offsets array, a presence mask for each partial field, plus an
+        `index.json` listing the keys and fields
+
+        Args:
+            directory (str): Directory to write to, created if needed
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'coords.npy'), np.ascontiguousarray(self.coords))
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        for name, (buffer, offsets) in self.fields.items():
+            np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(buffer))
+            np.save(os.path.join(directory, name + '.offsets.npy'), offsets)
+        for name, present in self.present.items():
+            np.save(os.path.join(directory, name + '.present.npy'), present)
+        index = dict(version=STORE_VERSION, keys=self.keys, fields=list(self.fields), partial=list(self.present))
+        # written last, so an interrupted save leaves no index behind
+        tmp = os.path.join(directory, 'index.json.tmp')
+        with open(tmp, 'w') as handle:
+            json.dump(index, handle)
+        os.replace(tmp, os.path.join(directory, 'index.json'))
+
+    @classmethod
+    def open(cls, directory, mmap_mode='r'):
+        """Opens a batch written by `save` without reading its buffers,
+        which are memory-mapped; views of single proteins are zero-copy
+
+        Args:
+            directory (str): Directory written by `save`
+            mmap_mode (str, optional): Mode of the memory maps, see
+                `numpy.load`. Defaults to 'r'; None reads everything.
+        """
+        with open(os.path.join(directory, 'index.json')) as handle:
+            index = json.load(handle)
+        if index.get('version') not in READABLE_VERSIONS:
+            raise ValueError(f"Unsupported store version {index.get('version')} in {directory}")
+        batch = cls(
+            index['keys'],
+            load_buffer(os.path.join(directory, 'coords.npy'), mmap_mode),
+            np.load(os.path.join(directory, 'offsets.npy'))
+        )
+        for name in index['fields']:
+            batch.fields[name] = [
+                load_buffer(os.path.join(directory, name + '.npy'), mmap_mode),
+                np.load(os.path.join(directory, name + '.offsets.npy'))
+            ]
+        for name in index.get('partial', []):
+            batch.present[name] = np.load(os.path.join(directory, name + '.present.npy'))
+        return batch
+
+    def padded(self, name=None, keys=None, fill=0):
+        """Copies the coordinates, or field `name`, of several proteins
+        into one zero-padded array, for kernels such as `compute_winding_batch`
+
+        Args:
+            name (str, optional): Field to pad. Defaults to the coordinates.
+            keys (list, optional): Proteins to include. Defaults to all.
+            fill (float, optional): Value of the padding. Defaults to 0.
+
+        Returns:
+            list: A two-element list consisting of the (b, n_max, ...) padded
+            array and the length of each row; proteins without the field
+            have length 0
+        """
+        buffer, offsets = (self.coords, self.offsets) if name is None else self.fields[name]
+        rows = np.arange(len(self.keys)) if keys is None else np.array([self.index[key] for key in keys], dtype=int)
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        n = int(np.max(lengths)) if len(rows) else 0
+        out = np.full((len(rows), n) + buffer.shape[1:], fill, dtype=buffer.dtype)
+        mask = np.arange(n)[np.newaxis, :] < lengths[:, np.newaxis]
+        out[mask] = buffer[(starts[:, np.newaxis] + np.arange(n)[np.newaxis, :])[mask]]
+        return out, lengths
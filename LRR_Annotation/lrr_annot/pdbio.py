@@ -0,0 +1,253 @@
+"""Minimal fixed-column PDB reader. Reads the CA atoms of one chain in a
+single pass over the file, returning coordinates, b-factors (pLDDT for
+AlphaFold models) and the one-letter sequence without building a
+Biopython structure. PDB files can be plain or gzipped, on disk or
+inside .tar, .tar.gz and .zip archives, which are streamed rather than
+extracted.
+"""
+
+import gzip
+import os
+import tarfile
+import zipfile
+import numpy as np
+
+PDB_SUFFIXES = ('.pdb', '.pdb.gz')
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.zip')
+
+THREE_TO_ONE = dict(
+    ALA='A', ARG='R', ASN='N', ASP='D', CYS='C', GLN='Q', GLU='E', GLY='G', HIS='H', ILE='I',
+    LEU='L', LYS='K', MET='M', PHE='F', PRO='P', SER='S', THR='T', TRP='W', TYR='Y', VAL='V',
+    # common modified residues
+    MSE='M', SEC='U', PYL='O'
+)
+
+def parse_pdb(lines, chain=None):
+    """
+    Reads the CA atom of every residue of one chain of the first model,
+    from ATOM and HETATM records. For residues with alternate locations
+    the first CA listed is kept.
+
+    Parameters
+    ----------
+    lines: iterable of str
+        Lines of a PDB file
+    chain: str (optional)
+        Chain identifier.  Defaults to the first chain in the file.
+
+    Returns
+    -------
+    {
+        structure: ndarray(n, 3)
+            CA coordinates
+        bfactor: ndarray(n)
+            B-factor of each CA
+        sequence: str
+            One-letter code of each residue, 'X' if unknown
+        chain: str
+            Chain that was read
+    }
+    """
+    coords = []
+    bfactors = []
+    sequence = []
+    seen = set()
+    for line in lines:
+        record = line[:6]
+        if record == 'ENDMDL':
+            break
+        # ' CA ' is the alpha carbon; calcium is 'CA  '
+        if (record != 'ATOM  ' and record != 'HETATM') or line[12:16] != ' CA ':
+            continue
+        if chain is None:
+            chain = line[21]
+        elif line[21] != chain:
+            continue
+        residue = line[22:27] # sequence number and insertion code
+        if residue in seen:
+            continue
+        seen.add(residue)
+        coords.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+        bfactor = line[60:66].strip()
+        bfactors.append(float(bfactor) if bfactor else 0.0)
+        sequence.append(THREE_TO_ONE.get(line[17:20].strip(), 'X'))
+    return dict(
+        structure=np.array(coords, dtype=float).reshape(-1, 3),
+        bfactor=np.array(bfactors, dtype=float),
+        sequence=''.join(sequence),
+        chain=chain
+    )
+
+def pdb_stem(name):
+    """Filename of a PDB file without directory and extension, or None if
+    `name` is not a PDB file"""
+    name = os.path.basename(name)
+    for suffix in PDB_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+def is_archive(path):
+    """Whether `path` names an archive `iter_archive` can read"""
+    return str(path).endswith(ARCHIVE_SUFFIXES)
+
+def decode(data, name):
+    """Text of a possibly gzipped PDB file read as bytes"""
+    if name.endswith('.gz'):
+        data = gzip.decompress(data)
+    return data.decode()
+
+def read_text(path):
+    """Text of a plain or gzipped PDB file"""
+    with open(path, 'rb') as handle:
+        return decode(handle.read(), str(path))
+
+def read_pdb(path, chain=None):
+    """Reads the CA atoms of a plain or gzipped PDB file, see `parse_pdb`
+
+    Args:
+        path (str): Path to the .pdb or .pdb.gz file
+        chain (str, optional): Chain identifier. Defaults to the first chain.
+    """
+    return parse_pdb(read_text(path).splitlines(), chain=chain)
+
+def parse_text(text, chain=None):
+    """Parses the contents of a PDB file, see `parse_pdb`. Raises a
+    ValueError if it has no CA atoms, e.g. for a truncated file"""
+    res = parse_pdb(text.splitlines(), chain=chain)
+    if len(res["structure"]) == 0:
+        raise ValueError("No CA atoms found")
+    return res
+
+def iter_archive(path, select=None):
+    """
+    Streams the PDB files of an archive without extracting it. Tar files
+    are read sequentially, so compressed tarballs are decompressed once.
+
+    Parameters
+    ----------
+    path: str
+        A .tar, .tar.gz, .tgz or .zip archive, or a single .pdb.gz file
+    select: callable (optional)
+        Maps the name of each member to the key it is loaded under, or to
+        None to skip it. Defaults to `pdb_stem`, which keeps every PDB file.
+
+    Yields
+    ------
+    (key, read) pairs, where `read()` returns the text of the member. It
+    must be called before the next pair is requested.
+    """
+    path = str(path)
+    select = pdb_stem if select is None else select
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                key = None if info.is_dir() else select(info.filename)
+                if key is not None:
+                    yield key, lambda info=info: decode(archive.read(info), info.filename)
+    elif is_archive(path):
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                key = select(member.name) if member.isfile() else None
+                if key is not None:
+                    yield key, lambda member=member: decode(archive.extractfile(member).read(), member.name)
+    else:
+        key = select(path)
+        if key is not None:
+            yield key, lambda: read_text(path)
+
+def parse_sources(sources, workers=1, prefetch=None, progress=True, desc='Loading PDBs', total=None):
+    """
+    Parses many PDB files, optionally in a process pool. File contents are
+    read in this process, at most `prefetch` files ahead of the parsing, so
+    reading overlaps with parsing without holding a whole directory or
+    archive in memory. Failures are collected rather than raised.
+
+    Parameters
+    ----------
+    sources: iterable
+        (key, read) pairs, where `read()` returns the text of a PDB file.
+        Each `read` is called once, in order, before the next pair is taken.
+    workers: int (optional)
+        Number of worker processes. 1 parses in this process, None uses
+        every core. Defaults to 1.
+    prefetch: int (optional)
+        Maximum number of files read but not yet parsed. Defaults to four
+        per worker.
+    progress: bool (optional)
+        Whether to show a progress bar. Defaults to True.
+    total: int (optional)
+        Number of sources, for the progress bar
+
+    Returns
+    -------
+    A two-element list consisting of a dictionary of `parse_pdb` results
+    and a dictionary of error messages, both keyed by source key in the
+    order of `sources`
+    """
+    from tqdm import tqdm
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if prefetch is None:
+        prefetch = 4 * workers
+
+    order = []
+    done = {}
+    bar = tqdm(total=total, desc=desc, disable=not progress)
+    if workers <= 1:
+        for key, read in sources:
+            order.append(key)
+            try:
+                done[key] = (parse_text(read()), None)
+            except Exception as e:
+                done[key] = (None, f"{type(e).__name__}: {e}")
+            bar.update(1)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+
+            def collect(futures):
+                for future in futures:
+                    key = pending.pop(future)
+                    try:
+                        done[key] = (future.result(), None)
+                    except Exception as e:
+                        done[key] = (None, f"{type(e).__name__}: {e}")
+                    bar.update(1)
+
+            for key, read in sources:
+                order.append(key)
+                try:
+                    pending[pool.submit(parse_text, read())] = key
+                except Exception as e:
+                    done[key] = (None, f"{type(e).__name__}: {e}")
+                    bar.update(1)
+                if len(pending) >= prefetch:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            collect(list(pending))
+    bar.close()
+
+    results = {key: done[key][0] for key in order if done[key][1] is None}
+    errors = {key: done[key][1] for key in order if done[key][1] is not None}
+    return results, errors
+
+def read_pdbs(paths, workers=1, prefetch=None, progress=True, desc='Loading PDBs'):
+    """Reads many plain or gzipped PDB files, see `parse_sources`
+
+    Returns:
+        list: Dictionaries of results and of error messages, keyed by path
+    """
+    paths = list(paths)
+    sources = ((path, lambda path=path: read_text(path)) for path in paths)
+    return parse_sources(sources, workers=workers, prefetch=prefetch, progress=progress, desc=desc, total=len(paths))
+
+def read_archive(path, select=None, workers=1, prefetch=None, progress=True):
+    """Reads the PDB files of an archive, see `iter_archive` and `parse_sources`
+
+    Returns:
+        list: Dictionaries of results and of error messages, keyed by the
+        output of `select`
+    """
+    return parse_sources(iter_archive(path, select=select), workers=workers, prefetch=prefetch, progress=progress, desc=f'Loading {os.path.basename(str(path))}')
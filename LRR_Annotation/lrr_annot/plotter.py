@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import json
 import os
 
 def plot_regression(ax, winding, breakpoints, slope, colors=[]):
@@ -34,6 +35,71 @@ def plot_regression(ax, winding, breakpoints, slope, colors=[]):
     ax.set_xlabel('Residue number')
     ax.set_ylabel('Winding number')
 
+def render_sheet(path, items, layout='single', dpi=100, n_cols=None):
+    """
+    Renders the regressions of one or more proteins to a single file with
+    the object-oriented matplotlib API on Agg canvases, so it leaves the
+    global pyplot state alone and can run in worker processes
+
+    Parameters
+    ----------
+    path: str
+        File to write; for the 'single' layout its extension sets the format
+    items: list of (key, winding, breakpoints, slope)
+        Proteins to draw, see `plot_regression`
+    layout: str (optional)
+        'single' draws the first protein on its own figure, 'multipage' writes
+        a PDF with one page per protein, and 'grid' writes a raster sheet of
+        thumbnails. Defaults to 'single'.
+    dpi: int (optional)
+        Resolution of raster output
+    n_cols: int (optional)
+        Columns of the 'grid' layout. Defaults to a square grid.
+
+    Returns
+    -------
+    path: str
+        The file written
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    def new_figure(**kwargs):
+        fig = Figure(**kwargs)
+        FigureCanvasAgg(fig)
+        return fig
+
+    if layout == 'multipage':
+        from matplotlib.backends.backend_pdf import PdfPages
+        with PdfPages(path) as pdf:
+            for key, winding, breakpoints, slope in items:
+                fig = new_figure()
+                ax = fig.add_subplot()
+                plot_regression(ax, winding, breakpoints, slope)
+                ax.set_title(key)
+                pdf.savefig(fig)
+    elif layout == 'grid':
+        n_cols = n_cols or int(np.ceil(np.sqrt(len(items))))
+        n_rows = int(np.ceil(len(items) / n_cols))
+        fig = new_figure(figsize=(3 * n_cols, 2.2 * n_rows))
+        for i, (key, winding, breakpoints, slope) in enumerate(items):
+            ax = fig.add_subplot(n_rows, n_cols, i + 1)
+            plot_regression(ax, winding, breakpoints, slope)
+            ax.set_title(key, fontsize=6)
+            ax.set_xlabel('')
+            ax.set_ylabel('')
+            ax.tick_params(labelsize=5)
+        fig.tight_layout()
+        fig.savefig(path, dpi=dpi)
+    elif layout == 'single':
+        key, winding, breakpoints, slope = items[0]
+        fig = new_figure()
+        plot_regression(fig.add_subplot(), winding, breakpoints, slope)
+        fig.savefig(path, dpi=dpi)
+    else:
+        raise ValueError(f"Unknown plot layout '{layout}'")
+    return path
+
 def plot_residue_annotations_3d(X, breakpoints, colors=[], fac=10):
     """
     Use myavi to plot labels of the annotations in 3D
@@ -117,4 +183,87 @@ class Plotter:
             plt.close()
         else:
             plt.show()
-        
+
+    def render_regressions(self, directory, layout = 'single', per_sheet = None, fmt = None, dpi = 100, workers = 1, chunksize = None, incremental = True, progress = True):
+        """Saves the regression plots with `render_sheet`, optionally
+        spread over a process pool. A manifest (`plots.json`) records a hash
+        of the winding, breakpoints and slope behind each file, so files
+        whose inputs are unchanged since the last run are not redrawn.
+
+        Args:
+            directory (str): Directory to save the plots to
+            layout (str, optional): 'single' (one file per protein), 'multipage'
+                (PDFs of `per_sheet` pages) or 'grid' (raster sheets of `per_sheet`
+                thumbnails). Proteins are grouped in sorted order. Defaults to 'single'.
+            per_sheet (int, optional): Proteins per file for the grouped layouts.
+                Defaults to 100 pages, or a 5 x 5 grid.
+            fmt (str, optional): File format of the 'single' and 'grid' layouts.
+                Defaults to 'pdf' and 'png' respectively.
+            dpi (int, optional): Resolution of raster output. Defaults to 100.
+            workers (int, optional): Number of worker processes; None uses every core.
+                Defaults to 1.
+            chunksize (int, optional): Files per task submitted to the workers
+            incremental (bool, optional): Whether to skip unchanged files. Defaults to True.
+            progress (bool, optional): Whether to show a progress bar. Defaults to True.
+
+        Returns:
+            list: Names of the files written
+        """
+        from .analyzer import map_proteins
+        from .cache import ProteinCache
+        keys = sorted(self.regressions)
+        if layout == 'single':
+            fmt = fmt or 'pdf'
+            sheets = {f"{key}.{fmt}": [key] for key in keys}
+        elif layout in ('multipage', 'grid'):
+            per_sheet = per_sheet or (100 if layout == 'multipage' else 25)
+            fmt = 'pdf' if layout == 'multipage' else (fmt or 'png')
+            sheets = {
+                f"regressions_{i // per_sheet:04d}.{fmt}": keys[i:i + per_sheet]
+                for i in range(0, len(keys), per_sheet)
+            }
+        else:
+            raise ValueError(f"Unknown plot layout '{layout}'")
+        n_cols = int(np.ceil(np.sqrt(per_sheet))) if layout == 'grid' else None
+
+        digests = {
+            key: ProteinCache.key([np.asarray(self.windings[key]), np.asarray(self.regressions[key])], slope=float(self.slopes[key]))
+            for key in keys
+        }
+        sheet_digests = {
+            name: ProteinCache.key([], layout=layout, dpi=dpi, n_cols=n_cols, keys=sheet, digests=[digests[key] for key in sheet])
+            for name, sheet in sheets.items()
+        }
+
+        manifest_path = os.path.join(directory, 'plots.json')
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as handle:
+                manifest = json.load(handle)
+        previous = manifest.get(layout, {}) if incremental else {}
+        todo = [
+            name for name in sheets
+            if previous.get(name, {}).get('digest') != sheet_digests[name] or not os.path.exists(os.path.join(directory, name))
+        ]
+
+        items = [
+            (name, (
+                os.path.join(directory, name),
+                [(key, np.asarray(self.windings[key]), np.asarray(self.regressions[key]), self.slopes[key]) for key in sheets[name]],
+                layout, dpi, n_cols
+            ))
+            for name in todo
+        ]
+        written, errors = map_proteins(render_sheet, items, workers=workers, chunksize=chunksize, desc='Making plots', progress=progress)
+        for name, error in errors.items():
+            print(f"Warning: failed to render {name}: {error}")
+
+        manifest[layout] = {
+            name: dict(digest=sheet_digests[name], keys=sheet)
+            for name, sheet in sheets.items() if name not in errors
+        }
+        tmp = manifest_path + '.tmp'
+        with open(tmp, 'w') as handle:
+            json.dump(manifest, handle)
+        os.replace(tmp, manifest_path)
+        return list(written)
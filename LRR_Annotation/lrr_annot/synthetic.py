@@ -0,0 +1,149 @@
+"""Synthetic LRR proteins for benchmarks and parity checks. The CA trace
+of the LRR domain is modelled as a helix of one turn per repeat around an
+(optionally bent) axis, flanked by persistent random walks standing in for
+the non-LRR termini, so the true breakpoints and winding slope are known.
+"""
+
+import numpy as np
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+# plant extracellular LRR consensus, one repeat
+LRR_CONSENSUS = 'LxxLxxLxxLxLSxNxLxGxIPxx'
+
+def random_walk(n, start, direction, rng, step=3.8, persistence=0.8):
+    """Persistent random walk of `n` CA positions with fixed step length
+
+    Args:
+        n (int): Number of positions
+        start (Numpy array): Position the walk starts next to
+        direction (Numpy array): Initial direction
+        rng (Numpy Generator): Random number generator
+        step (float, optional): Distance between consecutive positions. Defaults to 3.8.
+        persistence (float, optional): Weight of the previous direction against a
+            random kick; larger values give straighter walks. Defaults to 0.8.
+
+    Returns:
+        Numpy array: (n, 3) positions, the first one step away from `start`
+    """
+    X = np.empty((n, 3))
+    d = direction / np.linalg.norm(direction)
+    x = np.asarray(start, dtype=float)
+    for i in range(n):
+        d = persistence * d + (1 - persistence) * rng.normal(size=3)
+        d /= np.linalg.norm(d)
+        x = x + step * d
+        X[i] = x
+    return X
+
+def make_solenoid(n_repeats=20, period=24, n_term=80, c_term=80, radius=14.0, rise=4.8, curvature=0.0, noise=0.3, seed=0):
+    """
+    CA trace, b-factors and sequence of a synthetic LRR protein
+
+    Parameters
+    ----------
+    n_repeats: int (optional)
+        Number of LRR repeats. Defaults to 20.
+    period: int (optional)
+        Residues per repeat. Defaults to 24.
+    n_term, c_term: int (optional)
+        Lengths of the non-LRR flanking regions. Default to 80.
+    radius: float (optional)
+        Radius of the solenoid in Angstroms. Defaults to 14, which puts
+        consecutive residues about 3.7 Angstroms apart for 24-residue repeats.
+    rise: float (optional)
+        Advance along the axis per repeat, in Angstroms. Defaults to 4.8.
+    curvature: float (optional)
+        Inverse radius of the solenoid axis, giving the horseshoe shape of
+        many LRR domains; 0 gives a straight solenoid. Defaults to 0.
+    noise: float (optional)
+        Standard deviation of Gaussian noise added to the coordinates. Defaults to 0.3.
+    seed: int (optional)
+        Seed of the random number generator. Defaults to 0.
+
+    Returns
+    -------
+    {
+        structure: ndarray(n, 3)
+            CA coordinates
+        breakpoints: ndarray(int)
+            First residue of the LRR domain and first residue after it
+        bfactor: ndarray(n)
+            B-factors peaking once per repeat in the LRR domain
+        sequence: str
+            One-letter sequence with the LRR consensus in each repeat
+    }
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_repeats * period)
+    angle = 2 * np.pi * t / period
+    s = rise * t / period # arc length along the axis
+    if curvature > 0:
+        phi = s * curvature
+        axis = np.stack([(1 - np.cos(phi)) / curvature, np.zeros_like(s), np.sin(phi) / curvature], axis=1)
+        u = np.stack([np.cos(phi), np.zeros_like(s), -np.sin(phi)], axis=1)
+    else:
+        axis = np.stack([np.zeros_like(s), np.zeros_like(s), s], axis=1)
+        u = np.tile([1.0, 0, 0], (len(t), 1))
+    v = np.tile([0, 1.0, 0], (len(t), 1))
+    coil = axis + radius * (np.cos(angle)[:, np.newaxis] * u + np.sin(angle)[:, np.newaxis] * v)
+
+    tangent = axis[-1] - axis[0] if len(t) > 1 else np.array([0, 0, 1.0])
+    start = coil[0] if len(t) else np.zeros(3)
+    end = coil[-1] if len(t) else np.zeros(3)
+    head = random_walk(n_term, start, -tangent, rng)[::-1]
+    tail = random_walk(c_term, end, tangent, rng)
+    structure = np.concatenate([head, coil, tail]) + noise * rng.normal(size=(n_term + len(t) + c_term, 3))
+
+    bfactor = np.concatenate([
+        60 + 5 * rng.normal(size=n_term),
+        40 + 10 * np.cos(angle) + rng.normal(size=len(t)),
+        60 + 5 * rng.normal(size=c_term)
+    ])
+
+    # consensus positions marked 'x', and the termini, are random residues
+    template = 'x' * n_term + (LRR_CONSENSUS * (1 + period // len(LRR_CONSENSUS)))[:period] * n_repeats + 'x' * c_term
+    random_residues = rng.choice(list(AMINO_ACIDS), size=len(template))
+    sequence = ''.join(r if c == 'x' else c for c, r in zip(template, random_residues))
+
+    return dict(
+        structure=structure,
+        breakpoints=np.array([n_term, n_term + len(t)]),
+        bfactor=bfactor,
+        sequence=sequence
+    )
+
+def make_solenoid_of_length(n_residues, period=24, flank=0.1, seed=0, **kwargs):
+    """`make_solenoid` with about `n_residues` residues, a fraction `flank`
+    of them in each flanking region
+
+    Args:
+        n_residues (int): Approximate length of the protein
+        period (int, optional): Residues per repeat. Defaults to 24.
+        flank (float, optional): Fraction of residues in each terminus. Defaults to 0.1.
+        seed (int, optional): Seed of the random number generator. Defaults to 0.
+        **kwargs: Passed on to `make_solenoid`
+    """
+    n_term = int(flank * n_residues)
+    n_repeats = max(1, (n_residues - 2 * n_term) // period)
+    c_term = max(n_residues - n_term - n_repeats * period, 0)
+    return make_solenoid(n_repeats=n_repeats, period=period, n_term=n_term, c_term=c_term, seed=seed, **kwargs)
+
+def write_pdb(path, structure, bfactor=None, sequence=None, chain='A'):
+    """Writes a CA-only PDB file, e.g. of a synthetic protein
+
+    Args:
+        path (str): File to write
+        structure (Numpy array): (n, 3) CA coordinates
+        bfactor (Numpy array, optional): B-factor of each residue. Defaults to 0.
+        sequence (str, optional): One-letter sequence. Defaults to poly-alanine.
+        chain (str, optional): Chain identifier. Defaults to 'A'.
+    """
+    from Bio.PDB.Polypeptide import one_to_index, index_to_three
+    n = len(structure)
+    bfactor = np.zeros(n) if bfactor is None else bfactor
+    sequence = 'A' * n if sequence is None else sequence
+    with open(path, 'w') as handle:
+        for i, ((x, y, z), b, aa) in enumerate(zip(structure, bfactor, sequence)):
+            name = index_to_three(one_to_index(aa))
+            handle.write(f"ATOM  {i+1:5d}  CA  {name} {chain}{i+1:4d}    {x:8.3f}{y:8.3f}{z:8.3f}{1.0:6.2f}{b:6.2f}           C\n")
+        handle.write("END\n")
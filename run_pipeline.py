@@ -0,0 +1,355 @@
+"""Incremental runner for the data preparation pipeline.
+
+Runs the same steps as prepare_input_data.sh and run_preparation_pipeline.sh,
+but each stage declares the files it reads and writes. A stage is skipped
+when the content of its inputs, its command and its outputs are unchanged
+since its last successful run, and stages that do not depend on each other
+run concurrently. Each stage logs to logs/<stage>.log, and a per-stage
+timing summary is written to logs/pipeline_timings.tsv.
+
+Usage:
+    python run_pipeline.py input_data.xlsx [--stages ...] [--fold] [--jobs N]
+        [--force] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+STATE_FILE = PROJECT_ROOT / "intermediate_files" / ".pipeline_state.json"
+LOG_DIR = PROJECT_ROOT / "logs"
+STATE_VERSION = 1
+
+
+class Stage:
+    def __init__(self, name, command, inputs, outputs, description=''):
+        """One step of the pipeline
+
+        Args:
+            name (str): Name of the stage, also used for its log file
+            command (list): Command line, run from the project root
+            inputs (list): Files and directories the stage reads, relative to the
+                project root. Missing inputs are allowed and hash as missing.
+            outputs (list): Files and directories the stage writes
+            description (str, optional): Printed when the stage starts
+        """
+        self.name = name
+        self.command = [str(c) for c in command]
+        self.inputs = [str(p) for p in inputs]
+        self.outputs = [str(p) for p in outputs]
+        self.description = description
+
+    def __repr__(self):
+        return f"Stage({self.name})"
+
+
+def pipeline_stages(input_file):
+    """The stages of the data preparation pipeline, in the order of the
+    shell scripts
+
+    Args:
+        input_file (str): Excel sheet of receptors and ligands
+
+    Returns:
+        list: Stage objects
+    """
+    input_file = os.path.relpath(os.path.abspath(input_file), PROJECT_ROOT)
+    fasta = "intermediate_files/receptor_full_length.fasta"
+    fold_queue = "intermediate_files/receptor_to_fold.fasta"
+    colabfold = "intermediate_files/receptor_only"
+    fold_store = "LRR_Annotation/cache/folds"
+    lrr_results = "intermediate_files/lrr_annotation_results.txt"
+    lrr_cache = ["LRR_Annotation/cache/store", "LRR_Annotation/cache/structures"]
+    lrr_fasta = "intermediate_files/lrr_domain_sequences.fasta"
+    test_data = "intermediate_files/test_data.csv"
+    return [
+        Stage('convert_sheet', [sys.executable, 'scripts/01_convert_sheet_to_fasta.py', input_file],
+              inputs=[input_file, 'scripts/01_convert_sheet_to_fasta.py'],
+              outputs=[fasta, 'intermediate_files/receptor_sheet_mapping.tsv'],
+              description="Creating fasta file for AlphaFold modeling"),
+        # the structure store is not an input: it only grows, and listing it
+        # would make this stage depend on lrr_annotation, which writes it
+        Stage('fold_queue', [sys.executable, 'scripts/02_alphafold_to_lrr_annotation.py', '--fold-queue'],
+              inputs=['scripts/02_alphafold_to_lrr_annotation.py', fasta],
+              outputs=[fold_queue],
+              description="Listing receptors missing from the structure store"),
+        # ColabFold is only started if some receptor was never folded
+        Stage('fold', ['sh', '-c', 'test ! -s "$0" || colabfold_batch --num-models 1 "$0" "$1"', fold_queue, colabfold],
+              inputs=[fold_queue],
+              outputs=[colabfold],
+              description="Running AlphaFold to model the receptor sequences"),
+        Stage('lrr_annotation', [sys.executable, 'scripts/02_alphafold_to_lrr_annotation.py'],
+              inputs=['scripts/02_alphafold_to_lrr_annotation.py', 'LRR_Annotation/geom_lrr', 'LRR_Annotation/extract_lrr_sequences.py', fasta, colabfold],
+              outputs=[lrr_results, 'intermediate_files/alphafold_scores.txt', fold_store] + lrr_cache,
+              description="Running LRR-Annotation to extract LRRs from receptor sequence"),
+        Stage('parse_lrr_annotation', [sys.executable, 'scripts/03_parse_lrr_annotation.py'],
+              inputs=['scripts/03_parse_lrr_annotation.py', fasta, lrr_results],
+              outputs=[lrr_fasta]),
+        Stage('bfactor_peaks', [sys.executable, 'LRR_Annotation/analyze_bfactor_peaks.py'],
+              inputs=['LRR_Annotation/analyze_bfactor_peaks.py', 'LRR_Annotation/geom_lrr'] + lrr_cache,
+              outputs=['intermediate_files/bfactor_winding_lrr_segments.csv'],
+              description="Generating bandpass b-factor values"),
+        Stage('data_prep', [sys.executable, 'scripts/04_data_prep_for_prediction.py', input_file],
+              inputs=['scripts/04_data_prep_for_prediction.py', input_file, lrr_fasta],
+              outputs=[test_data],
+              description="Preparing data for prediction"),
+        Stage('chemical_conversion', ['Rscript', 'scripts/05_chemical_conversion.R', 'test_data.csv'],
+              inputs=['scripts/05_chemical_conversion.R', test_data],
+              outputs=['intermediate_files/ready_test_data.csv']),
+    ]
+
+
+def contains(parent, path):
+    """Whether `path` is `parent` or lies inside it"""
+    return path == parent or path.startswith(parent.rstrip('/') + '/')
+
+
+def dependencies(stages):
+    """Stages each stage waits for: those writing any of its inputs
+
+    Returns:
+        dict: Names of the upstream stages of each stage
+    """
+    deps = {}
+    for stage in stages:
+        deps[stage.name] = {
+            other.name for other in stages if other is not stage and
+            any(contains(output, path) or contains(path, output) for output in other.outputs for path in stage.inputs)
+        }
+    return deps
+
+
+class ContentHasher:
+    def __init__(self, memo=None):
+        """Hashes files and directories by content. File digests are
+        remembered with the size and modification time they were computed
+        at, so unchanged files are not read again
+
+        Args:
+            memo (dict, optional): Digests of earlier runs, keyed by path
+        """
+        self.memo = memo if memo is not None else {}
+
+    def file(self, path):
+        stat = os.stat(path)
+        cached = self.memo.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        self.memo[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def path(self, path):
+        """Digest of a file, of every file under a directory, or 'missing'"""
+        full = str(PROJECT_ROOT / path)
+        if os.path.isfile(full):
+            return self.file(full)
+        if not os.path.isdir(full):
+            return 'missing'
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(full):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for filename in sorted(files):
+                if filename.endswith('.pyc'):
+                    continue
+                name = os.path.join(root, filename)
+                h.update(os.path.relpath(name, full).encode())
+                h.update(self.file(name).encode())
+        return h.hexdigest()
+
+    def signature(self, stage):
+        """Hash of the command and the content of every input of a stage"""
+        h = hashlib.sha256()
+        # the interpreter path is not part of the signature, so switching
+        # environments does not rerun everything
+        h.update(json.dumps(['python' if c == sys.executable else c for c in stage.command]).encode())
+        for path in stage.inputs:
+            h.update(path.encode())
+            h.update(self.path(path).encode())
+        return h.hexdigest()
+
+    def outputs(self, stage):
+        return {path: self.path(path) for path in stage.outputs}
+
+
+def load_state():
+    if STATE_FILE.exists():
+        with open(STATE_FILE) as handle:
+            state = json.load(handle)
+        if state.get('version') == STATE_VERSION:
+            return state
+    return dict(version=STATE_VERSION, stages={}, files={})
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_suffix('.tmp')
+    with open(tmp, 'w') as handle:
+        json.dump(state, handle, indent=1)
+    os.replace(tmp, STATE_FILE)
+
+
+def is_up_to_date(stage, state, hasher, signature):
+    """A stage is up to date if it last succeeded with the same inputs and
+    its outputs are still the ones it wrote"""
+    record = state['stages'].get(stage.name)
+    if record is None or record['signature'] != signature:
+        return False
+    outputs = hasher.outputs(stage)
+    return 'missing' not in outputs.values() and outputs == record['outputs']
+
+
+def run_stage(stage):
+    """Runs a stage, logging its output to logs/<stage>.log
+
+    Returns:
+        list: Exit code and wall time in seconds
+    """
+    LOG_DIR.mkdir(exist_ok=True)
+    for output in stage.outputs:
+        parent = PROJECT_ROOT / output if not Path(output).suffix else (PROJECT_ROOT / output).parent
+        parent.mkdir(parents=True, exist_ok=True)
+    tic = time.perf_counter()
+    with open(LOG_DIR / f"{stage.name}.log", 'w') as log:
+        try:
+            code = subprocess.run(stage.command, cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT).returncode
+        except OSError as e:
+            log.write(f"{e}\n")
+            code = 127
+    return code, time.perf_counter() - tic
+
+
+def run_pipeline(stages, jobs=2, force=False, dry_run=False):
+    """Runs the stages in dependency order, skipping those that are up to
+    date and running independent ones concurrently. A failed stage stops
+    its downstream stages, but not independent ones.
+
+    Args:
+        stages (list): Stages to run; stages outside the list are treated as
+            up to date, and their outputs as plain inputs
+        jobs (int, optional): Stages run at once. Defaults to 2.
+        force (bool, optional): Run every stage even if it is up to date. Defaults to False.
+        dry_run (bool, optional): Only report which stages would run. Defaults to False.
+
+    Returns:
+        list: (stage name, status, seconds) of every stage, in completion order
+    """
+    state = load_state()
+    hasher = ContentHasher(state['files'])
+    deps = dependencies(stages)
+    remaining = {stage.name: stage for stage in stages}
+    status = {}
+    timings = []
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while remaining or running:
+            for name, stage in list(remaining.items()):
+                if any(status.get(dep) == 'failed' or status.get(dep) == 'blocked' for dep in deps[name]):
+                    print(f"Skipping {name}: an upstream stage failed")
+                    status[name] = 'blocked'
+                    timings.append((name, 'blocked', 0.0))
+                    del remaining[name]
+                    continue
+                if any(dep in remaining or dep in running.values() for dep in deps[name]):
+                    continue
+                del remaining[name]
+                tic = time.perf_counter()
+                signature = hasher.signature(stage)
+                # in a dry run upstream outputs are not rewritten, so a stage
+                # reading them is stale whenever an upstream stage would run
+                upstream_stale = dry_run and any(status.get(dep) == 'would run' for dep in deps[name])
+                if not force and not upstream_stale and is_up_to_date(stage, state, hasher, signature):
+                    print(f"Up to date: {name}")
+                    status[name] = 'skipped'
+                    timings.append((name, 'skipped', time.perf_counter() - tic))
+                    continue
+                if dry_run:
+                    print(f"Would run: {name}: {' '.join(stage.command)}")
+                    status[name] = 'would run'
+                    timings.append((name, 'would run', 0.0))
+                    continue
+                print(f"{stage.description}..." if stage.description else f"Running {name}...")
+                future = pool.submit(run_stage, stage)
+                future.signature = signature
+                running[future] = name
+
+            if not running:
+                if remaining:
+                    raise RuntimeError(f"Stages wait on each other: {', '.join(remaining)}")
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                code, seconds = future.result()
+                if code == 0:
+                    state['stages'][name] = dict(signature=future.signature, outputs=hasher.outputs(next(s for s in stages if s.name == name)))
+                    save_state(state)
+                    status[name] = 'ran'
+                    print(f"Completed {name} successfully ({seconds:.1f} s).")
+                else:
+                    state['stages'].pop(name, None)
+                    save_state(state)
+                    status[name] = 'failed'
+                    print(f"Error: {name} failed. Check {LOG_DIR / (name + '.log')} for details.")
+                timings.append((name, status[name], seconds))
+    if not dry_run:
+        save_state(state)
+    return timings
+
+
+def write_timings(timings, path):
+    """Writes and prints the per-stage timing summary"""
+    path.parent.mkdir(exist_ok=True)
+    with open(path, 'w') as handle:
+        handle.write("stage\tstatus\tseconds\n")
+        for name, status, seconds in timings:
+            handle.write(f"{name}\t{status}\t{seconds:.3f}\n")
+    print("----------------------------------------")
+    for name, status, seconds in timings:
+        print(f"{name:25s} {status:10s} {seconds:10.1f} s")
+    print(f"Timing summary written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input_file', help='Excel sheet of receptors and ligands')
+    parser.add_argument('--stages', nargs='+', help='Stages to consider (default: all but fold)')
+    parser.add_argument('--fold', action='store_true', help='Also run ColabFold on the receptors missing from the structure store')
+    parser.add_argument('--jobs', type=int, default=2, help='Stages run concurrently')
+    parser.add_argument('--force', action='store_true', help='Rerun stages even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the stages that would run')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.input_file):
+        print(f"Error: File '{args.input_file}' does not exist")
+        sys.exit(1)
+
+    stages = pipeline_stages(args.input_file)
+    names = [stage.name for stage in stages]
+    selected = args.stages or [name for name in names if name != 'fold' or args.fold]
+    unknown = set(selected) - set(names)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}. Choose from {', '.join(names)}")
+    stages = [stage for stage in stages if stage.name in selected]
+
+    print(f"Running data preparation pipeline with input file: {args.input_file}")
+    timings = run_pipeline(stages, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    write_timings(timings, LOG_DIR / 'pipeline_timings.tsv')
+    if any(status in ('failed', 'blocked') for _, status, _ in timings):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
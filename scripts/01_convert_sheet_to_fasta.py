@@ -0,0 +1,176 @@
+#-----------------------------------------------------------------------------------------------
+# Krasileva Lab - Plant & Microbial Biology Department UC Berkeley
+# Author: Danielle M. Stevens
+# Last Updated: 07/06/2020
+# Script Purpose:
+# Inputs:
+# Outputs:
+#-----------------------------------------------------------------------------------------------
+"""
+Converts the receptor sheet of an input workbook into a FASTA file for AlphaFold.
+
+Streaming version of 01_convert_sheet_to_fasta.R. Rows of Sheet1 are read one at
+a time from the workbook in read-only mode, and each receptor is written to the
+FASTA file as soon as its sequence is first seen, so the sheet is never held in
+memory. Receptors are deduplicated by a hash of their sequence, keeping the first
+row, as `distinct(Sequence, .keep_all = TRUE)` does in the R script.
+
+Headers match the R script: cells are trimmed as readxl does, empty cells are
+written as NA, and numbers, booleans and dates are formatted as R's `paste`
+formats them (1 rather than 1.0, 1e+05, TRUE). Sequences differ from the R
+script in two ways:
+- whitespace inside a sequence (e.g. a line break pasted into the cell) is
+  removed, and the sequence is deduplicated without it, so the FASTA record
+  stays on one line; the R script keeps it and treats such copies as distinct
+- rows without a sequence are skipped with a warning, where the R script writes
+  the first of them with the sequence NA, which would be folded as a protein
+
+Input Files Required:
+- input_excel.xlsx: Sheet1 with columns
+  plant_species | receptor | locus_id | receptor_sequence | ligand_sequence
+
+Output:
+- intermediate_files/receptor_full_length.fasta: one record per distinct receptor
+  sequence, with headers >plant_species|locus_id|receptor
+- intermediate_files/receptor_sheet_mapping.tsv: every sheet row with the hash of
+  its receptor sequence and the FASTA header of its canonical receptor
+
+Usage:
+    python scripts/01_convert_sheet_to_fasta.py input_data.xlsx
+"""
+
+import argparse
+import datetime
+import hashlib
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import openpyxl
+
+HEADER_COLUMNS = ['plant_species', 'locus_id', 'receptor']
+SEQUENCE_COLUMN = 'receptor_sequence'
+MAPPING_COLUMNS = ['row', 'plant_species', 'locus_id', 'receptor', 'sequence_hash', 'canonical_header']
+
+
+########################################################################################
+# Read the rows of a sheet as dictionaries keyed by the names in its first row.
+# Workbooks opened read-only are parsed lazily, so only the current row is in memory.
+########################################################################################
+
+def iter_sheet_rows(excel_path, sheet_name='Sheet1'):
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        names = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+        missing = [name for name in HEADER_COLUMNS + [SEQUENCE_COLUMN] if name not in names]
+        if missing:
+            raise ValueError(f"{excel_path} ({sheet_name}) is missing columns: {', '.join(missing)}")
+        # row 1 holds the column names, so data rows are numbered from 2 as in Excel
+        for number, values in enumerate(rows, start=2):
+            if values is None or all(value is None for value in values):
+                continue
+            yield number, dict(zip(names, values))
+    finally:
+        workbook.close()
+
+
+def r_number(value):
+    """Text R's `paste` gives a double: 15 significant digits, in scientific
+    notation when that is shorter, e.g. 1, 0.3, 123456 and 1e+05"""
+    fixed = format(Decimal(f"{value:.15g}"), 'f')
+    mantissa, exponent = f"{value:.14e}".split('e')
+    if '.' in mantissa:
+        mantissa = mantissa.rstrip('0').rstrip('.')
+    scientific = f"{mantissa}e{int(exponent):+03d}"
+    return fixed if len(fixed) <= len(scientific) else scientific
+
+
+def cell_text(value):
+    """Text of a cell as the R script writes it: read by readxl, which trims
+    whitespace and reads empty cells as NA, and formatted by `paste`"""
+    if value is None:
+        return 'NA'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return r_number(float(value))
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d' if value.time() == datetime.time() else '%Y-%m-%d %H:%M:%S')
+    text = str(value).strip()
+    return text if text else 'NA'
+
+
+def sequence_hash(sequence):
+    """Hash identifying a receptor sequence, the key receptors are
+    deduplicated by. Sequences are hashed without whitespace, as
+    `sequence_key` of the fold store hashes them."""
+    return hashlib.sha256(sequence.encode()).hexdigest()
+
+
+########################################################################################
+# Stream the sheet into the FASTA file and the row mapping.
+# Returns: Dict with the number of rows read, receptors written, duplicates and rows skipped
+########################################################################################
+
+def convert_sheet_to_fasta(excel_path, fasta_path, mapping_path=None, sheet_name='Sheet1'):
+    canonical = {}  # sequence hash -> header of the first row with that sequence
+    counts = dict(rows=0, receptors=0, duplicates=0, skipped=0)
+
+    fasta_path = Path(fasta_path)
+    fasta_path.parent.mkdir(parents=True, exist_ok=True)
+    mapping = None
+    with open(fasta_path, 'w') as fasta:
+        try:
+            if mapping_path is not None:
+                mapping = open(mapping_path, 'w')
+                mapping.write('\t'.join(MAPPING_COLUMNS) + '\n')
+
+            for number, row in iter_sheet_rows(excel_path, sheet_name):
+                counts['rows'] += 1
+                fields = [cell_text(row.get(name)) for name in HEADER_COLUMNS]
+                sequence = row.get(SEQUENCE_COLUMN)
+                sequence = ''.join(str(sequence).split()) if sequence is not None else ''
+                if not sequence:
+                    print(f"Warning: row {number} has no receptor sequence, skipping")
+                    counts['skipped'] += 1
+                    continue
+
+                digest = sequence_hash(sequence)
+                header = canonical.get(digest)
+                if header is None:
+                    header = '|'.join(fields)
+                    canonical[digest] = header
+                    fasta.write(f">{header}\n{sequence}\n")
+                    counts['receptors'] += 1
+                else:
+                    counts['duplicates'] += 1
+
+                if mapping is not None:
+                    mapping.write('\t'.join([str(number)] + fields + [digest, header]) + '\n')
+        finally:
+            if mapping is not None:
+                mapping.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_file', help='Excel workbook of receptors and ligands')
+    parser.add_argument('--sheet', default='Sheet1', help='Sheet holding the receptors (default: Sheet1)')
+    parser.add_argument('--output', default='./intermediate_files/receptor_full_length.fasta',
+                        help='FASTA file to write (default: %(default)s)')
+    parser.add_argument('--mapping', default='./intermediate_files/receptor_sheet_mapping.tsv',
+                        help='Row to receptor mapping to write (default: %(default)s)')
+    args = parser.parse_args()
+
+    if not Path(args.input_file).is_file():
+        sys.exit(f"Error: File '{args.input_file}' does not exist")
+
+    counts = convert_sheet_to_fasta(args.input_file, args.output, args.mapping, sheet_name=args.sheet)
+    print(f"Read {counts['rows']} rows: wrote {counts['receptors']} receptors to {args.output} "
+          f"({counts['duplicates']} duplicate sequences, {counts['skipped']} rows without a sequence)")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,13 +17,71 @@ project_root = Path(__file__).parent.parent
 lrr_annotation_path = project_root / "LRR_Annotation"
 sys.path.append(str(lrr_annotation_path))
 
-from geom_lrr import Loader, Analyzer, Plotter
+from geom_lrr import Loader, Analyzer, Plotter, ProteinCache, FoldStore, backend_info
 from extract_lrr_sequences import LRRSequenceExtractor
 
 
+def read_fasta(fasta_file):
+    """
+    Read a FASTA file into a dictionary keyed by the name ColabFold gives
+    each query, which is the header with every character other than
+    letters, digits, '_', '.' and '-' replaced by '_'.
+
+    Args:
+        fasta_file (Path): Path to the FASTA file
+
+    Returns:
+        dict: Dictionary mapping receptor names to (header, sequence)
+    """
+    records = {}
+    header = None
+    sequence = []
+    with open(fasta_file) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('>'):
+                if header is not None:
+                    records[colabfold_name(header)] = (header, ''.join(sequence))
+                header = line[1:]
+                sequence = []
+            elif line:
+                sequence.append(line)
+    if header is not None:
+        records[colabfold_name(header)] = (header, ''.join(sequence))
+    return records
+
+def colabfold_name(header):
+    """Name ColabFold uses for a query with this FASTA header"""
+    return ''.join(c if c.isalnum() or c in '_.-' else '_' for c in header)
+
+def write_fold_queue(records, store, output_file):
+    """
+    Write the receptors that are not in the structure store to a FASTA
+    file, so only those are folded.
+
+    Args:
+        records (dict): Dictionary mapping receptor names to (header, sequence)
+        store (FoldStore): Store of earlier folds
+        output_file (Path): FASTA file to write
+    """
+    sequences = {name: sequence for name, (header, sequence) in records.items()}
+    missing = store.missing(sequences)
+    with open(output_file, 'w') as f:
+        for name in missing:
+            header, sequence = records[name]
+            f.write(f">{header}\n{sequence}\n")
+    print(f"{len(missing)} of {len(records)} receptors need folding, written to {output_file}")
+    return missing
+
+MODEL_NUMBER = re.compile(r'model_(\d+)')
+PLDDT = re.compile(r'pLDDT=(\d+\.?\d*)')
+PTM = re.compile(r'pTM=(\d+\.?\d*)')
+MODEL_FILE = re.compile(r'^(?P<receptor>.+)_unrelaxed_rank_\d+_alphafold2_ptm_model_(?P<model>\d+)_seed_\d+\.pdb(\.gz)?$')
+
 def parse_alphafold_log(log_file):
     """
-    Parse AlphaFold log file to extract final pLDDT and pTM scores for each model.
+    Parse AlphaFold log file to extract final pLDDT and pTM scores for each
+    model. The log is read line by line, so its size does not matter.
     
     Args:
         log_file (Path): Path to the log.txt file
@@ -37,23 +95,21 @@ def parse_alphafold_log(log_file):
     print(f"Parsing AlphaFold log file: {log_file}")
     
     with open(log_file, 'r') as f:
-        lines = f.readlines()
-            
-        for line in lines:
+        for line in f:
             if "Query" in line and "length" in line:
                 current_receptor = line.split("Query")[1].split(":")[1].split("(")[0].strip()
                 results[current_receptor] = {}
                 continue
                 
             if "alphafold2_ptm_model_" in line and "took" not in line:
-                model_match = re.search(r'model_(\d+)', line)
+                model_match = MODEL_NUMBER.search(line)
                 if not model_match:
                     continue
                     
                 model_num = model_match.group(1)
                 
-                plddt_match = re.search(r'pLDDT=(\d+\.?\d*)', line)
-                ptm_match = re.search(r'pTM=(\d+\.?\d*)', line)
+                plddt_match = PLDDT.search(line)
+                ptm_match = PTM.search(line)
                 
                 if plddt_match and ptm_match:
                     plddt = float(plddt_match.group(1))
@@ -93,57 +149,215 @@ def write_results(results, output_file):
     return {receptor: max(models.items(), key=lambda x: x[1]['plddt'])[0] 
             for receptor, models in results.items()}
 
+def index_models(source_dir):
+    """
+    Index the ColabFold output directory in one pass.
+
+    Args:
+        source_dir (Path): Directory containing AlphaFold output
+
+    Returns:
+        dict: Dictionary mapping receptor names to model numbers to the
+        paths of their PDB files (.pdb or .pdb.gz), in name order
+    """
+    index = {}
+    with os.scandir(source_dir) as entries:
+        matches = sorted((entry.name, MODEL_FILE.match(entry.name)) for entry in entries if entry.is_file())
+    for name, match in matches:
+        if match:
+            models = index.setdefault(match.group('receptor'), {})
+            models.setdefault(match.group('model'), []).append(source_dir / name)
+    return index
+
+def link_model(source_path, target_path):
+    """
+    Make `target_path` refer to `source_path`: a hard link if both are on
+    the same file system, else a symbolic link, else a copy.
+    """
+    if target_path.is_symlink() or target_path.exists():
+        target_path.unlink()
+    try:
+        os.link(source_path, target_path)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(source_path.resolve(), target_path)
+        return
+    except OSError:
+        pass
+    shutil.copy2(source_path, target_path)
+
 def copy_best_models(best_models, source_dir, target_dir):
     """
-    Copy the best model PDB files to the target directory.
+    Link the best model PDB files into the target directory, copying them
+    only where links cannot be made.
     
     Args:
         best_models (dict): Dictionary mapping receptor names to their best model numbers
         source_dir (Path): Directory containing AlphaFold output
-        target_dir (Path): Directory to copy best models to
+        target_dir (Path): Directory to link best models into
     """
     target_dir.mkdir(parents=True, exist_ok=True)
     
-    # First, get all PDB files in source directory
-    all_pdb_files = list(source_dir.glob("*.pdb"))
-    print(f"\nFound {len(all_pdb_files)} total PDB files in {source_dir}")
+    # First, index all PDB files in source directory
+    index = index_models(source_dir)
+    print(f"\nFound {sum(len(paths) for models in index.values() for paths in models.values())} model PDB files in {source_dir}")
     print("\nExpected to find files for these receptors:")
     for receptor in sorted(best_models.keys()):
         print(f"- {receptor} (model_{best_models[receptor]})")
     
-    # Continue with copying
+    # Continue with linking
     for receptor, model_num in best_models.items():
-        # Modified pattern to handle rank with leading zeros
-        file_pattern = f"{receptor}_unrelaxed_rank_[0-9][0-9][0-9]_alphafold2_ptm_model_{model_num}_seed_*.pdb"
-        
-        matching_files = list(source_dir.glob(file_pattern))
+        matching_files = index.get(receptor, {}).get(model_num, [])
         
         if not matching_files:
-            print(f"Warning: Could not find model file for {receptor} matching pattern {file_pattern}")
+            print(f"Warning: Could not find model file for {receptor} (model_{model_num})")
             continue
             
         if len(matching_files) > 1:
             print(f"Warning: Multiple matching files found for {receptor}, using first match")
             
         source_path = matching_files[0]
-        target_path = target_dir / f"{receptor}.pdb"
-        shutil.copy2(source_path, target_path)
+        # gzipped models keep their suffix, which Loader.load_batch also reads
+        suffix = '.pdb.gz' if source_path.name.endswith('.gz') else '.pdb'
+        target_path = target_dir / f"{receptor}{suffix}"
+        # a model of the other kind left by an earlier run would load under the same key
+        stale = target_dir / f"{receptor}{'.pdb' if suffix == '.pdb.gz' else '.pdb.gz'}"
+        if stale.is_symlink() or stale.exists():
+            stale.unlink()
+        link_model(source_path, target_path)
 
-def run_lrr_annotation(pdb_directory):
-    """Run LRR annotation on the PDB files."""
-    # Initialize objects
+def same_sequence(residues, sequence):
+    """Whether the CA residues read from a model match the folded
+    sequence, allowing 'X' for residues `parse_pdb` does not know"""
+    sequence = sequence.upper()
+    return len(residues) == len(sequence) and all(a == b or a == 'X' for a, b in zip(residues, sequence))
+
+def store_new_models(L, results, best_models, records, store):
+    """
+    Add newly folded models to the structure store, keyed by the sequence
+    they were folded from. Models whose residues do not match the
+    receptor's sequence, e.g. stale output of an earlier sheet that reused
+    a receptor name, are skipped.
+
+    Args:
+        L (Loader): Loader holding the new models
+        results (dict): Scores parsed from the ColabFold log
+        best_models (dict): Dictionary mapping receptor names to their best model numbers
+        records (dict): Dictionary mapping receptor names to (header, sequence)
+        store (FoldStore): Store to add the models to
+    """
+    stored = 0
+    for receptor, structure in L.structures.items():
+        sequence = records[receptor][1]
+        if not same_sequence(L.sequences[receptor], sequence):
+            print(f"Warning: Model of {receptor} does not match its sequence, not storing it")
+            continue
+        model_num = best_models[receptor]
+        scores = results[receptor][model_num]
+        store.put(sequence, structure, L.bfactors[receptor], L.sequences[receptor],
+                  receptor, model_num, scores['plddt'], scores['ptm'])
+        stored += 1
+    print(f"Stored {stored} new models in {store.directory}")
+
+def load_from_store(records, store):
+    """
+    Assemble the structures and ColabFold scores of every receptor from the
+    structure store.
+
+    Args:
+        records (dict): Dictionary mapping receptor names to (header, sequence)
+        store (FoldStore): Store of folded structures
+
+    Returns:
+        list: Loader holding the structures, b-factors and sequences, and
+        the scores in the layout of `parse_alphafold_log`
+    """
+    L = Loader()
+    results = {}
+    for receptor in sorted(records):
+        entry = store.get(records[receptor][1])
+        if entry is None:
+            print(f"Warning: No folded model for {receptor}")
+            continue
+        L.store(receptor, entry)
+        results[receptor] = {entry['model']: {'plddt': entry['plddt'], 'ptm': entry['ptm']}}
+    return L, results
+
+def best_model_selector(best_models):
+    """
+    Member selection for `Loader.load_batch` and `Loader.load_archive`
+    that keeps the best model of each receptor, as `copy_best_models` does,
+    so the models can be read from the ColabFold output in place.
+
+    Args:
+        best_models (dict): Dictionary mapping receptor names to their best model numbers
+
+    Returns:
+        callable: Maps a file or member name to its receptor, or to None
+    """
+    chosen = set()
+
+    def select(name):
+        match = MODEL_FILE.match(os.path.basename(name))
+        if not match or best_models.get(match.group('receptor')) != match.group('model'):
+            return None
+        receptor = match.group('receptor')
+        if receptor in chosen:
+            print(f"Warning: Multiple matching files found for {receptor}, using first match")
+            return None
+        chosen.add(receptor)
+        return receptor
+    return select
+
+def find_archive(source_dir):
+    """Archive of the ColabFold output next to `source_dir`, e.g.
+    receptor_only.tar.gz, or None"""
+    for suffix in ('.tar', '.tar.gz', '.tgz', '.zip'):
+        archive = source_dir.parent / (source_dir.name + suffix)
+        if archive.exists():
+            return archive
+    return None
+
+def load_best_models(best_models, source_dir):
+    """
+    Load the best model of each receptor straight from the ColabFold
+    output, streaming it from an archive if there is one.
+
+    Args:
+        best_models (dict): Dictionary mapping receptor names to their best model numbers
+        source_dir (Path): Directory containing AlphaFold output
+
+    Returns:
+        Loader: Loader holding the structures, b-factors and sequences
+    """
     L = Loader()
+    select = best_model_selector(best_models)
+    archive = find_archive(source_dir)
+    if archive is not None:
+        print(f"Reading models from {archive}")
+        L.load_archive(str(archive), select=select, workers=None)
+    else:
+        L.load_batch(str(source_dir), select=select, workers=None)
+
+    for receptor in sorted(set(best_models) - set(L.structures) - set(L.errors)):
+        print(f"Warning: Could not find model file for {receptor} (model_{best_models[receptor]})")
+    return L
+
+def run_lrr_annotation(L):
+    """Run LRR annotation on the structures of a Loader."""
+    # Initialize objects
     A = Analyzer()
     P = Plotter()
     sequence_extractor = LRRSequenceExtractor()
 
-    # Load structures
-    L.load_batch(str(pdb_directory))
-    
-    # Analyze geometry
+    # Analyze geometry, reusing results of unchanged structures from earlier runs
+    cache_dir = Path('./LRR_Annotation/cache')
+    protein_cache = ProteinCache(str(cache_dir / 'proteins'))
     A.load_structures(L.structures)
-    A.compute_windings()
-    A.compute_regressions()
+    A.compute_windings(cache=protein_cache)
+    A.compute_regressions(cache=protein_cache)
 
     # Extract LRR sequences
     output_file = Path('./intermediate_files/lrr_annotation_results.txt')
@@ -152,14 +366,13 @@ def run_lrr_annotation(pdb_directory):
         f.write("PDB_Filename\tRegion_Number\tStart_Position\tEnd_Position\tSequence_Length\tFull_Sequence_Length\tTotal_LRR_Regions\tSequence\n")
     
     for pdb_id, breakpoints in A.breakpoints.items():
-        pdb_file = pdb_directory / f"{pdb_id}.pdb"
-        pdb_filename = pdb_file.name
+        pdb_filename = f"{pdb_id}.pdb"
         
-        if not pdb_file.exists():
-            print(f"Warning: PDB file not found for {pdb_id}")
+        if pdb_id not in L.sequences:
+            print(f"Warning: Sequence not found for {pdb_id}")
             continue
             
-        results = sequence_extractor.analyze_lrr_regions(str(pdb_file), breakpoints)
+        results = sequence_extractor.analyze_lrr_sequence(L.sequences[pdb_id], breakpoints)
         
         with open(output_file, 'a') as f:
             for i, (seq, (start, end)) in enumerate(zip(results['lrr_sequences'], 
@@ -167,17 +380,18 @@ def run_lrr_annotation(pdb_directory):
                 f.write(f"{pdb_filename}\t{i+1}\t{start}\t{end}\t{len(seq)}\t{results['sequence_length']}\t{results['num_lrr_regions']}\t{seq}\n")
 
     # Cache data
-    cache_dir = Path('./LRR_Annotation/cache')
     cache_dir.mkdir(parents=True, exist_ok=True)
     L.cache(str(cache_dir))
+    L.cache_store(str(cache_dir / 'structures'))
     A.cache_geometry(str(cache_dir))
     A.cache_regressions(str(cache_dir))
+    A.cache_store(str(cache_dir / 'store'))
 
     # Generate plots
     P.load(A.windings, A.breakpoints, A.slopes)
     plot_dir = Path('./intermediate_files/lrr_annotation_plots')
     plot_dir.mkdir(parents=True, exist_ok=True)
-    P.plot_regressions(save=True, directory=str(plot_dir))
+    P.render_regressions(str(plot_dir), workers=None)
 
 def main():
     # Set up paths
@@ -185,26 +399,54 @@ def main():
     #log_file = Path(sys.argv[1]) if len(sys.argv) > 1 else sys.exit("Error: Please provide the path to the ColabFold log.txt file as an argument")
     log_file = project_root / "intermediate_files" / "receptor_only" / "log.txt"
     scores_file = project_root / "intermediate_files" / "alphafold_scores.txt"
+    fasta_file = project_root / "intermediate_files" / "receptor_full_length.fasta"
+    queue_file = project_root / "intermediate_files" / "receptor_to_fold.fasta"
+    store = FoldStore(project_root / "LRR_Annotation" / "cache" / "folds")
     
     # Source and target directories for PDB files
     source_dir = project_root / "intermediate_files"  / "receptor_only"
     target_dir = project_root / "intermediate_files"  / "pdb_for_lrr_annotator"
     
-    if not log_file.exists():
+    records = read_fasta(fasta_file) if fasta_file.exists() else None
+
+    # Before folding: list the receptors that were never folded
+    if '--fold-queue' in sys.argv[1:]:
+        if records is None:
+            print(f"Error: FASTA file not found at {fasta_file}")
+            sys.exit(1)
+        write_fold_queue(records, store, queue_file)
+        return
+
+    if not log_file.exists() and records is None:
         print(f"Error: Log file not found at {log_file}")
         return
         
-    # Step 1: Parse AlphaFold results and get best models
-    results = parse_alphafold_log(log_file)
-    best_models = write_results(results, scores_file)
-    print(f"AlphaFold scores written to {scores_file}")
+    # Step 1: Parse AlphaFold results and get best models of new folds
+    results = parse_alphafold_log(log_file) if log_file.exists() else {}
+    results = {receptor: models for receptor, models in results.items()
+               if models and (records is None or receptor in records)}
+    best_models = {receptor: max(models.items(), key=lambda x: x[1]['plddt'])[0]
+                   for receptor, models in results.items()}
     
-    # Step 2: Copy best models to target directory
-    copy_best_models(best_models, source_dir, target_dir)
-    print("Best models copied to target directory")
+    # Step 2: Load best models in place; copying them is only needed to
+    # keep PDB files for other tools
+    L = load_best_models(best_models, source_dir) if best_models else Loader()
+    if '--copy-models' in sys.argv[1:]:
+        copy_best_models(best_models, source_dir, target_dir)
+        print("Best models linked into target directory")
+
+    # Step 3: Keep new models in the structure store, and take every
+    # receptor of the sheet from it
+    if records is not None:
+        store_new_models(L, results, best_models, records, store)
+        L, results = load_from_store(records, store)
+    write_results(results, scores_file)
+    print(f"AlphaFold scores written to {scores_file}")
     
-    # Step 3: Run LRR annotation
-    run_lrr_annotation(target_dir)
+    # Step 4: Run LRR annotation
+    kernels = backend_info()
+    print(f"Kernel backend: {kernels['backend']} ({kernels['precision']}); set LRR_KERNEL_BACKEND and LRR_KERNEL_PRECISION to choose")
+    run_lrr_annotation(L)
     print("LRR annotation completed")
 
 if __name__ == '__main__':
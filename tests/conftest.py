@@ -0,0 +1,20 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# the packages are imported as top-level modules, as the scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LRR_Annotation'))
+
+PACKAGES = ['geom_lrr', 'lrr_annot']
+
+
+@pytest.fixture(params=PACKAGES)
+def pkg(request):
+    """Name of each of the two copies of the annotation package"""
+    return request.param
+
+
+def import_module(pkg, name):
+    return importlib.import_module(f'{pkg}.{name}')
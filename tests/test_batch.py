@@ -0,0 +1,73 @@
+import json
+import os
+
+import numpy as np
+
+from conftest import import_module
+
+
+def make_panel(pkg):
+    """Two synthetic solenoids and a fragment too short for a regression"""
+    synthetic = import_module(pkg, 'synthetic')
+    structures = {f'lrr{i}': synthetic.make_solenoid(n_repeats=8, n_term=30, c_term=30, seed=i)['structure'] for i in range(2)}
+    structures['fragment'] = 5 * np.random.default_rng(0).normal(size=(12, 3))
+    return structures
+
+
+def test_round_trip_keeps_survivors_of_a_failed_protein(pkg, tmp_path, capsys):
+    Analyzer = import_module(pkg, 'analyzer').Analyzer
+    analyzer = Analyzer()
+    analyzer.load_structures(make_panel(pkg))
+    analyzer.compute_windings(progress=False)
+    analyzer.compute_regressions(progress=False)
+    assert 'failed to compute regression for fragment' in capsys.readouterr().out
+    assert 'fragment' not in analyzer.breakpoints
+
+    analyzer.cache_store(str(tmp_path))
+    restored = Analyzer()
+    restored.retrieve_store(str(tmp_path))
+
+    assert sorted(restored.structures) == ['fragment', 'lrr0', 'lrr1']
+    assert sorted(restored.windings) == ['fragment', 'lrr0', 'lrr1']
+    assert sorted(restored.breakpoints) == ['lrr0', 'lrr1']
+    assert sorted(restored.slopes) == ['lrr0', 'lrr1']
+    for key in ['lrr0', 'lrr1']:
+        np.testing.assert_array_equal(restored.breakpoints[key], analyzer.breakpoints[key])
+        assert restored.slopes[key] == analyzer.slopes[key]
+        np.testing.assert_allclose(restored.windings[key], analyzer.windings[key])
+
+
+def test_partial_field(pkg, tmp_path):
+    StructureBatch = import_module(pkg, 'batch').StructureBatch
+    structures = {key: np.full((n, 3), n, dtype=float) for key, n in [('a', 3), ('b', 5), ('c', 2)]}
+    batch = StructureBatch.from_dict(structures)
+    batch.add_field('bfactor', {'a': np.arange(3.0), 'c': np.arange(2.0)})
+
+    assert batch.has('bfactor', 'a') and not batch.has('bfactor', 'b')
+    assert list(batch.to_dict('bfactor')) == ['a', 'c']
+    padded, lengths = batch.padded('bfactor')
+    np.testing.assert_array_equal(lengths, [3, 0, 2])
+
+    batch.save(str(tmp_path))
+    opened = StructureBatch.open(str(tmp_path))
+    np.testing.assert_array_equal(opened.field('bfactor', 'c'), [0, 1])
+    assert not opened.has('bfactor', 'b')
+    subset = opened.subset(['b', 'c'])
+    assert list(subset.to_dict('bfactor')) == ['c']
+
+
+def test_opens_version_1_store(pkg, tmp_path):
+    StructureBatch = import_module(pkg, 'batch').StructureBatch
+    batch = StructureBatch.from_dict({'a': np.zeros((4, 3))})
+    batch.add_field('bfactor', {'a': np.ones(4)})
+    batch.save(str(tmp_path))
+    path = os.path.join(str(tmp_path), 'index.json')
+    with open(path) as handle:
+        index = json.load(handle)
+    del index['partial']
+    index['version'] = 1
+    with open(path, 'w') as handle:
+        json.dump(index, handle)
+
+    opened = StructureBatch.open(str(tmp_path))
+    np.testing.assert_array_equal(opened.field('bfactor', 'a'), np.ones(4))
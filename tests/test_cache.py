@@ -0,0 +1,70 @@
+import numpy as np
+
+from conftest import import_module
+from test_batch import make_panel
+
+
+def analyze(pkg, cache):
+    Analyzer = import_module(pkg, 'analyzer').Analyzer
+    analyzer = Analyzer()
+    analyzer.load_structures(make_panel(pkg))
+    analyzer.compute_windings(progress=False, cache=cache)
+    analyzer.compute_regressions(progress=False, cache=cache)
+    return analyzer
+
+
+def test_cached_run_only_recomputes_failures(pkg, tmp_path, monkeypatch):
+    analyzer_module = import_module(pkg, 'analyzer')
+    ProteinCache = import_module(pkg, 'cache').ProteinCache
+    first = analyze(pkg, ProteinCache(tmp_path))
+    assert sorted(first.breakpoints) == ['lrr0', 'lrr1']
+    kinds = [kind for kind, _ in ProteinCache(tmp_path).entries()]
+    assert kinds.count('regression') == 2
+
+    computed = []
+    regression = analyzer_module.compute_lrr_regression
+
+    def counting(winding, *args):
+        computed.append(len(winding))
+        return regression(winding, *args)
+    monkeypatch.setattr(analyzer_module, 'compute_lrr_regression', counting)
+
+    cache = ProteinCache(tmp_path)
+    second = analyze(pkg, cache)
+    # only the fragment, whose failure was not cached, is computed again
+    assert computed == [len(second.windings['fragment'])]
+    assert 'fragment' in second.errors
+    assert sorted(second.breakpoints) == ['lrr0', 'lrr1']
+    for key in ['lrr0', 'lrr1']:
+        np.testing.assert_array_equal(second.breakpoints[key], first.breakpoints[key])
+        assert second.slopes[key] == first.slopes[key]
+        np.testing.assert_allclose(second.windings[key], first.windings[key])
+    # every entry was used by the second run, and nothing is collected
+    assert cache.collect_garbage() == []
+
+
+def test_collect_garbage_defaults_to_dry_run(pkg, tmp_path):
+    ProteinCache = import_module(pkg, 'cache').ProteinCache
+    ProteinCache(tmp_path).store('geometry', 'ab' * 32, winding=np.arange(3.0))
+    cache = ProteinCache(tmp_path)
+    assert cache.collect_garbage() == [('geometry', 'ab' * 32)]
+    assert cache.contains('geometry', 'ab' * 32)
+    assert cache.collect_garbage(dry_run=False) == [('geometry', 'ab' * 32)]
+    assert not cache.contains('geometry', 'ab' * 32)
+
+
+def test_key_depends_on_precision(pkg):
+    kernels = import_module(pkg, 'kernels')
+    ProteinCache = import_module(pkg, 'cache').ProteinCache
+    structure = np.arange(12.0).reshape(4, 3)
+    previous = kernels.CONFIG['precision']
+    try:
+        kernels.set_precision('float64')
+        double = ProteinCache.key([structure], smoothing=20)
+        kernels.set_precision('float32')
+        single = ProteinCache.key([structure], smoothing=20)
+    finally:
+        kernels.CONFIG['precision'] = previous
+    assert double != single
+    # inputs are still hashed at float32, whatever their dtype
+    assert ProteinCache.key([structure.astype(np.float32)], smoothing=20) == ProteinCache.key([structure], smoothing=20)
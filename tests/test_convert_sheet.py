@@ -0,0 +1,45 @@
+import datetime
+import importlib.util
+import os
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', '01_convert_sheet_to_fasta.py')
+
+
+@pytest.fixture(scope='module')
+def convert():
+    spec = importlib.util.spec_from_file_location('convert_sheet_to_fasta', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize('value, text', [
+    (None, 'NA'), ('', 'NA'), ('  FLS2 ', 'FLS2'), (1, '1'), (1.0, '1'), (0.1 + 0.2, '0.3'),
+    (123456, '123456'), (100000, '1e+05'), (0.0001, '1e-04'), (True, 'TRUE'),
+    (datetime.datetime(2020, 7, 6), '2020-07-06'),
+])
+def test_cell_text_matches_paste(convert, value, text):
+    assert convert.cell_text(value) == text
+
+
+def test_convert_sheet(convert, tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Sheet1'
+    sheet.append(['plant_species', 'receptor', 'locus_id', 'receptor_sequence', 'ligand_sequence'])
+    sheet.append(['Solanum', 'FLS2', 1, 'MKL LV\nAA', 'QRL'])
+    sheet.append(['Nicotiana', 'FLS2', 2.0, 'MKLLVAA', 'QRL'])
+    sheet.append(['Arabidopsis', 'EFR', None, None, 'SKE'])
+    sheet.append(['Arabidopsis', 'EFR', 'At5g20480', 'MKLSF', 'SKE'])
+    workbook.save(tmp_path / 'input.xlsx')
+
+    counts = convert.convert_sheet_to_fasta(tmp_path / 'input.xlsx', tmp_path / 'out.fasta', tmp_path / 'mapping.tsv')
+    assert counts == dict(rows=4, receptors=2, duplicates=1, skipped=1)
+    assert (tmp_path / 'out.fasta').read_text() == '>Solanum|1|FLS2\nMKLLVAA\n>Arabidopsis|At5g20480|EFR\nMKLSF\n'
+    rows = [line.split('\t') for line in (tmp_path / 'mapping.tsv').read_text().splitlines()[1:]]
+    assert [row[0] for row in rows] == ['2', '3', '5']
+    assert rows[1][-1] == 'Solanum|1|FLS2'
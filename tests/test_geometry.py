@@ -0,0 +1,230 @@
+import itertools
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN = os.path.join(ROOT, 'LRR_Annotation', 'benchmarks', 'golden.json')
+STRUCTURES = os.path.join(ROOT, 'LRR_Annotation', 'cache', 'structures.pickle')
+SOLANUM = 'Solanum_habrochates_scaffold11_CORE'
+NICOTIANA = 'Nicotiana_benthamiana_Niben101Scf02323g01010_CORE'
+
+# `compute_lrr_winding_laplacian` of the first release: case, breakpoints,
+# final winding and turns between the breakpoints
+LAPLACIAN_BASELINE = [
+    (SOLANUM, [112, 636], 21.561228, 21.351125),
+    (SOLANUM, [79, 632], 22.592167, 22.658194),
+    (NICOTIANA, [112, 636], 21.390083, 21.580267),
+    ('synthetic_20', [80, 560], 18.461339, 18.702557),
+    ('synthetic_80', [80, 2000], 79.407991, 78.999959),
+]
+
+
+######################################################
+##   REFERENCE IMPLEMENTATIONS OF THE FIRST RELEASE  ##
+######################################################
+
+def baseline_winding(structure, smoothing=20):
+    """`compute_winding` as first released, with per-residue Python loops"""
+    from scipy.ndimage import gaussian_filter1d as gf1d
+    X = gf1d(structure, sigma=1, axis=0)
+    Y = gf1d(X, sigma=smoothing, axis=0)
+    dY = gf1d(X, sigma=smoothing, axis=0, order=1)
+    dZ = dY / np.sqrt(np.sum(dY ** 2, axis=1))[:, np.newaxis]
+    V = np.zeros((len(dZ), 2, 3))
+    V[0] = np.random.default_rng(0).random((2, 3))
+    for i, z in enumerate(dZ):
+        if i:
+            V[i] = V[i-1]
+        V[i] -= np.outer(V[i] @ z, z)
+        u, _, vh = np.linalg.svd(V[i], full_matrices=False)
+        V[i] = u @ vh
+    s = np.array([x @ v for x, v in zip(X - Y, V[:, 0, :])])
+    c = np.array([x @ w for x, w in zip(X - Y, V[:, 1, :])])
+    summand = np.arctan((c[:-1] * s[1:] - s[:-1] * c[1:]) / (s[:-1] * s[1:] + c[:-1] * c[1:]))
+    winding = np.cumsum(summand) / (2 * np.pi)
+    return winding * np.sign(winding[-1] - winding[0])
+
+
+def baseline_median_slope(data, small=100, big=250):
+    """`median_slope` as first released, one secant line at a time"""
+    slopes = []
+    weights = []
+    for i in range(len(data) - small):
+        for j in range(i + small, min(i + big, len(data))):
+            s = (data[j]-data[i])/(j-i)
+            slopes.append(s)
+            reg = data[i:j] - s * np.arange(i, j)
+            reg -= np.mean(reg)
+            weights.append((j - i) / (1 + np.sum(reg ** 2)))
+    n_bins = int(np.sqrt(len(slopes)))
+    scores = [0 for i in range(n_bins)]
+    a = min(slopes)
+    b = max(slopes) + 0.01
+    for s, weight in zip(slopes, weights):
+        scores[int(n_bins * (s - a) / (b - a))] += weight
+    return a + (np.argmax(scores) / n_bins) * (b - a), scores
+
+
+def baseline_sliding_window(D, win):
+    """`sliding_window` as first released, summing shifted copies of D"""
+    N = D.shape[0]
+    D_stack = np.zeros((N-win+1, N-win+1))
+    for i in range(0, win):
+        D_stack += D[i:i+N-win+1, i:i+N-win+1]
+    for i in range(N-win+1):
+        D_stack[i, i] = 0
+    return D_stack
+
+
+######################################################
+##                     FIXTURES                     ##
+######################################################
+
+@pytest.fixture(params=['numpy', 'numba'])
+def backend(request, pkg):
+    """Runs a test with each kernel backend of `pkg`, restoring the
+    configured backend afterwards"""
+    kernels = import_module(pkg, 'kernels')
+    if request.param == 'numba' and kernels.numba_version() is None:
+        pytest.skip('Numba is not installed')
+    previous = kernels.CONFIG['backend']
+    kernels.set_backend(request.param)
+    yield request.param
+    kernels.CONFIG['backend'] = previous
+
+
+@pytest.fixture(scope='module')
+def solenoid():
+    from geom_lrr.synthetic import make_solenoid_of_length
+    return make_solenoid_of_length(300, seed=0)['structure']
+
+
+@pytest.fixture(scope='module')
+def golden():
+    with open(GOLDEN) as handle:
+        return json.load(handle)['outputs']
+
+
+@pytest.fixture(scope='module')
+def cached_structures():
+    with open(STRUCTURES, 'rb') as handle:
+        return {key: np.asarray(structure) for key, structure in pickle.load(handle).items()}
+
+
+def golden_cases():
+    """Structures of the golden outputs: the synthetic solenoid of 300
+    residues, and the cached CORE structures"""
+    from geom_lrr.synthetic import make_solenoid_of_length
+    cases = {'synthetic_300': make_solenoid_of_length(300, seed=0)['structure']}
+    with open(STRUCTURES, 'rb') as handle:
+        cases.update({key: np.asarray(structure) for key, structure in pickle.load(handle).items()})
+    return cases
+
+
+######################################################
+##                      TESTS                       ##
+######################################################
+
+def test_winding_matches_baseline(pkg, backend, solenoid):
+    analyzer = import_module(pkg, 'analyzer')
+    np.testing.assert_allclose(analyzer.compute_winding(solenoid)['winding'], baseline_winding(solenoid), rtol=0, atol=1e-8)
+
+
+def test_median_slope_matches_baseline(pkg, backend, solenoid):
+    analyzer = import_module(pkg, 'analyzer')
+    winding = baseline_winding(solenoid)
+    m, scores = analyzer.median_slope(winding)
+    m_ref, scores_ref = baseline_median_slope(winding)
+    assert m == pytest.approx(m_ref, rel=1e-12)
+    np.testing.assert_allclose(scores, scores_ref, rtol=1e-9)
+
+
+@pytest.mark.parametrize('win', [1, 5, 24])
+def test_sliding_window_matches_baseline(pkg, backend, win):
+    analyzer = import_module(pkg, 'analyzer')
+    X = np.random.default_rng(win).normal(size=(80, 3))
+    D = analyzer.get_csm(X, X)
+    reference = baseline_sliding_window(D, win)
+    np.testing.assert_allclose(analyzer.sliding_window(D, win), reference, atol=1e-9)
+    # several windows from one cumulative table, passed in or computed
+    Q = analyzer.diagonal_cumsum(D)
+    for windows in [analyzer.sliding_window(D, [win, 7]), analyzer.sliding_window(D, [win, 7], Q=Q)]:
+        np.testing.assert_allclose(windows[0], reference, atol=1e-9)
+        np.testing.assert_allclose(windows[1], baseline_sliding_window(D, 7), atol=1e-9)
+
+
+@pytest.mark.parametrize('name, structure', list(golden_cases().items()))
+def test_golden_outputs(pkg, golden, name, structure):
+    analyzer = import_module(pkg, 'analyzer')
+    expected = golden[name]
+    winding = analyzer.compute_winding(structure)['winding']
+    assert winding[-1] == pytest.approx(expected['winding_last'], rel=1e-6)
+    assert np.sum(winding) == pytest.approx(expected['winding_sum'], rel=1e-6)
+    assert analyzer.median_slope(winding)[0] == pytest.approx(expected['median_slope'], rel=1e-6)
+    assert list(analyzer.compute_regression(winding)['breakpoints']) == expected['breakpoints']
+    adaptive = analyzer.compute_lrr_regression(winding, segmentation='adaptive')
+    assert list(adaptive['breakpoints']) == expected['adaptive_breakpoints']
+
+
+def test_exact_regression_is_optimal(pkg, solenoid):
+    analyzer = import_module(pkg, 'analyzer')
+    winding = baseline_winding(solenoid)[::2]
+    exact = analyzer.compute_regression(winding)
+    m = exact['slope']
+    losses = {
+        (a, b): analyzer.multi_loss(winding, np.array([a, b]), m, [1, 1.5])
+        for a, b in itertools.combinations(range(len(winding) + 1), 2)
+    }
+    best = min(losses, key=losses.get)
+    assert exact['loss'] == pytest.approx(losses[best], rel=1e-9)
+    assert exact['loss'] <= min(losses.values()) * (1 + 1e-9)
+
+
+def test_exact_regression_beats_descent(pkg, golden, solenoid):
+    analyzer = import_module(pkg, 'analyzer')
+    winding = analyzer.compute_winding(solenoid)['winding']
+    exact = analyzer.compute_regression(winding)
+    descent = analyzer.compute_regression(winding, method='descent')
+    assert list(descent['breakpoints']) == golden['synthetic_300']['descent_breakpoints']
+    assert exact['loss'] <= analyzer.multi_loss(winding, descent['breakpoints'], descent['slope'], [1, 1.5]) + 1e-9
+    with pytest.raises(ValueError, match='initial_guess'):
+        analyzer.compute_regression(winding, initial_guess=[10, 20])
+
+
+def test_dense_and_sparse_laplacian_agree(pkg, solenoid):
+    analyzer = import_module(pkg, 'analyzer')
+    from scipy import sparse
+    from scipy.ndimage import gaussian_filter1d as gf1d
+    X = gf1d(solenoid[50:250], sigma=1, order=1, axis=0)
+    B = analyzer.csm_to_binary_mutual(analyzer.sliding_window(analyzer.get_csm(X, X), 25), 50)
+    A = analyzer.sliding_window_knn(X, 25, 50)
+    np.testing.assert_array_equal(A.multiply(A.T).toarray(), B)
+
+    dense = analyzer.get_unweighted_laplacian_eigs_dense(B)[:, :4]
+    v = analyzer.get_unweighted_laplacian_eigs_sparse(sparse.csr_matrix(B))
+    L = np.diag(B.sum(1)) - B.astype(float)
+    # the same eigenvalues, and the same subspace whatever the signs
+    np.testing.assert_allclose(np.sum(v * (L @ v), 0), np.sum(dense * (L @ dense), 0), atol=1e-9)
+    np.testing.assert_allclose(v @ v.T, dense @ dense.T, atol=1e-8)
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('name, breakpoints, final, turns', LAPLACIAN_BASELINE)
+def test_laplacian_winding_matches_baseline(pkg, cached_structures, sparse, name, breakpoints, final, turns):
+    analyzer = import_module(pkg, 'analyzer')
+    if name.startswith('synthetic'):
+        structure = import_module(pkg, 'synthetic').make_solenoid(n_repeats=int(name.split('_')[1]))['structure']
+    else:
+        structure = cached_structures[name]
+    a, b = breakpoints
+    lwinding = analyzer.compute_lrr_winding_laplacian(structure, breakpoints, sparse=sparse)
+    assert lwinding[b-1] - lwinding[a] == pytest.approx(turns, abs=1e-5)
+    # eigenvector signs are normalized, which can move the starting angle,
+    # and with it every winding, by half a turn
+    assert abs(lwinding[-1] - final) < 0.5 + 1e-5
@@ -0,0 +1,16 @@
+import shutil
+
+from conftest import import_module
+from test_pdbio import FIXTURE, check_chain_a
+
+
+def test_loader_records_failures(pkg, tmp_path):
+    Loader = import_module(pkg, 'loader').Loader
+    shutil.copy(FIXTURE, tmp_path / 'good.pdb')
+    (tmp_path / 'empty.pdb').write_text('HEADER    NO ATOMS\nEND\n')
+    (tmp_path / 'notes.txt').write_text('not a model\n')
+    loader = Loader()
+    loader.load_batch(str(tmp_path), progress=False)
+    assert list(loader.structures) == ['good']
+    check_chain_a(dict(structure=loader.structures['good'], bfactor=loader.bfactors['good'], sequence=loader.sequences['good']))
+    assert list(loader.errors) == ['empty']
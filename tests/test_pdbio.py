@@ -0,0 +1,74 @@
+import gzip
+import os
+import shutil
+import tarfile
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fixture.pdb')
+
+# CA atoms of chain A of the first model: alternate locations keep the
+# first CA, insertion codes are separate residues, the calcium ion and
+# the second model are ignored
+CHAIN_A = dict(
+    structure=[[1.458, 0, 0], [3.8, 1, 0.5], [6.1, 2.2, 1], [8.4, 3.1, 1.7], [10.6, 4, 2.3]],
+    bfactor=[91.2, 85.5, 70.25, 65, 55.75],
+    sequence='AGSLM'
+)
+
+
+def check_chain_a(res):
+    np.testing.assert_allclose(res['structure'], CHAIN_A['structure'])
+    np.testing.assert_allclose(res['bfactor'], CHAIN_A['bfactor'])
+    assert res['sequence'] == CHAIN_A['sequence']
+
+
+def test_read_pdb(pkg):
+    pdbio = import_module(pkg, 'pdbio')
+    res = pdbio.read_pdb(FIXTURE)
+    check_chain_a(res)
+    assert res['chain'] == 'A'
+    chain_b = pdbio.read_pdb(FIXTURE, chain='B')
+    assert chain_b['sequence'] == 'WX'
+    np.testing.assert_allclose(chain_b['bfactor'], [99, 98])
+
+
+def test_matches_biopython(pkg):
+    PDB = pytest.importorskip('Bio.PDB')
+    pdbio = import_module(pkg, 'pdbio')
+    chain = PDB.PDBParser(QUIET=True).get_structure('fixture', FIXTURE)[0]['A']
+    residues = [residue for residue in chain if residue.id[0] != 'H_CA']
+    res = pdbio.read_pdb(FIXTURE)
+    np.testing.assert_allclose(res['structure'], [residue['CA'].coord for residue in residues], atol=1e-3)
+    np.testing.assert_allclose(res['bfactor'], [residue['CA'].bfactor for residue in residues])
+
+
+def test_compressed(pkg, tmp_path):
+    pdbio = import_module(pkg, 'pdbio')
+    with open(FIXTURE, 'rb') as source, gzip.open(tmp_path / 'model.pdb.gz', 'wb') as target:
+        shutil.copyfileobj(source, target)
+    check_chain_a(pdbio.read_pdb(str(tmp_path / 'model.pdb.gz')))
+
+
+def test_read_archive(pkg, tmp_path):
+    pdbio = import_module(pkg, 'pdbio')
+    with open(FIXTURE, 'rb') as source, gzip.open(tmp_path / 'model.pdb.gz', 'wb') as target:
+        shutil.copyfileobj(source, target)
+    with tarfile.open(tmp_path / 'models.tar.gz', 'w:gz') as archive:
+        archive.add(FIXTURE, arcname='out/first.pdb')
+        archive.add(tmp_path / 'model.pdb.gz', arcname='out/second.pdb.gz')
+        archive.add(FIXTURE, arcname='out/scores.json')
+    results, errors = pdbio.read_archive(str(tmp_path / 'models.tar.gz'), progress=False)
+    assert sorted(results) == ['first', 'second'] and not errors
+    for res in results.values():
+        check_chain_a(res)
+
+
+def test_pdb_stem(pkg):
+    pdbio = import_module(pkg, 'pdbio')
+    assert pdbio.pdb_stem('dir/model.pdb') == 'model'
+    assert pdbio.pdb_stem('model.pdb.gz') == 'model'
+    assert pdbio.pdb_stem('model.cif') is None
@@ -0,0 +1,86 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'run_pipeline.py')
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """run_pipeline.py with its project root, state file and logs moved
+    under a temporary directory"""
+    spec = importlib.util.spec_from_file_location('run_pipeline', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'PROJECT_ROOT', tmp_path)
+    monkeypatch.setattr(module, 'STATE_FILE', tmp_path / 'intermediate_files' / '.pipeline_state.json')
+    monkeypatch.setattr(module, 'LOG_DIR', tmp_path / 'logs')
+    return module
+
+
+def copy_stage(pipeline, name, source, target, fail=False):
+    """Stage copying `source` to `target`, or failing without writing it"""
+    code = 'import sys; sys.exit(1)' if fail else f"open({target!r}, 'w').write(open({source!r}).read() + '.')"
+    return pipeline.Stage(name, [sys.executable, '-c', code], inputs=[source], outputs=[target])
+
+
+def chain(pipeline, fail=False):
+    return [
+        copy_stage(pipeline, 'first', 'a.txt', 'b.txt', fail=fail),
+        copy_stage(pipeline, 'second', 'b.txt', 'c.txt'),
+    ]
+
+
+def statuses(timings):
+    return {name: status for name, status, seconds in timings}
+
+
+def test_reruns_only_stale_stages(pipeline, tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    stages = chain(pipeline)
+    assert statuses(pipeline.run_pipeline(stages)) == dict(first='ran', second='ran')
+    assert (tmp_path / 'c.txt').read_text() == 'a..'
+    assert statuses(pipeline.run_pipeline(stages)) == dict(first='skipped', second='skipped')
+    assert statuses(pipeline.run_pipeline(stages, dry_run=True)) == dict(first='skipped', second='skipped')
+    assert statuses(pipeline.run_pipeline(stages, force=True)) == dict(first='ran', second='ran')
+
+    # a changed input reruns its stage, and the stages reading its outputs
+    (tmp_path / 'a.txt').write_text('changed')
+    assert statuses(pipeline.run_pipeline(stages, dry_run=True)) == dict(first='would run', second='would run')
+    assert statuses(pipeline.run_pipeline(stages)) == dict(first='ran', second='ran')
+    assert (tmp_path / 'c.txt').read_text() == 'changed..'
+
+    # a deleted or edited output reruns the stage that wrote it
+    (tmp_path / 'c.txt').unlink()
+    assert statuses(pipeline.run_pipeline(stages)) == dict(first='skipped', second='ran')
+    (tmp_path / 'c.txt').write_text('edited by hand')
+    assert statuses(pipeline.run_pipeline(stages)) == dict(first='skipped', second='ran')
+    assert (tmp_path / 'c.txt').read_text() == 'changed..'
+
+
+def test_command_change_reruns(pipeline, tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    stages = chain(pipeline)
+    pipeline.run_pipeline(stages)
+    stages[1].command.append('--verbose')
+    assert statuses(pipeline.run_pipeline(stages)) == dict(first='skipped', second='ran')
+
+
+def test_failure_blocks_downstream(pipeline, tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    independent = copy_stage(pipeline, 'independent', 'a.txt', 'd.txt')
+    timings = pipeline.run_pipeline(chain(pipeline, fail=True) + [independent])
+    assert statuses(timings) == dict(first='failed', second='blocked', independent='ran')
+    assert not (tmp_path / 'c.txt').exists()
+    assert (tmp_path / 'logs' / 'first.log').exists()
+
+    # a failed stage is not recorded, so it runs again once fixed
+    assert statuses(pipeline.run_pipeline(chain(pipeline) + [independent])) == dict(first='ran', second='ran', independent='skipped')
+
+
+def test_dependencies(pipeline):
+    stages = chain(pipeline) + [pipeline.Stage('tree', ['true'], inputs=['out'], outputs=['e.txt']),
+                                pipeline.Stage('nested', ['true'], inputs=['c.txt'], outputs=['out/f.txt'])]
+    assert pipeline.dependencies(stages) == dict(first=set(), second={'first'}, tree={'nested'}, nested={'second'})
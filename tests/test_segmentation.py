@@ -0,0 +1,65 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'LRR_Annotation', 'cache')
+
+
+@pytest.fixture(scope='module')
+def windings():
+    """Windings of the two cached CORE structures, one LRR domain each"""
+    with open(os.path.join(CACHE, 'windings.pickle'), 'rb') as handle:
+        return pickle.load(handle)
+
+
+def splice_coil(winding, breakpoints, length, gap):
+    """Winding with the first `length` residues of its coil repeated
+    `gap` residues after the end of the coil"""
+    a, b = breakpoints
+    flank = winding[b:b+gap] - winding[b]
+    coil = winding[a:a+length] - winding[a] + winding[b] + flank[-1]
+    tail = winding[b:] - winding[b] + coil[-1]
+    return np.concatenate([winding[:b], winding[b] + flank, coil, tail])
+
+
+def test_default_is_cutoff(pkg, windings):
+    analyzer = import_module(pkg, 'analyzer')
+    for winding in windings.values():
+        res = analyzer.compute_lrr_regression(winding)
+        cutoff = analyzer.compute_lrr_regression(winding, segmentation='cutoff')
+        np.testing.assert_array_equal(res['breakpoints'], cutoff['breakpoints'])
+
+
+def test_unused_arguments_raise(pkg, windings):
+    analyzer = import_module(pkg, 'analyzer')
+    winding = next(iter(windings.values()))
+    with pytest.raises(ValueError, match='learning_rate'):
+        analyzer.compute_lrr_regression(winding, learning_rate=0.01)
+    with pytest.raises(ValueError, match='iterations'):
+        analyzer.compute_lrr_regression(winding, segmentation='adaptive', iterations=100)
+    with pytest.raises(ValueError, match='exact'):
+        analyzer.compute_lrr_regression(winding, segmentation='adaptive', method='descent')
+
+
+def test_coil_penalty_keeps_one_domain(pkg, windings):
+    analyzer = import_module(pkg, 'analyzer')
+    for winding in windings.values():
+        res = analyzer.compute_adaptive_regression(winding)
+        assert len(res['breakpoints']) == 2
+        # a tenfold smaller penalty fits noise with extra coils
+        res = analyzer.compute_adaptive_regression(winding, coil_penalty=analyzer.COIL_PENALTY - np.log(5))
+        assert len(res['breakpoints']) > 2
+
+
+@pytest.mark.parametrize('length, gap, n_coils', [(400, 60, 2), (200, 150, 2), (50, 60, 1)])
+def test_coil_penalty_finds_second_domain(pkg, windings, length, gap, n_coils):
+    analyzer = import_module(pkg, 'analyzer')
+    for winding in windings.values():
+        breakpoints = analyzer.compute_regression(winding)['breakpoints']
+        spliced = splice_coil(winding, breakpoints, length, gap)
+        res = analyzer.compute_adaptive_regression(spliced)
+        assert len(res['breakpoints']) == 2 * n_coils